@@ -0,0 +1,88 @@
+"""
+Instructor analytics for EduSphere
+Daily per-course rollups of enrollments, completions and ratings, grouped into
+day, week or month buckets for the instructor dashboard
+"""
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import Date, cast, func, literal_column, type_coerce
+
+# Widest windows still charted per day and per week; longer ones are charted per month
+DAILY_BUCKET_DAYS = 92
+WEEKLY_BUCKET_DAYS = 731
+
+
+class Totals(namedtuple('Totals', 'enrollments completions reviews rating_sum revenue')):
+    """Activity summed over some days, with the rates the dashboard shows"""
+
+    __slots__ = ()
+
+    @property
+    def completion_rate(self):
+        """Percent of these enrollments whose student has completed the course"""
+        return self.completions * 100 / self.enrollments if self.enrollments else 0
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.reviews if self.reviews else 0
+
+
+EMPTY_TOTALS = Totals(0, 0, 0, 0, 0.0)
+
+
+def day_of(column, dialect_name):
+    """SQL for the calendar day of a timestamp column"""
+    if dialect_name == 'sqlite':
+        # CAST(... AS DATE) has numeric affinity in SQLite and keeps only the year
+        return func.date(column)
+    return cast(column, Date)
+
+
+def bucket_size(first_day, last_day):
+    """'day', 'week' or 'month', whichever keeps the chart to about a hundred bars"""
+    days = (last_day - first_day).days + 1
+    if days <= DAILY_BUCKET_DAYS:
+        return 'day'
+    return 'week' if days <= WEEKLY_BUCKET_DAYS else 'month'
+
+
+def bucket_of(column, size, dialect_name):
+    """SQL for the first day of the bucket a date column falls in; weeks start on Monday"""
+    if size == 'day':
+        return column
+    # Inline literals, not bound parameters, so GROUP BY repeats the SELECT expression exactly
+    if dialect_name != 'sqlite':
+        return cast(func.date_trunc(literal_column(f"'{size}'"), column), Date)
+    if size == 'week':
+        modifiers = (literal_column("'-6 days'"), literal_column("'weekday 1'"))
+    else:
+        modifiers = (literal_column("'start of month'"),)
+    return type_coerce(func.date(column, *modifiers), Date)
+
+
+def bucket_start(day, size):
+    """Python twin of bucket_of()"""
+    if size == 'week':
+        return day - timedelta(days=day.weekday())
+    if size == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def fill_buckets(rows, first_day, last_day, size):
+    """[(bucket start, Totals)] for every bucket from first_day to last_day
+
+    rows are (bucket start, *Totals fields) as returned by the bucketed
+    query; buckets without activity get EMPTY_TOTALS so the chart keeps
+    its time axis, which is stretched back to cover any earlier row.
+    """
+    totals = {start: Totals(*values) for start, *values in rows}
+    buckets = []
+    start = bucket_start(min([first_day, *totals]), size)
+    while start <= last_day:
+        buckets.append((start, totals.get(start, EMPTY_TOTALS)))
+        if size == 'month':
+            start = (start + timedelta(days=32)).replace(day=1)
+        else:
+            start += timedelta(days=7 if size == 'week' else 1)
+    return buckets
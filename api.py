@@ -0,0 +1,64 @@
+"""
+JSON API helpers for EduSphere
+Field selection, compact serialization and conditional (ETag) responses
+"""
+import hashlib
+import json
+from datetime import date, datetime
+from flask import Response, request
+
+
+class ApiError(Exception):
+    """An error answered with a JSON body and the given HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def compact_json(payload):
+    """UTF-8 JSON without insignificant whitespace"""
+    return json.dumps(payload, default=_json_default, separators=(',', ':'),
+                      ensure_ascii=False).encode()
+
+
+def parse_fields(value, available, default):
+    """Field names from a comma-separated `fields` parameter, checked against available"""
+    if not value:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(400, f'Unknown field(s): {", ".join(unknown)}. '
+                            f'Available: {", ".join(available)}')
+    return fields
+
+
+def serialize(item, fields, serializers):
+    """Only the requested fields of item, each computed by its serializer"""
+    return {name: serializers[name](item) for name in fields}
+
+
+def etag_for(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def conditional_json(body, etag=None, private=False):
+    """A JSON response answering If-None-Match with 304 Not Modified
+
+    Clients may keep the response but must revalidate it before every use,
+    which costs them an empty 304 while nothing has changed.
+    """
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag or etag_for(body))
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response.make_conditional(request)
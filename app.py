@@ -3,17 +3,50 @@ EduSphere - Complete Flask Application
 Deployment-ready version for Render with SQLite
 """
 
+import hmac
 import os
-from datetime import datetime
+import random
+import secrets
+import shutil
+import time
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, SelectField, FloatField, SubmitField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import or_
+from sqlalchemy import or_, event, func, select, inspect, bindparam, case, true, tuple_, Date, Integer
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as SessionBase, contains_eager, joinedload, object_session
+from markupsafe import Markup
+from search import CourseSearchIndex, build_match_query
+from rankings import RankingScorer
+from analytics import EMPTY_TOTALS, Totals, bucket_of, bucket_size, day_of, fill_buckets
+from recommendations import (co_enrollment_counts, pair_changes, group_recommendations,
+                             blend_recommendations, numpy)
+from querycount import assert_route_queries, assert_route_plans
+from pagination import CountCache, keyset_paginate
+from cache import create_cache, VersionedSnapshot
+from identity import create_identity_cache
+from passwords import PasswordHasher, HashingBusy
+from instrumentation import RequestProfiler
+from progress import ProgressTracker
+from jobs import JobQueue, PermanentError, Worker
+from api import ApiError, compact_json, conditional_json, parse_fields, serialize
+from export import FORMATS as EXPORT_FORMATS, export_chunks, gzip_chunks
+from bulk import (FORMATS, ImportReport, MalformedInput, batched, detect_format,
+                  iter_records, text_stream)
+from migrations import MigrationRegistry, Migrator
+from synthetic import generate_users, generate_courses, generate_activity, user_email
+from database import (database_url_from_env, engine_options_for, sqlite_pragmas_from_env,
+                      install_sqlite_pragmas, dispose_after_fork, retry_on_lock,
+                      RoutingSession, install_replica_routing)
 
 # ==================== FLASK APP INITIALIZATION ====================
 app = Flask(__name__)
@@ -21,25 +54,144 @@ app = Flask(__name__)
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'edusphere-secret-key-2024-production')
 
-# SQLite Database Configuration
+# Database Configuration: SQLite in instance/ unless DATABASE_URL says otherwise
 basedir = os.path.abspath(os.path.dirname(__file__))
 database_path = os.path.join(basedir, 'instance', 'edusphere.db')
 
 # Ensure instance directory exists
 os.makedirs(os.path.join(basedir, 'instance'), exist_ok=True)
 
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
+app.config["SQLALCHEMY_DATABASE_URI"] = (
+    database_url_from_env('DATABASE_URL') or
+    database_url_from_env('DATABASE_URI', f"sqlite:///{database_path}")
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_for(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Optional read replica for GET requests, e.g. a PostgreSQL standby
+app.config['DATABASE_REPLICA_URL'] = database_url_from_env('DATABASE_REPLICA_URL')
+# Seconds a visitor keeps reading from the primary after they write
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': {
+        'url': app.config['DATABASE_REPLICA_URL'],
+        **engine_options_for(app.config['DATABASE_REPLICA_URL'])
+    }}
+
+# SQLite connection tuning (see database.py; override with SQLITE_* variables)
+app.config['SQLITE_PRAGMAS'] = sqlite_pragmas_from_env()
+# Write paths retry this many times when SQLite reports the database as locked
+app.config['DB_LOCK_RETRIES'] = int(os.environ.get('DB_LOCK_RETRIES', 3))
+app.config['DB_LOCK_RETRY_DELAY'] = float(os.environ.get('DB_LOCK_RETRY_DELAY', 0.05))
+# Rows per chunk for backfills run against live tables
+app.config['MIGRATION_BATCH_SIZE'] = int(os.environ.get('MIGRATION_BATCH_SIZE', 5000))
+# Seconds to sleep between backfill chunks, to leave room for live traffic
+app.config['MIGRATION_BATCH_PAUSE'] = float(os.environ.get('MIGRATION_BATCH_PAUSE', 0))
 app.config['COURSES_PER_PAGE'] = 9
 app.config['USERS_PER_PAGE'] = 10
+app.config['ADMIN_COURSES_PER_PAGE'] = 10
+app.config['REVIEWS_PER_PAGE'] = 5
+# JSON API page size: `limit` defaults to the first and is capped at the second
+app.config['API_PAGE_SIZE'] = int(os.environ.get('API_PAGE_SIZE', 20))
+app.config['API_MAX_PAGE_SIZE'] = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+# Seconds the admin panel's platform statistics may be served from cache
+app.config['ADMIN_STATS_TTL'] = int(os.environ.get('ADMIN_STATS_TTL', 30))
+
+# Page/fragment cache: 'sqlite' (shared by web and job workers), 'memory' (per process,
+# only for a single process with no job workers) or 'none'
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'sqlite')
+app.config['CACHE_PATH'] = os.environ.get('CACHE_PATH', os.path.join(basedir, 'instance', 'cache.db'))
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+app.config['PAGE_CACHE_ENABLED'] = True
+# Signed-in user snapshots (id, name, role). Shared by every process on the host by
+# default, so a role change or deletion takes effect in all workers at once
+app.config['USER_CACHE_BACKEND'] = os.environ.get('USER_CACHE_BACKEND', 'sqlite')
+app.config['USER_CACHE_PATH'] = os.environ.get('USER_CACHE_PATH', os.path.join(basedir, 'instance', 'user_cache.db'))
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 300))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 4096))
+# Seconds a listing total may be served from cache; 0 hides totals entirely
+app.config['LISTING_COUNT_TTL'] = int(os.environ.get('LISTING_COUNT_TTL', 60))
+# Longest a worker keeps its category list when it cannot see other workers'
+# invalidations (the per-worker 'memory' cache backend)
+app.config['CATEGORY_CACHE_TTL'] = int(os.environ.get('CATEGORY_CACHE_TTL', 300))
+# Co-enrolled courses stored per course, and how long a worker keeps its copy
+# before picking up the recommendations changed by recent enrollments
+app.config['RECOMMENDATIONS_PER_COURSE'] = int(os.environ.get('RECOMMENDATIONS_PER_COURSE', 8))
+app.config['RECOMMENDATION_CACHE_TTL'] = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+# Trending: an enrollment's weight halves every half-life, and a review weighs as
+# much as this many enrollments. Top rated: ratings are averaged together with
+# RATING_PRIOR_REVIEWS imaginary reviews of RATING_PRIOR stars. Run
+# `python app.py refresh_rankings` after changing any of these.
+app.config['TRENDING_HALF_LIFE_DAYS'] = float(os.environ.get('TRENDING_HALF_LIFE_DAYS', 7))
+app.config['TRENDING_REVIEW_WEIGHT'] = float(os.environ.get('TRENDING_REVIEW_WEIGHT', 2))
+app.config['RATING_PRIOR'] = float(os.environ.get('RATING_PRIOR', 3.5))
+app.config['RATING_PRIOR_REVIEWS'] = int(os.environ.get('RATING_PRIOR_REVIEWS', 5))
+# Rows written per transaction by the bulk importers
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+# Rows fetched per round trip while streaming an export
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))
+# Progress heartbeats are buffered per worker and written every interval, or
+# sooner once this many (student, course) pairs are waiting
+app.config['PROGRESS_FLUSH_INTERVAL'] = float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 5))
+app.config['PROGRESS_MAX_PENDING'] = int(os.environ.get('PROGRESS_MAX_PENDING', 5000))
+# Background jobs: a queue file shared by the web and `python app.py worker` processes,
+# and where uploads handed to a job wait for it
+app.config['JOB_QUEUE_PATH'] = os.environ.get('JOB_QUEUE_PATH', os.path.join(basedir, 'instance', 'jobs.db'))
+app.config['JOB_FILES_PATH'] = os.environ.get('JOB_FILES_PATH', os.path.join(basedir, 'instance', 'job_files'))
+# A failed job is retried after JOB_RETRY_BACKOFF seconds, doubling per attempt up to
+# JOB_MAX_BACKOFF, until it has run JOB_MAX_ATTEMPTS times
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+app.config['JOB_RETRY_BACKOFF'] = float(os.environ.get('JOB_RETRY_BACKOFF', 10))
+app.config['JOB_MAX_BACKOFF'] = float(os.environ.get('JOB_MAX_BACKOFF', 3600))
+# Seconds a worker's claim on a job lasts unrenewed; a crashed worker's job is retried after it
+app.config['JOB_LEASE_SECONDS'] = float(os.environ.get('JOB_LEASE_SECONDS', 300))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+# Days finished jobs, and so their idempotency keys, are kept
+app.config['JOB_RETENTION_DAYS'] = float(os.environ.get('JOB_RETENTION_DAYS', 7))
+# Deleted users and courses are hidden at once and purged by a background job;
+# with SOFT_DELETE off they stay visible until the job has purged them
+app.config['SOFT_DELETE'] = os.environ.get('SOFT_DELETE', '1').lower() not in ('0', 'false', 'no')
+# Enrollments or reviews deleted per transaction while purging, and seconds between batches
+app.config['DELETE_BATCH_SIZE'] = int(os.environ.get('DELETE_BATCH_SIZE', 1000))
+app.config['DELETE_BATCH_PAUSE'] = float(os.environ.get('DELETE_BATCH_PAUSE', 0))
+
+# Request profiling: per-route timings and query counts at /admin/metrics; can also
+# be switched at runtime from the admin panel (shared by workers on the sqlite cache)
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '1').lower() not in ('0', 'false', 'no')
+# A request over either threshold is logged as slow with its slowest statements
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+app.config['SLOW_REQUEST_QUERIES'] = int(os.environ.get('SLOW_REQUEST_QUERIES', 20))
+app.config['PROFILE_SLOWEST_STATEMENTS'] = int(os.environ.get('PROFILE_SLOWEST_STATEMENTS', 3))
+# Lets a Prometheus scraper read /admin/metrics with `Authorization: Bearer <token>`
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Password hashing: Werkzeug method with cost, e.g. 'scrypt:32768:8:1' or
+# 'pbkdf2:sha256:600000'; stored hashes are upgraded on the next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# Hashes run at once per worker, each on its request's thread; extra logins wait up
+# to the timeout, then get a 503. GUNICORN_THREADS is what keeps other requests served
+app.config['PASSWORD_HASH_CONCURRENCY'] = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 2))
+app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
 
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+with app.app_context():
+    for engine in db.engines.values():
+        install_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+        dispose_after_fork(engine)
+if app.config['DATABASE_REPLICA_URL']:
+    install_replica_routing(app, db, app.config['REPLICA_STICKY_SECONDS'])
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    max_concurrent=app.config['PASSWORD_HASH_CONCURRENCY'],
+    queue_timeout=app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+)
 
 # ==================== DATABASE MODELS ====================
 
@@ -54,19 +206,35 @@ class User(UserMixin, db.Model):
     role = db.Column(db.String(20), nullable=False, default='student')
     bio = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set when the account is deleted, until the purge job removes it
+    deleted_at = db.Column(db.DateTime, nullable=True)
     
-    # Relationships
+    # Relationships. Courses are deleted through the ORM so their listeners run;
+    # enrollments and reviews are never loaded for it (see DELETION below)
     courses_taught = db.relationship('Course', backref='instructor', lazy=True, cascade='all, delete-orphan')
-    enrollments = db.relationship('Enrollment', backref='student', lazy=True, cascade='all, delete-orphan')
-    reviews = db.relationship('Review', backref='reviewer', lazy=True, cascade='all, delete-orphan')
+    enrollments = db.relationship('Enrollment', backref='student', lazy=True, passive_deletes='all')
+    reviews = db.relationship('Review', backref='reviewer', lazy=True, passive_deletes='all')
+    
+    # Admin user table: newest first, optionally filtered by role
+    __table_args__ = (
+        db.Index('ix_users_created_at', 'created_at'),
+        db.Index('ix_users_role_created_at', 'role', 'created_at'),
+    )
     
     def set_password(self, password):
         """Hash and set user password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verify password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def upgrade_password_hash(self, password):
+        """Rehash a just-verified password if the hashing settings changed"""
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -80,6 +248,8 @@ class Category(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized, maintained by the Course listeners below
+    course_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     courses = db.relationship('Course', backref='category', lazy=True)
@@ -98,24 +268,55 @@ class Course(db.Model):
     price = db.Column(db.Float, nullable=False, default=0.0)
     duration = db.Column(db.String(50), nullable=True)
     level = db.Column(db.String(20), nullable=True)
-    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the course is deleted, until the purge job removes it
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    
+    # Denormalized aggregates, maintained by the Enrollment/Review listeners below
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Reviews per star rating, for the rating histogram
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Enrollments whose student has completed the course
+    completion_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
-    enrollments = db.relationship('Enrollment', backref='course', lazy=True, cascade='all, delete-orphan')
-    reviews = db.relationship('Review', backref='course', lazy=True, cascade='all, delete-orphan')
+    enrollments = db.relationship('Enrollment', backref='course', lazy=True, passive_deletes='all')
+    reviews = db.relationship('Review', backref='course', lazy=True, passive_deletes='all')
+    
+    # Catalog ordering, category filter and instructor dashboard lookups
+    __table_args__ = (
+        db.Index('ix_courses_created_at', 'created_at'),
+        db.Index('ix_courses_category_created_at', 'category_id', 'created_at'),
+        db.Index('ix_courses_instructor_id', 'instructor_id'),
+    )
     
     def get_enrollment_count(self):
         """Get number of students enrolled"""
-        return len(self.enrollments)
+        return self.enrollment_count or 0
     
     def get_average_rating(self):
         """Calculate average rating from reviews"""
-        if not self.reviews:
+        if not self.review_count:
             return 0
-        return sum(review.rating for review in self.reviews) / len(self.reviews)
+        return self.rating_sum / self.review_count
+    
+    def get_rating_histogram(self):
+        """(stars, review count, percent of reviews) from five stars down to one"""
+        total = self.review_count or 0
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}_count') or 0
+            histogram.append((stars, count, round(count * 100 / total) if total else 0))
+        return histogram
     
     def __repr__(self):
         return f'<Course {self.title}>'
@@ -126,13 +327,18 @@ class Enrollment(db.Model):
     __tablename__ = 'enrollments'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     progress = db.Column(db.Integer, default=0)
     completed = db.Column(db.Boolean, default=False)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'course_id', name='unique_enrollment'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='unique_enrollment'),
+        # Student dashboard (newest first) and per-course lookups
+        db.Index('ix_enrollments_user_enrolled_at', 'user_id', 'enrolled_at'),
+        db.Index('ix_enrollments_course_enrolled_at', 'course_id', 'enrolled_at'),
+    )
     
     def __repr__(self):
         return f'<Enrollment User:{self.user_id} Course:{self.course_id}>'
@@ -143,17 +349,1223 @@ class Review(db.Model):
     __tablename__ = 'reviews'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'course_id', name='unique_review'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='unique_review'),
+        # Course page review list, newest first
+        db.Index('ix_reviews_course_created_at', 'course_id', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<Review User:{self.user_id} Course:{self.course_id} Rating:{self.rating}>'
 
+
+class CoEnrollment(db.Model):
+    """Students enrolled in both courses of an ordered pair; stored in both directions"""
+    __tablename__ = 'course_co_enrollments'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    other_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    shared = db.Column(db.Integer, nullable=False)
+    
+    # A course's most shared neighbours, read backwards when its recommendations are refreshed
+    __table_args__ = (
+        db.Index('ix_course_co_enrollments_course_shared', 'course_id', 'shared', 'other_id'),
+    )
+
+
+class CourseRecommendation(db.Model):
+    """A course's top co-enrolled courses, best first"""
+    __tablename__ = 'course_recommendations'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recommended_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    shared = db.Column(db.Integer, nullable=False)
+
+
+class CourseRanking(db.Model):
+    """A course's popularity scores, materialized for the ranked listings"""
+    __tablename__ = 'course_rankings'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    # Copied from the course so each listing reads one index, per category or not
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    trending_score = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    # The trending era trending_score is relative to (see rankings.py)
+    trending_era = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_score = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Trending, top rated and most enrolled, across the catalog and per category
+    __table_args__ = (
+        db.Index('ix_course_rankings_trending', 'trending_score', 'course_id'),
+        db.Index('ix_course_rankings_category_trending', 'category_id', 'trending_score', 'course_id'),
+        db.Index('ix_course_rankings_rating', 'rating_score', 'course_id'),
+        db.Index('ix_course_rankings_category_rating', 'category_id', 'rating_score', 'course_id'),
+        db.Index('ix_course_rankings_enrollments', 'enrollment_count', 'course_id'),
+        db.Index('ix_course_rankings_category_enrollments', 'category_id', 'enrollment_count', 'course_id'),
+    )
+
+
+class CourseDailyStat(db.Model):
+    """One course's activity on one day: enrollments by enrolled_at, reviews by created_at"""
+    __tablename__ = 'course_daily_stats'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    # Copied from the course so an instructor's analytics read one index range
+    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    enrollments = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Of that day's enrollments, how many are completed by now
+    completions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reviews = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_course_daily_stats_instructor_day', 'instructor_id', 'day'),
+    )
+
+
+class InstructorDailyStat(db.Model):
+    """All of an instructor's course activity on one day, summed from course_daily_stats"""
+    __tablename__ = 'instructor_daily_stats'
+    
+    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    enrollments = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reviews = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Gross revenue of that day's enrollments at the courses' current prices
+    revenue = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+
+# ==================== COURSE AGGREGATES ====================
+
+COURSE_COUNTER_COLUMNS = ('enrollment_count', 'review_count', 'rating_sum')
+RATING_COUNT_COLUMNS = tuple(f'rating_{stars}_count' for stars in range(1, 6))
+COMPLETION_COUNT_COLUMNS = ('completion_count',)
+
+def rating_deltas(rating, step):
+    """Counter deltas for adding (step=1) or removing (step=-1) one review"""
+    deltas = {'review_count': step, 'rating_sum': step * rating}
+    if 1 <= rating <= 5:
+        deltas[f'rating_{rating}_count'] = step
+    return deltas
+
+def adjust_course_counters(connection, course_id, **deltas):
+    """Apply counter deltas to a course row inside the current transaction"""
+    courses_table = Course.__table__
+    values = {name: courses_table.c[name] + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    # Keep updated_at untouched; counters are not a content edit
+    values['updated_at'] = courses_table.c.updated_at
+    connection.execute(
+        courses_table.update().where(courses_table.c.id == course_id).values(**values)
+    )
+
+@event.listens_for(Enrollment, 'after_insert')
+def enrollment_inserted(mapper, connection, target):
+    adjust_course_counters(connection, target.course_id, enrollment_count=1,
+                           completion_count=1 if target.completed else 0)
+
+@event.listens_for(Enrollment, 'after_delete')
+def enrollment_deleted(mapper, connection, target):
+    adjust_course_counters(connection, target.course_id, enrollment_count=-1,
+                           completion_count=-1 if target.completed else 0)
+
+def completion_change(target):
+    """+1 or -1 when a flushed enrollment was just marked completed or not completed, else 0"""
+    history = inspect(target).attrs.completed.history
+    if history.deleted and history.added and bool(history.added[0]) != bool(history.deleted[0]):
+        return 1 if history.added[0] else -1
+    return 0
+
+@event.listens_for(Enrollment, 'after_update')
+def enrollment_updated(mapper, connection, target):
+    adjust_course_counters(connection, target.course_id, completion_count=completion_change(target))
+
+@event.listens_for(Review, 'after_insert')
+def review_inserted(mapper, connection, target):
+    adjust_course_counters(connection, target.course_id, **rating_deltas(target.rating, 1))
+
+@event.listens_for(Review, 'after_delete')
+def review_deleted(mapper, connection, target):
+    adjust_course_counters(connection, target.course_id, **rating_deltas(target.rating, -1))
+
+@event.listens_for(Review, 'after_update')
+def review_updated(mapper, connection, target):
+    history = inspect(target).attrs.rating.history
+    if history.deleted and history.added:
+        deltas = Counter(rating_deltas(history.added[0], 1))
+        deltas.update(rating_deltas(history.deleted[0], -1))
+        adjust_course_counters(connection, target.course_id, **deltas)
+
+def course_counter_update(only_drifted=True,
+                          columns=COURSE_COUNTER_COLUMNS + RATING_COUNT_COLUMNS + COMPLETION_COUNT_COLUMNS):
+    """UPDATE recomputing course aggregates from the enrollments and reviews tables"""
+    courses_table = Course.__table__
+    enrollments_table = Enrollment.__table__
+    reviews_table = Review.__table__
+    
+    def review_aggregate(aggregate, *criteria):
+        return select(aggregate).where(
+            reviews_table.c.course_id == courses_table.c.id, *criteria
+        ).scalar_subquery()
+    
+    expressions = {
+        'enrollment_count': select(func.count()).where(
+            enrollments_table.c.course_id == courses_table.c.id
+        ).scalar_subquery(),
+        'review_count': review_aggregate(func.count()),
+        'rating_sum': review_aggregate(func.coalesce(func.sum(reviews_table.c.rating), 0)),
+        'completion_count': select(func.count()).where(
+            enrollments_table.c.course_id == courses_table.c.id, enrollments_table.c.completed.is_(True)
+        ).scalar_subquery(),
+    }
+    for stars in range(1, 6):
+        expressions[f'rating_{stars}_count'] = review_aggregate(func.count(), reviews_table.c.rating == stars)
+    expressions = {name: expressions[name] for name in columns}
+    
+    update = courses_table.update().values(**expressions, updated_at=courses_table.c.updated_at)
+    if only_drifted:
+        update = update.where(or_(*(
+            courses_table.c[name] != expression for name, expression in expressions.items()
+        )))
+    return update
+
+def adjust_category_count(connection, category_id, delta):
+    categories_table = Category.__table__
+    connection.execute(
+        categories_table.update().where(categories_table.c.id == category_id)
+        .values(course_count=categories_table.c.course_count + delta)
+    )
+
+@event.listens_for(Course, 'after_insert')
+def course_counted_in_category(mapper, connection, target):
+    adjust_category_count(connection, target.category_id, 1)
+
+# Tables whose deleted_at column exists in the database. Migrations older than 10
+# rebuild the catalog, search and rankings before the column has been added
+SOFT_DELETE_TABLES = set()
+
+def not_deleted(table):
+    """deleted_at IS NULL, or always true while the column does not exist yet"""
+    if table.name not in SOFT_DELETE_TABLES:
+        columns = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+        if 'deleted_at' not in columns:
+            return true()
+        SOFT_DELETE_TABLES.add(table.name)
+    return table.c.deleted_at.is_(None)
+
+def soft_deleted(target):
+    """True when a flushed user or course was just marked deleted"""
+    history = inspect(target).attrs.deleted_at.history
+    return bool(history.added and history.added[0] is not None and not any(history.deleted))
+
+@event.listens_for(Course, 'after_delete')
+def course_uncounted_from_category(mapper, connection, target):
+    # A soft-deleted course has already left its category's count
+    if target.deleted_at is None:
+        adjust_category_count(connection, target.category_id, -1)
+
+@event.listens_for(Course, 'after_update')
+def course_recategorized(mapper, connection, target):
+    if soft_deleted(target):
+        adjust_category_count(connection, target.category_id, -1)
+        return
+    history = inspect(target).attrs.category_id.history
+    if history.deleted and history.added:
+        adjust_category_count(connection, history.deleted[0], -1)
+        adjust_category_count(connection, history.added[0], 1)
+
+def category_counter_update(only_drifted=True):
+    """UPDATE recomputing every category's course count from the courses table"""
+    categories_table = Category.__table__
+    courses_table = Course.__table__
+    course_count = select(func.count()).where(
+        courses_table.c.category_id == categories_table.c.id, not_deleted(courses_table)
+    ).scalar_subquery()
+    update = categories_table.update().values(course_count=course_count)
+    if only_drifted:
+        update = update.where(categories_table.c.course_count != course_count)
+    return update
+
+def repair_course_counters():
+    """Fix every course and category whose stored aggregates have drifted"""
+    result = db.session.execute(course_counter_update())
+    repaired = result.rowcount + db.session.execute(category_counter_update()).rowcount
+    db.session.commit()
+    return repaired
+
+# ==================== SEARCH INDEX ====================
+
+course_search = CourseSearchIndex()
+
+# Course columns whose change alters the indexed text
+SEARCHABLE_COURSE_FIELDS = ('title', 'description', 'category_id', 'instructor_id')
+
+def course_search_documents(connection, course_ids=None, batch_size=1000):
+    """Yield batches of (id, title, description, category, instructor) rows"""
+    courses_table = Course.__table__
+    categories_table = Category.__table__
+    users_table = User.__table__
+    query = select(
+        courses_table.c.id, courses_table.c.title, courses_table.c.description,
+        categories_table.c.name, users_table.c.name
+    ).select_from(
+        courses_table
+        .join(categories_table, categories_table.c.id == courses_table.c.category_id)
+        .join(users_table, users_table.c.id == courses_table.c.instructor_id)
+    ).where(not_deleted(courses_table)).order_by(courses_table.c.id)
+    if course_ids is not None:
+        query = query.where(courses_table.c.id.in_(course_ids))
+    
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            query.where(courses_table.c.id > last_id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+def reindex_courses(connection, course_ids):
+    """Refresh the search documents of the given courses"""
+    if not course_ids or not course_search.is_ready(connection):
+        return
+    for documents in course_search_documents(connection, course_ids):
+        course_search.upsert(connection, documents)
+
+@event.listens_for(Course, 'after_insert')
+def course_inserted(mapper, connection, target):
+    reindex_courses(connection, [target.id])
+
+@event.listens_for(Course, 'after_update')
+def course_updated(mapper, connection, target):
+    if soft_deleted(target):
+        if course_search.is_ready(connection):
+            course_search.remove(connection, [target.id])
+        return
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in SEARCHABLE_COURSE_FIELDS):
+        reindex_courses(connection, [target.id])
+
+@event.listens_for(Course, 'after_delete')
+def course_deleted(mapper, connection, target):
+    if course_search.is_ready(connection):
+        course_search.remove(connection, [target.id])
+
+@event.listens_for(User, 'after_update')
+def instructor_renamed(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        courses_table = Course.__table__
+        course_ids = connection.execute(
+            select(courses_table.c.id).where(courses_table.c.instructor_id == target.id)
+        ).scalars().all()
+        reindex_courses(connection, course_ids)
+
+@event.listens_for(Category, 'after_update')
+def category_renamed(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        courses_table = Course.__table__
+        course_ids = connection.execute(
+            select(courses_table.c.id).where(courses_table.c.category_id == target.id)
+        ).scalars().all()
+        reindex_courses(connection, course_ids)
+
+def rebuild_course_search():
+    """Create the search index if needed and refill it from the courses table"""
+    with db.engine.begin() as connection:
+        if not course_search.create(connection):
+            return None
+        return course_search.rebuild(connection, course_search_documents(connection))
+
+def apply_course_search(query, search):
+    """Filter a Course query by free-text search
+
+    Returns the filtered query and its relevance column (lower is better),
+    or None for the column when the search index is unavailable.
+    """
+    match_query = build_match_query(search)
+    if match_query and course_search.is_ready(db.session.connection()):
+        results = course_search.ranked(match_query)
+        return query.join(results, results.c.course_id == Course.id), results.c.rank
+    return query.filter(or_(
+        Course.title.icontains(search, autoescape=True),
+        Course.description.icontains(search, autoescape=True)
+    )), None
+
+# ==================== RECOMMENDATIONS ====================
+# "Students also enrolled in": course_co_enrollments counts the students each
+# two courses share, and course_recommendations keeps every course's best few.
+# Enrollment changes update both at the end of each flush; Core writers call
+# apply_enrollment_changes() or rebuild_recommendations() themselves, and bulk
+# imports queue recount_co_enrollments() for the courses they enrolled in.
+
+RecommendedCourse = namedtuple('RecommendedCourse', 'id title instructor price level shared')
+
+def record_enrollment_change(target, step):
+    session_ = object_session(target)
+    if session_ is not None:
+        session_.info.setdefault('enrollment_changes', []).append((target.user_id, target.course_id, step))
+
+@event.listens_for(Enrollment, 'after_insert')
+def enrollment_added(mapper, connection, target):
+    record_enrollment_change(target, 1)
+
+@event.listens_for(Enrollment, 'after_delete')
+def enrollment_removed(mapper, connection, target):
+    record_enrollment_change(target, -1)
+
+@event.listens_for(SessionBase, 'after_flush')
+def apply_flushed_enrollment_changes(session_, flush_context):
+    # After the whole flush, so a student's cascaded deletes are seen together
+    changes = session_.info.pop('enrollment_changes', None)
+    if changes:
+        apply_enrollment_changes(session_.connection(), changes)
+
+@event.listens_for(SessionBase, 'after_rollback')
+def discard_enrollment_changes(session_):
+    session_.info.pop('enrollment_changes', None)
+
+def apply_enrollment_changes(connection, changes):
+    """Update co-enrollment counts and recommendations for (user_id, course_id, +1/-1) changes
+
+    Runs after the changes are written, inside the same transaction.
+    """
+    added, removed = defaultdict(set), defaultdict(set)
+    for user_id, course_id, step in changes:
+        (added if step > 0 else removed)[user_id].add(course_id)
+    user_ids = added.keys() | removed.keys()
+    
+    enrollments_table = Enrollment.__table__
+    current = defaultdict(set)
+    for user_id, course_id in connection.execute(
+        select(enrollments_table.c.user_id, enrollments_table.c.course_id)
+        .where(enrollments_table.c.user_id.in_(user_ids))
+    ):
+        current[user_id].add(course_id)
+    deltas = Counter()
+    for user_id in user_ids:
+        deltas.update(pair_changes(current[user_id], added[user_id], removed[user_id]))
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    
+    pairs_table = CoEnrollment.__table__
+    dialect_insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    upsert = dialect_insert(pairs_table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[pairs_table.c.course_id, pairs_table.c.other_id],
+        set_={'shared': pairs_table.c.shared + upsert.excluded.shared}
+    )
+    connection.execute(upsert, [{'course_id': course_id, 'other_id': other_id, 'shared': delta}
+                                for (course_id, other_id), delta in deltas.items()])
+    course_ids = {course_id for course_id, _ in deltas}
+    connection.execute(pairs_table.delete().where(
+        pairs_table.c.course_id.in_(course_ids), pairs_table.c.shared <= 0
+    ))
+    refresh_course_recommendations(connection, course_ids)
+
+def refresh_course_recommendations(connection, course_ids=None):
+    """Re-rank the recommendations of the given (or all) courses from their co-enrollments
+
+    Each course reads only its top rows off the (course_id, shared, other_id)
+    index; ties go to the newer course.
+    """
+    pairs_table = CoEnrollment.__table__
+    recommendations_table = CourseRecommendation.__table__
+    if course_ids is None:
+        connection.execute(recommendations_table.delete())
+        course_ids = connection.execute(select(Course.__table__.c.id)).scalars().all()
+    else:
+        connection.execute(recommendations_table.delete().where(
+            recommendations_table.c.course_id.in_(course_ids)
+        ))
+    if not course_ids:
+        return
+    course_id = bindparam('refreshed_course_id')
+    best = select(pairs_table.c.other_id, pairs_table.c.shared).where(
+        pairs_table.c.course_id == course_id
+    ).order_by(pairs_table.c.shared.desc(), pairs_table.c.other_id.desc()).limit(
+        app.config['RECOMMENDATIONS_PER_COURSE']
+    ).subquery()
+    rank = func.row_number().over(order_by=(best.c.shared.desc(), best.c.other_id.desc()))
+    connection.execute(
+        recommendations_table.insert().from_select(
+            ['course_id', 'rank', 'recommended_id', 'shared'],
+            select(course_id, rank, best.c.other_id, best.c.shared)
+        ),
+        [{'refreshed_course_id': course_id} for course_id in course_ids]
+    )
+
+def rebuild_recommendations():
+    """Recount every co-enrollment from the enrollments table; returns the number of course pairs
+
+    Holds the write lock throughout, so enrollments made meanwhile wait
+    rather than being lost.
+    """
+    enrollments_table = Enrollment.__table__
+    pairs_table = CoEnrollment.__table__
+    with db.engine.begin() as connection:
+        connection.execute(pairs_table.delete())
+        user_ids, course_ids = array('q'), array('q')
+        for user_id, course_id in connection.execution_options(yield_per=10000).execute(
+            select(enrollments_table.c.user_id, enrollments_table.c.course_id)
+            .order_by(enrollments_table.c.user_id)
+        ):
+            user_ids.append(user_id)
+            course_ids.append(course_id)
+        courses, others, shared = co_enrollment_counts(user_ids, course_ids)
+        del user_ids, course_ids
+        # Plain tuples through the driver: a million rows would spend most of
+        # their time having SQLAlchemy build parameter dicts
+        marker = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+        insert = (f'INSERT INTO {pairs_table.name} (course_id, other_id, shared) '
+                  f'VALUES ({marker}, {marker}, {marker})')
+        for batch in batched(zip(courses, others, shared), app.config['IMPORT_BATCH_SIZE']):
+            connection.exec_driver_sql(insert, batch)
+        refresh_course_recommendations(connection)
+    cache.invalidate('recommendations')
+    return len(shared)
+
+def recount_co_enrollments(course_ids):
+    """Recount the co-enrollments of the given courses and re-rank what they touch; returns the pairs stored
+
+    Bulk imports queue this instead of updating pairs row by row. Like
+    rebuild_recommendations() it holds the write lock until it finishes.
+    """
+    enrollments_table = Enrollment.__table__
+    pairs_table = CoEnrollment.__table__
+    course_ids = set(course_ids)
+    with db.engine.begin() as connection:
+        # Deleting first takes the write lock before anything is read
+        stale = connection.execute(pairs_table.delete().where(or_(
+            pairs_table.c.course_id.in_(course_ids), pairs_table.c.other_id.in_(course_ids)
+        )).returning(pairs_table.c.course_id)).scalars().all()
+        students = select(enrollments_table.c.user_id).where(enrollments_table.c.course_id.in_(course_ids))
+        user_ids, enrolled = array('q'), array('q')
+        for user_id, course_id in connection.execution_options(yield_per=10000).execute(
+            select(enrollments_table.c.user_id, enrollments_table.c.course_id)
+            .where(enrollments_table.c.user_id.in_(students))
+            .order_by(enrollments_table.c.user_id)
+        ):
+            user_ids.append(user_id)
+            enrolled.append(course_id)
+        rows = [(course_id, other_id, shared)
+                for course_id, other_id, shared in zip(*co_enrollment_counts(user_ids, enrolled))
+                if course_id in course_ids or other_id in course_ids]
+        del user_ids, enrolled
+        marker = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+        insert = (f'INSERT INTO {pairs_table.name} (course_id, other_id, shared) '
+                  f'VALUES ({marker}, {marker}, {marker})')
+        for batch in batched(rows, app.config['IMPORT_BATCH_SIZE']):
+            connection.exec_driver_sql(insert, batch)
+        refresh_course_recommendations(connection, sorted(course_ids.union(stale)))
+    cache.invalidate('recommendations')
+    return len(rows)
+
+def load_recommendations():
+    """Every course's recommendations, as {course_id: (RecommendedCourse, ...)} best first"""
+    recommendations_table = CourseRecommendation.__table__
+    courses_table = Course.__table__
+    users_table = User.__table__
+    rows = db.session.execute(
+        select(recommendations_table.c.course_id, courses_table.c.id, courses_table.c.title,
+               users_table.c.name, courses_table.c.price, courses_table.c.level,
+               recommendations_table.c.shared)
+        .join(courses_table, courses_table.c.id == recommendations_table.c.recommended_id)
+        .join(users_table, users_table.c.id == courses_table.c.instructor_id)
+        .where(courses_table.c.deleted_at.is_(None))
+        .order_by(recommendations_table.c.course_id, recommendations_table.c.rank)
+    )
+    return group_recommendations((row[0], RecommendedCourse(*row[1:])) for row in rows)
+
+# ==================== COURSE RANKINGS ====================
+# course_rankings holds each course's trending score, smoothed rating and
+# enrollment count, so every ranked listing is one indexed read. Writes adjust
+# it as they happen; `python app.py refresh_rankings` recomputes it from scratch.
+# When a trending era ends, the rebase_rankings job rescales every score to the
+# next one; until it has, writes add to each row at the row's own era.
+
+course_ranker = RankingScorer(
+    half_life_days=app.config['TRENDING_HALF_LIFE_DAYS'],
+    review_weight=app.config['TRENDING_REVIEW_WEIGHT'],
+    prior_rating=app.config['RATING_PRIOR'],
+    prior_reviews=app.config['RATING_PRIOR_REVIEWS']
+)
+
+# Ranked listing orders, by the `sort` query parameter
+COURSE_RANKINGS = {
+    'trending': CourseRanking.trending_score,
+    'top_rated': CourseRanking.rating_score,
+    'most_enrolled': CourseRanking.enrollment_count,
+}
+
+def adjust_course_ranking(connection, course_id, trending=0.0, era=None, enrollments=0, rerate=False):
+    """Apply score changes to a course's ranking row inside the current transaction
+
+    trending is relative to era; it is rescaled if the row is still in the
+    previous era, or already in the next one. rerate recomputes the rating
+    score from the course's review counters, which the listeners above have
+    already updated.
+    """
+    rankings_table = CourseRanking.__table__
+    values = {}
+    if trending:
+        values['trending_score'] = rankings_table.c.trending_score + case(
+            (rankings_table.c.trending_era == era, trending),
+            (rankings_table.c.trending_era == era + 1, trending * course_ranker.era_scale(era, era + 1)),
+            else_=trending * course_ranker.era_scale(era, era - 1)
+        )
+    if enrollments:
+        values['enrollment_count'] = rankings_table.c.enrollment_count + enrollments
+    if rerate:
+        courses_table = Course.__table__
+        values['rating_score'] = select(
+            course_ranker.rating_score(courses_table.c.review_count, courses_table.c.rating_sum)
+        ).where(courses_table.c.id == course_id).scalar_subquery()
+    if values:
+        connection.execute(
+            rankings_table.update().where(rankings_table.c.course_id == course_id).values(**values)
+        )
+
+def sync_ranked_courses(connection, course_ids):
+    """Add ranking rows for new courses and follow category changes of existing ones"""
+    if not course_ids:
+        return
+    rankings_table = CourseRanking.__table__
+    courses_table = Course.__table__
+    dialect_insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    # New rows join the era the other rows are in, which lags the clock until the rebase
+    era = select(func.coalesce(func.max(rankings_table.c.trending_era), course_ranker.era())).scalar_subquery()
+    upsert = dialect_insert(rankings_table).from_select(
+        ['course_id', 'category_id', 'rating_score', 'enrollment_count', 'trending_era'],
+        select(courses_table.c.id, courses_table.c.category_id,
+               course_ranker.rating_score(courses_table.c.review_count, courses_table.c.rating_sum),
+               courses_table.c.enrollment_count, era)
+        .where(courses_table.c.id.in_(course_ids), courses_table.c.deleted_at.is_(None))
+    )
+    connection.execute(upsert.on_conflict_do_update(
+        index_elements=[rankings_table.c.course_id],
+        set_={'category_id': upsert.excluded.category_id}
+    ))
+
+@event.listens_for(Enrollment, 'after_insert')
+def enrollment_ranked(mapper, connection, target):
+    era = course_ranker.era()
+    adjust_course_ranking(connection, target.course_id, era=era, enrollments=1,
+                          trending=course_ranker.enrollment_score(target.enrolled_at, era))
+
+@event.listens_for(Enrollment, 'after_delete')
+def enrollment_unranked(mapper, connection, target):
+    era = course_ranker.era()
+    adjust_course_ranking(connection, target.course_id, era=era, enrollments=-1,
+                          trending=-course_ranker.enrollment_score(target.enrolled_at, era))
+
+@event.listens_for(Review, 'after_insert')
+def review_ranked(mapper, connection, target):
+    era = course_ranker.era()
+    adjust_course_ranking(connection, target.course_id, era=era, rerate=True,
+                          trending=course_ranker.review_score(target.created_at, era))
+
+@event.listens_for(Review, 'after_delete')
+def review_unranked(mapper, connection, target):
+    era = course_ranker.era()
+    adjust_course_ranking(connection, target.course_id, era=era, rerate=True,
+                          trending=-course_ranker.review_score(target.created_at, era))
+
+@event.listens_for(Review, 'after_update')
+def review_rerated(mapper, connection, target):
+    if inspect(target).attrs.rating.history.has_changes():
+        adjust_course_ranking(connection, target.course_id, rerate=True)
+
+@event.listens_for(Course, 'after_insert')
+def course_ranked(mapper, connection, target):
+    sync_ranked_courses(connection, [target.id])
+
+@event.listens_for(Course, 'after_update')
+def course_rank_recategorized(mapper, connection, target):
+    if soft_deleted(target):
+        course_unranked(mapper, connection, target)
+    elif inspect(target).attrs.category_id.history.has_changes():
+        sync_ranked_courses(connection, [target.id])
+
+@event.listens_for(Course, 'after_delete')
+def course_unranked(mapper, connection, target):
+    rankings_table = CourseRanking.__table__
+    connection.execute(rankings_table.delete().where(rankings_table.c.course_id == target.id))
+
+def refresh_course_rankings():
+    """Recompute every course's ranking row from enrollments and reviews; returns the number of courses"""
+    rankings_table = CourseRanking.__table__
+    courses_table = Course.__table__
+    enrollments_table = Enrollment.__table__
+    reviews_table = Review.__table__
+    with db.engine.begin() as connection:
+        # Deleting first takes the write lock, so no enrollment slips in unscored
+        connection.execute(rankings_table.delete())
+        era = course_ranker.era()
+        streaming = connection.execution_options(yield_per=10000)
+        trending = course_ranker.trending_scores(
+            streaming.execute(select(enrollments_table.c.course_id, enrollments_table.c.enrolled_at)),
+            streaming.execute(select(reviews_table.c.course_id, reviews_table.c.created_at)),
+            era
+        )
+        courses = connection.execute(select(
+            courses_table.c.id, courses_table.c.category_id, courses_table.c.enrollment_count,
+            course_ranker.rating_score(courses_table.c.review_count, courses_table.c.rating_sum)
+        ).where(not_deleted(courses_table))).all()
+        for batch in batched(courses, app.config['IMPORT_BATCH_SIZE']):
+            connection.execute(rankings_table.insert(), [
+                {'course_id': course_id, 'category_id': category_id, 'enrollment_count': enrollments,
+                 'rating_score': rating, 'trending_score': trending.get(course_id, 0.0), 'trending_era': era}
+                for course_id, category_id, enrollments, rating in batch
+            ])
+    cache.invalidate('catalog')
+    return len(courses)
+
+def rebase_course_rankings():
+    """Rescale trending scores from earlier eras to the current one; returns the rows rescaled
+
+    Scaling every row of an era by the same factor keeps their order, so
+    listings and their caches stay valid.
+    """
+    rankings_table = CourseRanking.__table__
+    era = course_ranker.era()
+    with db.engine.connect() as connection:
+        stale = connection.execute(
+            select(rankings_table.c.trending_era).where(rankings_table.c.trending_era < era).distinct()
+        ).scalars().all()
+    if not stale:
+        return 0
+    # One statement, so no write sees a half-rebased table
+    scale = case(*[(rankings_table.c.trending_era == old_era, course_ranker.era_scale(old_era, era))
+                   for old_era in stale], else_=1.0)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            rankings_table.update().where(rankings_table.c.trending_era.in_(stale))
+            .values(trending_score=rankings_table.c.trending_score * scale, trending_era=era)
+        ).rowcount
+
+# ==================== INSTRUCTOR ANALYTICS ====================
+# Two rollups are kept as enrollments, completions and reviews are written:
+# course_daily_stats per course and day, instructor_daily_stats per instructor
+# and day with the revenue of all their courses. A chart then reads one row
+# per day (or fewer) however many courses and students there are.
+# `python app.py rebuild_analytics` recomputes both.
+
+DAILY_STAT_COLUMNS = ('enrollments', 'completions', 'reviews', 'rating_sum')
+
+def stat_day(at):
+    return (at or datetime.utcnow()).date()
+
+def dialect_insert_for(connection):
+    return postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+
+def apply_daily_stats(connection, changes):
+    """Add {(course_id, day): {column: delta}} to both rollups inside the current transaction"""
+    changes = {key: deltas for key, deltas in changes.items() if any(deltas.values())}
+    if not changes:
+        return
+    stats_table = CourseDailyStat.__table__
+    instructor_table = InstructorDailyStat.__table__
+    courses_table = Course.__table__
+    dialect_insert = dialect_insert_for(connection)
+    deltas = [bindparam(f'stat_{name}', type_=Integer) for name in DAILY_STAT_COLUMNS]
+    # Rows take the course's instructor, and revenue its price, as they are written
+    course_upsert = dialect_insert(stats_table).from_select(
+        ['course_id', 'day', 'instructor_id', *DAILY_STAT_COLUMNS],
+        select(courses_table.c.id, bindparam('stat_day', type_=Date), courses_table.c.instructor_id, *deltas)
+        .where(courses_table.c.id == bindparam('stat_course_id'))
+    )
+    instructor_upsert = dialect_insert(instructor_table).from_select(
+        ['instructor_id', 'day', *DAILY_STAT_COLUMNS, 'revenue'],
+        select(courses_table.c.instructor_id, bindparam('stat_day', type_=Date), *deltas,
+               deltas[0] * courses_table.c.price)
+        .where(courses_table.c.id == bindparam('stat_course_id'))
+    )
+    parameters = [
+        {'stat_course_id': course_id, 'stat_day': day,
+         **{f'stat_{name}': deltas.get(name, 0) for name in DAILY_STAT_COLUMNS}}
+        for (course_id, day), deltas in changes.items()
+    ]
+    connection.execute(course_upsert.on_conflict_do_update(
+        index_elements=[stats_table.c.course_id, stats_table.c.day],
+        set_={name: stats_table.c[name] + course_upsert.excluded[name] for name in DAILY_STAT_COLUMNS}
+    ), parameters)
+    connection.execute(instructor_upsert.on_conflict_do_update(
+        index_elements=[instructor_table.c.instructor_id, instructor_table.c.day],
+        set_={name: instructor_table.c[name] + instructor_upsert.excluded[name]
+              for name in (*DAILY_STAT_COLUMNS, 'revenue')}
+    ), parameters)
+
+def shift_instructor_stats(connection, course_ids, step, price=None, instructor_id=None):
+    """Add (step=1) or take away (step=-1) whole courses' days in their instructors' rollup
+
+    price and instructor_id stand in for a single course's current ones, to
+    take away what it contributed before its price or instructor changed.
+    """
+    if not course_ids:
+        return
+    stats_table = CourseDailyStat.__table__
+    instructor_table = InstructorDailyStat.__table__
+    courses_table = Course.__table__
+    if instructor_id is None:
+        instructor, group_by = courses_table.c.instructor_id, [courses_table.c.instructor_id, stats_table.c.day]
+    else:
+        instructor, group_by = bindparam('old_instructor_id', instructor_id, type_=Integer), [stats_table.c.day]
+    unit_price = courses_table.c.price if price is None else bindparam('old_price', price, type_=db.Float)
+    upsert = dialect_insert_for(connection)(instructor_table).from_select(
+        ['instructor_id', 'day', *DAILY_STAT_COLUMNS, 'revenue'],
+        select(instructor, stats_table.c.day,
+               *(step * func.sum(stats_table.c[name]) for name in DAILY_STAT_COLUMNS),
+               step * func.sum(stats_table.c.enrollments * unit_price))
+        .join_from(stats_table, courses_table, courses_table.c.id == stats_table.c.course_id)
+        .where(stats_table.c.course_id.in_(course_ids))
+        .group_by(*group_by)
+    )
+    connection.execute(upsert.on_conflict_do_update(
+        index_elements=[instructor_table.c.instructor_id, instructor_table.c.day],
+        set_={name: instructor_table.c[name] + upsert.excluded[name]
+              for name in (*DAILY_STAT_COLUMNS, 'revenue')}
+    ))
+
+def sync_daily_stat_instructors(connection, course_ids):
+    """Copy the given courses' instructors into their course_daily_stats rows"""
+    if not course_ids:
+        return
+    stats_table = CourseDailyStat.__table__
+    courses_table = Course.__table__
+    instructor = select(courses_table.c.instructor_id).where(
+        courses_table.c.id == stats_table.c.course_id
+    ).scalar_subquery()
+    connection.execute(
+        stats_table.update()
+        .where(stats_table.c.course_id.in_(course_ids), stats_table.c.instructor_id != instructor)
+        .values(instructor_id=instructor)
+    )
+
+def enrollment_stats(target, step):
+    return {(target.course_id, stat_day(target.enrolled_at)): {
+        'enrollments': step, 'completions': step if target.completed else 0
+    }}
+
+def review_stats(target, step, rating):
+    return {(target.course_id, stat_day(target.created_at)): {
+        'reviews': step, 'rating_sum': rating
+    }}
+
+@event.listens_for(Enrollment, 'after_insert')
+def enrollment_rolled_up(mapper, connection, target):
+    apply_daily_stats(connection, enrollment_stats(target, 1))
+
+@event.listens_for(Enrollment, 'after_delete')
+def enrollment_rolled_back(mapper, connection, target):
+    apply_daily_stats(connection, enrollment_stats(target, -1))
+
+@event.listens_for(Enrollment, 'after_update')
+def enrollment_completion_rolled_up(mapper, connection, target):
+    apply_daily_stats(connection, {(target.course_id, stat_day(target.enrolled_at)): {
+        'completions': completion_change(target)
+    }})
+
+@event.listens_for(Review, 'after_insert')
+def review_rolled_up(mapper, connection, target):
+    apply_daily_stats(connection, review_stats(target, 1, target.rating))
+
+@event.listens_for(Review, 'after_delete')
+def review_rolled_back(mapper, connection, target):
+    apply_daily_stats(connection, review_stats(target, -1, -target.rating))
+
+@event.listens_for(Review, 'after_update')
+def review_rating_rolled_up(mapper, connection, target):
+    history = inspect(target).attrs.rating.history
+    if history.deleted and history.added:
+        apply_daily_stats(connection, review_stats(target, 0, history.added[0] - history.deleted[0]))
+
+@event.listens_for(Course, 'after_update')
+def course_stats_restated(mapper, connection, target):
+    """Move a course's days to its new instructor, or reprice their revenue"""
+    state = inspect(target)
+    price, instructor = state.attrs.price.history, state.attrs.instructor_id.history
+    old_price = price.deleted[0] if price.deleted and price.added else target.price
+    old_instructor = instructor.deleted[0] if instructor.deleted and instructor.added else target.instructor_id
+    if (old_price, old_instructor) == (target.price, target.instructor_id):
+        return
+    shift_instructor_stats(connection, [target.id], -1, price=old_price, instructor_id=old_instructor)
+    sync_daily_stat_instructors(connection, [target.id])
+    shift_instructor_stats(connection, [target.id], 1)
+
+@event.listens_for(Course, 'after_delete')
+def course_stats_deleted(mapper, connection, target):
+    # Its enrollments and reviews were deleted first, taking their activity off the instructor
+    stats_table = CourseDailyStat.__table__
+    connection.execute(stats_table.delete().where(stats_table.c.course_id == target.id))
+
+@event.listens_for(User, 'after_delete')
+def instructor_stats_deleted(mapper, connection, target):
+    instructor_table = InstructorDailyStat.__table__
+    connection.execute(instructor_table.delete().where(instructor_table.c.instructor_id == target.id))
+
+def rebuild_course_daily_stats():
+    """Recompute both analytics rollups from enrollments and reviews; returns the course-day count"""
+    stats_table = CourseDailyStat.__table__
+    instructor_table = InstructorDailyStat.__table__
+    courses_table = Course.__table__
+    enrollments_table = Enrollment.__table__
+    reviews_table = Review.__table__
+    with db.engine.begin() as connection:
+        dialect_name = connection.dialect.name
+        # Deleting first takes the write lock, so no enrollment slips in uncounted
+        connection.execute(stats_table.delete())
+        connection.execute(instructor_table.delete())
+        enrolled_day = day_of(enrollments_table.c.enrolled_at, dialect_name)
+        connection.execute(stats_table.insert().from_select(
+            ['course_id', 'day', 'instructor_id', 'enrollments', 'completions'],
+            select(enrollments_table.c.course_id, enrolled_day, courses_table.c.instructor_id,
+                   func.count(), func.sum(case((enrollments_table.c.completed, 1), else_=0)))
+            .join_from(enrollments_table, courses_table, courses_table.c.id == enrollments_table.c.course_id)
+            .group_by(enrollments_table.c.course_id, enrolled_day, courses_table.c.instructor_id)
+        ))
+        reviewed_day = day_of(reviews_table.c.created_at, dialect_name)
+        upsert = dialect_insert_for(connection)(stats_table).from_select(
+            ['course_id', 'day', 'instructor_id', 'reviews', 'rating_sum'],
+            select(reviews_table.c.course_id, reviewed_day, courses_table.c.instructor_id,
+                   func.count(), func.sum(reviews_table.c.rating))
+            .join_from(reviews_table, courses_table, courses_table.c.id == reviews_table.c.course_id)
+            .group_by(reviews_table.c.course_id, reviewed_day, courses_table.c.instructor_id)
+        )
+        connection.execute(upsert.on_conflict_do_update(
+            index_elements=[stats_table.c.course_id, stats_table.c.day],
+            set_={'reviews': upsert.excluded.reviews, 'rating_sum': upsert.excluded.rating_sum}
+        ))
+        connection.execute(instructor_table.insert().from_select(
+            ['instructor_id', 'day', *DAILY_STAT_COLUMNS, 'revenue'],
+            select(courses_table.c.instructor_id, stats_table.c.day,
+                   *(func.sum(stats_table.c[name]) for name in DAILY_STAT_COLUMNS),
+                   func.sum(stats_table.c.enrollments * courses_table.c.price))
+            .join_from(stats_table, courses_table, courses_table.c.id == stats_table.c.course_id)
+            .group_by(courses_table.c.instructor_id, stats_table.c.day)
+        ))
+        return connection.scalar(select(func.count()).select_from(stats_table))
+
+def course_window_totals(instructor_id, first_day):
+    """{course_id: Totals} for the instructor's courses with activity since first_day"""
+    stats_table = CourseDailyStat.__table__
+    courses_table = Course.__table__
+    rows = db.session.execute(
+        select(stats_table.c.course_id,
+               *(func.sum(stats_table.c[name]) for name in DAILY_STAT_COLUMNS),
+               # Gross revenue at today's prices
+               func.sum(stats_table.c.enrollments * courses_table.c.price))
+        .join_from(stats_table, courses_table, courses_table.c.id == stats_table.c.course_id)
+        .where(stats_table.c.instructor_id == instructor_id, stats_table.c.day >= first_day)
+        .group_by(stats_table.c.course_id)
+    ).all()
+    return {course_id: Totals(*values) for course_id, *values in rows}
+
+def course_lifetime_totals(course):
+    """Totals since a course was created, from its stored counters"""
+    return Totals(course.enrollment_count, course.completion_count, course.review_count,
+                  course.rating_sum, course.enrollment_count * course.price)
+
+def activity_series(instructor_id, first_day, last_day, course=None):
+    """(bucket size, [(bucket start, Totals)]) from first_day to last_day, for one course or all"""
+    size = bucket_size(first_day, last_day)
+    if course is None:
+        table = InstructorDailyStat.__table__
+        revenue = func.sum(table.c.revenue)
+        criteria = [table.c.instructor_id == instructor_id]
+    else:
+        table = CourseDailyStat.__table__
+        revenue = func.sum(table.c.enrollments) * course.price
+        criteria = [table.c.course_id == course.id]
+    bucket = bucket_of(table.c.day, size, db.engine.dialect.name).label('bucket')
+    rows = db.session.execute(
+        select(bucket, *(func.sum(table.c[name]) for name in DAILY_STAT_COLUMNS), revenue)
+        .where(*criteria, table.c.day >= first_day, table.c.day <= last_day)
+        .group_by(bucket).order_by(bucket)
+    ).all()
+    return size, fill_buckets(rows, first_day, last_day, size)
+
+# ==================== QUERY LAYER ====================
+
+def live_courses():
+    """Courses that have not been deleted"""
+    return Course.query.filter(Course.deleted_at.is_(None))
+
+def course_listing_query():
+    """Courses with everything a course card renders loaded up front"""
+    return live_courses().options(
+        joinedload(Course.category),
+        joinedload(Course.instructor)
+    )
+
+def ranked_course_query(ranking, category_id=None):
+    """Course cards joined to their ranking row, optionally within one category
+
+    Returns the query and its sort key, (score, course id), best first when descending.
+    """
+    query = course_listing_query().join(CourseRanking, CourseRanking.course_id == Course.id)
+    if category_id:
+        query = query.filter(CourseRanking.category_id == category_id)
+    return query, (COURSE_RANKINGS[ranking], CourseRanking.course_id)
+
+CategoryEntry = namedtuple('CategoryEntry', 'id name description course_count')
+
+def load_categories():
+    """Every category with its stored course count, as immutable entries"""
+    categories_table = Category.__table__
+    rows = db.session.execute(
+        select(categories_table.c.id, categories_table.c.name,
+               categories_table.c.description, categories_table.c.course_count)
+        .order_by(categories_table.c.id)
+    ).all()
+    return tuple(CategoryEntry(*row) for row in rows)
+
+def enrollment_listing_query(user_id):
+    """A student's enrollments in courses not deleted, with their courses, categories and instructors"""
+    return Enrollment.query.filter_by(user_id=user_id).join(Enrollment.course).filter(
+        Course.deleted_at.is_(None)
+    ).options(
+        contains_eager(Enrollment.course).joinedload(Course.category),
+        contains_eager(Enrollment.course).joinedload(Course.instructor)
+    ).order_by(Enrollment.enrolled_at.desc())
+
+def review_listing_query(course_id):
+    """A course's reviews, newest first, with their authors"""
+    return Review.query.filter_by(course_id=course_id).options(
+        joinedload(Review.reviewer)
+    ).order_by(Review.created_at.desc())
+
+def review_page(course_id, cursor=None):
+    """One page of a course's reviews, newest first, for the course page and its "load more" button"""
+    return keyset_paginate(review_listing_query(course_id), (Review.created_at, Review.id),
+                           cursor=cursor, per_page=app.config['REVIEWS_PER_PAGE'])
+
+# Approximate totals shown above paginated listings
+listing_counts = CountCache(ttl=app.config['LISTING_COUNT_TTL'])
+
+# Platform statistics snapshot for the admin panel
+admin_stats_cache = CountCache(ttl=app.config['ADMIN_STATS_TTL'])
+
+def platform_stats():
+    """Count users, courses, enrollments and categories in a single query"""
+    row = db.session.execute(select(
+        select(func.count()).select_from(User.__table__)
+        .where(User.__table__.c.deleted_at.is_(None)).scalar_subquery(),
+        select(func.count()).select_from(Course.__table__)
+        .where(Course.__table__.c.deleted_at.is_(None)).scalar_subquery(),
+        select(func.count()).select_from(Enrollment.__table__).scalar_subquery(),
+        select(func.count()).select_from(Category.__table__).scalar_subquery()
+    )).one()
+    return dict(zip(('total_users', 'total_courses', 'total_enrollments', 'total_categories'), row))
+
+# Sortable columns of the admin tables, by the `sort` query parameter
+ADMIN_USER_SORTS = {'joined': User.created_at, 'name': User.name,
+                    'email': User.email, 'role': User.role}
+ADMIN_COURSE_SORTS = {'created': Course.created_at, 'title': Course.title,
+                      'price': Course.price, 'students': Course.enrollment_count}
+
+def admin_table_page(query, sorts, default_sort, id_column, per_page):
+    """Keyset-paginate an admin table by the request's sort, dir and cursor parameters"""
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    descending = request.args.get('dir', 'desc') != 'asc'
+    page = keyset_paginate(query, (sorts[sort], id_column),
+                           cursor=request.args.get('cursor'),
+                           per_page=per_page, descending=descending)
+    return page, sort, descending
+
+# Maximum SQL queries per listing route, with the signed-in user already cached;
+# {course_id} and {category_id} are filled in with existing rows
+ROUTE_QUERY_BUDGETS = {
+    None: {'/': 1, '/courses': 2, '/courses?search=course': 2,
+           '/courses?category={category_id}': 2, '/courses?sort=trending': 2,
+           '/courses?sort=top_rated&category={category_id}': 2, '/course/{course_id}': 3,
+           '/course/{course_id}/reviews': 1, '/api/v1/courses': 1,
+           '/api/v1/courses/{course_id}': 1, '/api/v1/categories': 0,
+           '/api/v1/courses?sort=most_enrolled&category={category_id}': 1},
+    'student': {'/dashboard/student': 1, '/api/v1/me/enrollments': 1},
+    'instructor': {'/dashboard/instructor': 1, '/dashboard/instructor/analytics': 3,
+                   '/dashboard/instructor/analytics?days=0': 2},
+    'admin': {'/admin': 1, '/admin/users': 1, '/admin/courses': 1,
+              '/admin/users?sort=name&dir=asc&role=student': 1},
+}
+
+# Tables hot routes may read in full: categories are few and listed whole,
+# search_results is the already-filtered FTS match set
+PLAN_SCAN_ALLOWED = ('categories', 'search_results')
+
+# ==================== RESPONSE CACHE ====================
+
+# Cache namespaces:
+#   catalog       which courses are listed, in what order, with what counts
+#   categories    the category list and its per-category course counts
+#   course:<id>   everything shown about one course (details, card, reviews,
+#                 and its instructor's course count)
+#   recommendations  the co-enrollment recommendations shown with courses
+cache = create_cache(
+    backend=app.config['CACHE_BACKEND'],
+    path=app.config['CACHE_PATH'],
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+    default_ttl=app.config['CACHE_DEFAULT_TTL']
+)
+
+# Profiling keeps its on/off switch in the cache backend so every worker sees it
+profiler = RequestProfiler(
+    enabled=app.config['PROFILING_ENABLED'],
+    slow_ms=app.config['SLOW_REQUEST_MS'],
+    slow_queries=app.config['SLOW_REQUEST_QUERIES'],
+    keep_statements=app.config['PROFILE_SLOWEST_STATEMENTS'],
+    flag_store=cache.backend
+)
+with app.app_context():
+    profiler.install(app, db.engines.values())
+
+# Categories and their course counts, read on nearly every page; reloaded
+# whenever the 'categories' namespace is invalidated
+category_registry = VersionedSnapshot(cache, 'categories', load_categories,
+                                      ttl=app.config['CATEGORY_CACHE_TTL'])
+
+def all_categories():
+    return category_registry.get()
+
+# Recommendations move with every enrollment, so workers refresh them on the TTL;
+# course edits and removals invalidate them at once
+recommendation_registry = VersionedSnapshot(cache, 'recommendations', load_recommendations,
+                                            ttl=app.config['RECOMMENDATION_CACHE_TTL'])
+
+def recommendations_for(course_id):
+    return recommendation_registry.get().get(course_id, ())
+
+def category_choices():
+    return [(category.id, category.name) for category in all_categories()]
+
+def invalidate_on_commit(target, *namespaces):
+    """Queue cache namespaces to be bumped once target's session commits"""
+    session_ = object_session(target)
+    if session_ is not None:
+        session_.info.setdefault('cache_invalidations', set()).update(namespaces)
+
+@event.listens_for(SessionBase, 'after_commit')
+def apply_cache_invalidations(session_):
+    namespaces = session_.info.pop('cache_invalidations', None)
+    if namespaces:
+        cache.invalidate(*namespaces)
+
+@event.listens_for(SessionBase, 'after_rollback')
+def discard_cache_invalidations(session_):
+    session_.info.pop('cache_invalidations', None)
+
+def course_namespaces(course_ids):
+    return [f'course:{course_id}' for course_id in course_ids]
+
+def instructor_namespaces(connection, instructor_ids):
+    """Namespaces of every course the instructors teach; their pages show how many that is"""
+    courses_table = Course.__table__
+    course_ids = connection.execute(
+        select(courses_table.c.id).where(courses_table.c.instructor_id.in_(set(instructor_ids)))
+    ).scalars().all()
+    return course_namespaces(course_ids)
+
+@event.listens_for(Enrollment, 'after_insert')
+@event.listens_for(Enrollment, 'after_delete')
+@event.listens_for(Review, 'after_insert')
+@event.listens_for(Review, 'after_update')
+@event.listens_for(Review, 'after_delete')
+def course_activity_changed(mapper, connection, target):
+    invalidate_on_commit(target, 'catalog', f'course:{target.course_id}')
+
+@event.listens_for(Course, 'after_insert')
+@event.listens_for(Course, 'after_delete')
+def course_added_or_removed(mapper, connection, target):
+    invalidate_on_commit(target, 'catalog', 'categories', 'recommendations', f'course:{target.id}',
+                         *instructor_namespaces(connection, [target.instructor_id]))
+
+@event.listens_for(Course, 'after_update')
+def course_edited(mapper, connection, target):
+    state = inspect(target)
+    namespaces = ['catalog', 'recommendations', f'course:{target.id}']
+    if state.attrs.category_id.history.has_changes() or soft_deleted(target):
+        namespaces.append('categories')
+    instructors = state.attrs.instructor_id.history
+    if instructors.has_changes() or soft_deleted(target):
+        namespaces += instructor_namespaces(connection, [*instructors.deleted, target.instructor_id])
+    invalidate_on_commit(target, *namespaces)
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_delete')
+def category_added_or_removed(mapper, connection, target):
+    invalidate_on_commit(target, 'categories')
+
+@event.listens_for(Category, 'after_update')
+def category_edited(mapper, connection, target):
+    courses_table = Course.__table__
+    course_ids = connection.execute(
+        select(courses_table.c.id).where(courses_table.c.category_id == target.id)
+    ).scalars().all()
+    invalidate_on_commit(target, 'categories', 'catalog', *course_namespaces(course_ids))
+
+@event.listens_for(User, 'after_update')
+def user_profile_edited(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.name.history.has_changes() or state.attrs.bio.history.has_changes()):
+        return
+    # Instructor names/bios appear on their courses; reviewer names on reviewed courses
+    course_ids = connection.execute(
+        select(Course.__table__.c.id).where(Course.__table__.c.instructor_id == target.id)
+        .union(select(Review.__table__.c.course_id).where(Review.__table__.c.user_id == target.id))
+    ).scalars().all()
+    if course_ids:
+        invalidate_on_commit(target, 'catalog', *course_namespaces(course_ids))
+
+def cached_page(*namespaces):
+    """Cache a view's full response for anonymous visitors
+
+    Namespaces may use the view's arguments, e.g. 'course:{course_id}'.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if (not app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET'
+                    or current_user.is_authenticated or '_flashes' in session):
+                return f(*args, **kwargs)
+            
+            depends_on = [namespace.format(**kwargs) for namespace in namespaces]
+            key = cache.versioned_key('page', request.full_path, depends_on)
+            cached = cache.get('page', key)
+            if cached is not None:
+                body, status, content_type = cached
+                return Response(body, status=status, content_type=content_type)
+            
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                cache.set(key, (response.get_data(), response.status_code, response.content_type))
+            return response
+        return decorated_function
+    return decorator
+
+@app.template_global()
+def cached_fragment(name, *parts, depends_on=(), caller=None):
+    """Render a {% call %} block once per key and namespace versions"""
+    key = cache.versioned_key('fragment', ':'.join([name, *map(str, parts)]), depends_on)
+    html = cache.get('fragment', key)
+    if html is None:
+        html = str(caller())
+        cache.set(key, html)
+    return Markup(html)
+
 # ==================== FORMS ====================
 
 class RegistrationForm(FlaskForm):
@@ -228,6 +1640,21 @@ class CourseForm(FlaskForm):
     submit = SubmitField('Save Course')
 
 
+class ReviewForm(FlaskForm):
+    """Course review form"""
+    rating = SelectField('Rating', coerce=int, choices=[
+        (5, '5 - Excellent'),
+        (4, '4 - Good'),
+        (3, '3 - Average'),
+        (2, '2 - Poor'),
+        (1, '1 - Terrible')
+    ], validators=[DataRequired(message='Please choose a rating')])
+    comment = TextAreaField('Review', validators=[
+        Length(max=2000, message='Review cannot exceed 2000 characters')
+    ])
+    submit = SubmitField('Post Review')
+
+
 class ProfileForm(FlaskForm):
     """User profile update form"""
     name = StringField('Full Name', validators=[
@@ -245,6 +1672,10 @@ class ProfileForm(FlaskForm):
 
 # ==================== UTILITY FUNCTIONS ====================
 
+# Re-run a write path when another worker briefly holds the SQLite write lock
+retry_write = retry_on_lock(db.session, attempts=app.config['DB_LOCK_RETRIES'],
+                            base_delay=app.config['DB_LOCK_RETRY_DELAY'])
+
 def role_required(*roles):
     """Decorator to restrict access based on user role"""
     def decorator(f):
@@ -270,11 +1701,631 @@ def format_date(date):
         return date.strftime('%B %d, %Y')
     return 'N/A'
 
+# ==================== BULK IMPORT ====================
+# Imports write with Core statements, which skip the ORM listeners above, so
+# each writer applies counter, search index, recommendation and cache updates itself.
+
+COURSE_LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+
+def insert_ignoring_conflicts(table):
+    """INSERT that skips rows hitting a unique constraint instead of failing"""
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing()
+    return sqlite_insert(table).on_conflict_do_nothing()
+
+def run_import(records, import_batch, batch_size=None):
+    """Feed batches of (row, record) pairs to import_batch and collect a report"""
+    report = ImportReport()
+    try:
+        for batch in batched(records, batch_size or app.config['IMPORT_BATCH_SIZE']):
+            report.rows += len(batch)
+            import_batch(batch, report)
+    except MalformedInput as error:
+        report.error(None, f'Stopped reading input: {error}')
+    return report
+
+def record_text(record, *names):
+    """First non-empty value among names in an import record, stripped"""
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+def resolve_enrollment_rows(batch, report):
+    """Validate a batch of enrollment records; returns (row, user_id, course_id) tuples"""
+    wanted = []
+    for row, record in batch:
+        if not isinstance(record, dict):
+            report.error(row, 'Expected an object with email and course_id')
+            continue
+        email = record_text(record, 'email', 'user_email')
+        try:
+            course_id = int(record_text(record, 'course_id'))
+        except ValueError:
+            report.error(row, 'course_id must be an integer')
+            continue
+        if not email:
+            report.error(row, 'email is required')
+            continue
+        wanted.append((row, email, course_id))
+    if not wanted:
+        return []
+    
+    users_table = User.__table__
+    courses_table = Course.__table__
+    with db.engine.connect() as connection:
+        users = {email: (user_id, role) for email, user_id, role in connection.execute(
+            select(users_table.c.email, users_table.c.id, users_table.c.role)
+            .where(users_table.c.email.in_({email for _, email, _ in wanted}),
+                   users_table.c.deleted_at.is_(None))
+        )}
+        course_ids = set(connection.execute(
+            select(courses_table.c.id)
+            .where(courses_table.c.id.in_({course_id for _, _, course_id in wanted}),
+                   courses_table.c.deleted_at.is_(None))
+        ).scalars())
+    
+    rows = []
+    for row, email, course_id in wanted:
+        if email not in users:
+            report.error(row, f'No user with email {email}')
+        elif users[email][1] != 'student':
+            report.error(row, f'{email} is not a student')
+        elif course_id not in course_ids:
+            report.error(row, f'Course {course_id} does not exist')
+        else:
+            rows.append((row, users[email][0], course_id))
+    return rows
+
+@retry_write
+def write_enrollments(pairs):
+    """Insert (user_id, course_id) pairs, skipping existing ones; returns the inserted course ids"""
+    enrollments_table = Enrollment.__table__
+    with db.engine.begin() as connection:
+        rows = connection.execute(
+            insert_ignoring_conflicts(enrollments_table)
+            .returning(enrollments_table.c.user_id, enrollments_table.c.course_id,
+                       enrollments_table.c.enrolled_at),
+            [{'user_id': user_id, 'course_id': course_id} for user_id, course_id in pairs]
+        ).all()
+        inserted = [(user_id, course_id) for user_id, course_id, _ in rows]
+        if inserted:
+            add_enrollment_totals(connection, Counter(course_id for _, course_id in inserted))
+            enrolled = Counter((course_id, stat_day(enrolled_at)) for _, course_id, enrolled_at in rows)
+            apply_daily_stats(connection, {key: {'enrollments': count} for key, count in enrolled.items()})
+    return [course_id for _, course_id in inserted]
+
+def add_enrollment_totals(connection, added):
+    """Add {course_id: new enrollments} to the course counters and rankings, one statement each"""
+    courses_table = Course.__table__
+    rankings_table = CourseRanking.__table__
+    parameters = [{'counted_course_id': course_id, 'added': count} for course_id, count in added.items()]
+    connection.execute(
+        courses_table.update().where(courses_table.c.id == bindparam('counted_course_id')).values(
+            enrollment_count=courses_table.c.enrollment_count + bindparam('added'),
+            updated_at=courses_table.c.updated_at
+        ), parameters
+    )
+    era = course_ranker.era()
+    weight = course_ranker.enrollment_score(datetime.utcnow(), era)
+    # Same era handling as adjust_course_ranking()
+    connection.execute(
+        rankings_table.update().where(rankings_table.c.course_id == bindparam('counted_course_id')).values(
+            trending_score=rankings_table.c.trending_score + bindparam('added') * case(
+                (rankings_table.c.trending_era == era, weight),
+                (rankings_table.c.trending_era == era + 1, weight * course_ranker.era_scale(era, era + 1)),
+                else_=weight * course_ranker.era_scale(era, era - 1)
+            ),
+            enrollment_count=rankings_table.c.enrollment_count + bindparam('added')
+        ), parameters
+    )
+
+def import_enrollment_batch(batch, report):
+    """Write one batch of enrollment records; returns the course ids enrolled in"""
+    rows = resolve_enrollment_rows(batch, report)
+    if not rows:
+        return []
+    inserted = write_enrollments([(user_id, course_id) for _, user_id, course_id in rows])
+    report.inserted += len(inserted)
+    report.skipped += len(rows) - len(inserted)
+    if inserted:
+        cache.invalidate('catalog', *course_namespaces(set(inserted)))
+        admin_stats_cache.clear()
+    return inserted
+
+def import_enrollments(records, batch_size=None):
+    """Enroll students from (email, course_id) records; existing enrollments are skipped
+
+    Co-enrollments are recounted afterwards by one recount_co_enrollments job
+    for all the courses enrolled in: updating them row by row would cost
+    more than the import itself.
+    """
+    enrolled = set()
+
+    def import_batch(batch, report):
+        enrolled.update(import_enrollment_batch(batch, report))
+
+    report = run_import(records, import_batch, batch_size)
+    if enrolled:
+        job_queue.enqueue('recount_co_enrollments', {'course_ids': sorted(enrolled)})
+    return report
+
+def parse_course_record(record, instructors, categories):
+    """Validate one course definition like CourseForm does; returns (values, error)"""
+    values = {
+        'title': record_text(record, 'title'),
+        'description': record_text(record, 'description'),
+        'duration': record_text(record, 'duration'),
+        'level': record_text(record, 'level') or 'Beginner',
+    }
+    if not 5 <= len(values['title']) <= 200:
+        return None, 'title must be between 5 and 200 characters'
+    if len(values['description']) < 20:
+        return None, 'description must be at least 20 characters'
+    if not values['duration'] or len(values['duration']) > 50:
+        return None, 'duration is required (at most 50 characters)'
+    if values['level'] not in COURSE_LEVELS:
+        return None, f'level must be one of {", ".join(COURSE_LEVELS)}'
+    try:
+        values['price'] = float(record_text(record, 'price') or 0)
+    except ValueError:
+        return None, 'price must be a number'
+    if values['price'] < 0:
+        return None, 'price cannot be negative'
+    
+    instructor = instructors.get(record_text(record, 'instructor_email', 'instructor'))
+    if instructor is None:
+        return None, 'instructor_email must belong to an instructor'
+    values['instructor_id'] = instructor
+    category = record_text(record, 'category_id', 'category')
+    if category not in categories:
+        return None, f'Unknown category {category!r}'
+    values['category_id'] = categories[category]
+    return values, None
+
+@retry_write
+def write_courses(new_courses, changed_courses):
+    """Insert new course rows and update existing ones; returns every touched course id"""
+    courses_table = Course.__table__
+    course_ids = []
+    with db.engine.begin() as connection:
+        if new_courses:
+            course_ids += connection.execute(
+                courses_table.insert().returning(courses_table.c.id, sort_by_parameter_order=True),
+                new_courses
+            ).scalars().all()
+        restated = []
+        if changed_courses:
+            # Courses changing price or instructor take their days out of the instructor
+            # rollup at the old values and put them back at the new ones
+            current = {course_id: (price, instructor_id) for course_id, price, instructor_id in connection.execute(
+                select(courses_table.c.id, courses_table.c.price, courses_table.c.instructor_id)
+                .where(courses_table.c.id.in_([values['course_id'] for values in changed_courses]))
+            )}
+            restated = [values['course_id'] for values in changed_courses
+                        if current.get(values['course_id']) != (values['price'], values['instructor_id'])]
+            shift_instructor_stats(connection, restated, -1)
+            connection.execute(
+                courses_table.update().where(courses_table.c.id == bindparam('course_id')),
+                changed_courses
+            )
+            course_ids += [values['course_id'] for values in changed_courses]
+        # Core statements skip the Course listeners that keep category counts
+        connection.execute(category_counter_update())
+        reindex_courses(connection, course_ids)
+        sync_ranked_courses(connection, course_ids)
+        sync_daily_stat_instructors(connection, restated)
+        shift_instructor_stats(connection, restated, 1)
+    return course_ids
+
+def import_course_batch(batch, report):
+    users_table = User.__table__
+    courses_table = Course.__table__
+    categories_table = Category.__table__
+    with db.engine.connect() as connection:
+        instructors = dict(connection.execute(
+            select(users_table.c.email, users_table.c.id).where(
+                users_table.c.role == 'instructor', users_table.c.deleted_at.is_(None),
+                users_table.c.email.in_({record_text(record, 'instructor_email', 'instructor')
+                                         for _, record in batch if isinstance(record, dict)})
+            )
+        ).all())
+        categories = {}
+        for category_id, name in connection.execute(select(categories_table.c.id, categories_table.c.name)):
+            categories[str(category_id)] = categories[name] = category_id
+        # Current instructor of each course the batch updates
+        existing = dict(connection.execute(
+            select(courses_table.c.id, courses_table.c.instructor_id).where(courses_table.c.id.in_({
+                int(record_text(record, 'id')) for _, record in batch
+                if isinstance(record, dict) and record_text(record, 'id').isdigit()
+            }), courses_table.c.deleted_at.is_(None))
+        ).all())
+    
+    new_courses, changed_courses = [], []
+    for row, record in batch:
+        if not isinstance(record, dict):
+            report.error(row, 'Expected an object describing a course')
+            continue
+        values, error = parse_course_record(record, instructors, categories)
+        course_id = record_text(record, 'id')
+        if error is None and course_id:
+            if not course_id.isdigit() or int(course_id) not in existing:
+                error = f'Course {course_id} does not exist'
+        if error:
+            report.error(row, error)
+        elif course_id:
+            changed_courses.append({**values, 'course_id': int(course_id)})
+        else:
+            new_courses.append(values)
+    if not (new_courses or changed_courses):
+        return
+    
+    course_ids = write_courses(new_courses, changed_courses)
+    report.inserted += len(new_courses)
+    report.updated += len(changed_courses)
+    # Course pages show their instructor's course count, old and new instructors alike
+    instructor_ids = {values['instructor_id'] for values in new_courses + changed_courses}
+    instructor_ids.update(existing[values['course_id']] for values in changed_courses)
+    with db.engine.connect() as connection:
+        namespaces = instructor_namespaces(connection, instructor_ids)
+    cache.invalidate('catalog', 'categories', *course_namespaces(course_ids), *namespaces)
+    listing_counts.clear()
+    admin_stats_cache.clear()
+
+def import_courses(records, batch_size=None):
+    """Create courses from definitions; records with an id update that course instead"""
+    return run_import(records, import_course_batch, batch_size)
+
+def uploaded_stream():
+    """(format, binary stream) of the request's `file` upload or raw body"""
+    upload = request.files.get('file')
+    if upload is not None:
+        return request.args.get('format') or detect_format(upload.filename, upload.mimetype), upload.stream
+    return request.args.get('format') or detect_format(content_type=request.mimetype), request.stream
+
+def uploaded_records():
+    """Records from the request's `file` upload or raw body, or None for an unknown format"""
+    format, stream = uploaded_stream()
+    if format not in FORMATS:
+        return None
+    return iter_records(text_stream(stream), format)
+
+# ==================== DATA EXPORT ====================
+
+# Exportable tables: model, the timestamp `since` filters on, columns left out
+EXPORTS = {
+    'users': (User, 'created_at', ('password_hash',)),
+    'categories': (Category, 'created_at', ()),
+    'courses': (Course, 'updated_at', ()),
+    'enrollments': (Enrollment, 'enrolled_at', ()),
+    'reviews': (Review, 'created_at', ()),
+}
+
+def export_query(name, since=None, until=None):
+    """Column names and SELECT for an export of rows changed in [since, until), by id"""
+    model, timestamp, excluded = EXPORTS[name]
+    table = model.__table__
+    columns = [column for column in table.columns if column.name not in excluded]
+    query = select(*columns).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c[timestamp] >= since)
+    if until is not None:
+        query = query.where(table.c[timestamp] < until)
+    return [column.name for column in columns], query
+
+def export_rows(query, batch_size=None):
+    """Stream a query's rows through a server-side cursor, batch_size at a time"""
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for partition in result.partitions():
+            yield from partition
+
+def parse_since(value):
+    """Parse an ISO 8601 `since` value; None if it is missing, ValueError if malformed"""
+    if not value:
+        return None
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Stored timestamps are naive UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+# ==================== DELETION ====================
+# A user or course can have hundreds of thousands of enrollments and reviews, so
+# they are never loaded to be deleted. purge_enrollments() and purge_reviews()
+# delete them with DELETE ... RETURNING and take what they return off the
+# counters, recommendations, rankings and rollups, as the bulk writers add it.
+# The purge jobs run them in short transactions until nothing is left, then
+# delete the row itself, whose before_delete listener purges anything written
+# meanwhile. ON DELETE CASCADE catches whatever bypasses all of this.
+
+def deleting_rows(table, criterion, limit=None):
+    """DELETE of the table's rows matching criterion, at most limit of them"""
+    doomed = select(table.c.id).where(criterion)
+    if limit:
+        doomed = doomed.limit(limit)
+    return table.delete().where(table.c.id.in_(doomed))
+
+def purge_enrollments(connection, criterion, limit=None):
+    """Delete matching enrollments inside the current transaction; returns {course_id: rows deleted}"""
+    enrollments_table = Enrollment.__table__
+    rows = connection.execute(
+        deleting_rows(enrollments_table, criterion, limit)
+        .returning(enrollments_table.c.user_id, enrollments_table.c.course_id,
+                   enrollments_table.c.enrolled_at, enrollments_table.c.completed)
+    ).all()
+    removed, completed, trending = Counter(), Counter(), Counter()
+    stats = defaultdict(Counter)
+    era = course_ranker.era()
+    for _, course_id, enrolled_at, done in rows:
+        removed[course_id] += 1
+        completed[course_id] += 1 if done else 0
+        trending[course_id] -= course_ranker.enrollment_score(enrolled_at, era)
+        day = stats[course_id, stat_day(enrolled_at)]
+        day['enrollments'] -= 1
+        day['completions'] -= 1 if done else 0
+    for course_id, count in removed.items():
+        adjust_course_counters(connection, course_id, enrollment_count=-count,
+                               completion_count=-completed[course_id])
+        adjust_course_ranking(connection, course_id, trending=trending[course_id], era=era, enrollments=-count)
+    if rows:
+        apply_daily_stats(connection, stats)
+        apply_enrollment_changes(connection, [(user_id, course_id, -1) for user_id, course_id, _, _ in rows])
+    return removed
+
+def purge_reviews(connection, criterion, limit=None):
+    """Delete matching reviews inside the current transaction; returns {course_id: rows deleted}"""
+    reviews_table = Review.__table__
+    rows = connection.execute(
+        deleting_rows(reviews_table, criterion, limit)
+        .returning(reviews_table.c.course_id, reviews_table.c.rating, reviews_table.c.created_at)
+    ).all()
+    removed, trending = Counter(), Counter()
+    deltas, stats = defaultdict(Counter), defaultdict(Counter)
+    era = course_ranker.era()
+    for course_id, rating, created_at in rows:
+        removed[course_id] += 1
+        deltas[course_id].update(rating_deltas(rating, -1))
+        trending[course_id] -= course_ranker.review_score(created_at, era)
+        day = stats[course_id, stat_day(created_at)]
+        day['reviews'] -= 1
+        day['rating_sum'] -= rating
+    for course_id, course_deltas in deltas.items():
+        adjust_course_counters(connection, course_id, **course_deltas)
+        adjust_course_ranking(connection, course_id, trending=trending[course_id], era=era, rerate=True)
+    apply_daily_stats(connection, stats)
+    return removed
+
+@event.listens_for(Course, 'before_delete')
+def course_rows_purged(mapper, connection, target):
+    purge_enrollments(connection, Enrollment.__table__.c.course_id == target.id)
+    purge_reviews(connection, Review.__table__.c.course_id == target.id)
+
+@event.listens_for(User, 'before_delete')
+def user_rows_purged(mapper, connection, target):
+    # The user's courses, with all their rows, were deleted just before
+    removed = purge_enrollments(connection, Enrollment.__table__.c.user_id == target.id)
+    removed += purge_reviews(connection, Review.__table__.c.user_id == target.id)
+    if removed:
+        invalidate_on_commit(target, 'catalog', *course_namespaces(removed))
+
+@retry_write
+def purge_batch(purge, criterion, batch_size):
+    with db.engine.begin() as connection:
+        removed = purge(connection, criterion, batch_size)
+    if removed:
+        cache.invalidate('catalog', *course_namespaces(removed))
+    return sum(removed.values())
+
+def purge_in_batches(purge, criterion):
+    """Run a purge one DELETE_BATCH_SIZE transaction at a time until nothing matches; returns rows deleted"""
+    batch_size = app.config['DELETE_BATCH_SIZE']
+    deleted = 0
+    while True:
+        count = purge_batch(purge, criterion, batch_size)
+        deleted += count
+        if count < batch_size:
+            return deleted
+        if app.config['DELETE_BATCH_PAUSE']:
+            time.sleep(app.config['DELETE_BATCH_PAUSE'])
+
+def purge_course(course_id):
+    """Delete a course in bounded transactions; returns the enrollments and reviews deleted"""
+    deleted = purge_in_batches(purge_enrollments, Enrollment.__table__.c.course_id == course_id)
+    deleted += purge_in_batches(purge_reviews, Review.__table__.c.course_id == course_id)
+    course = db.session.get(Course, course_id)
+    if course is not None:
+        db.session.delete(course)
+        db.session.commit()
+        listing_counts.clear()
+        admin_stats_cache.clear()
+    return deleted
+
+def purge_user(user_id):
+    """Delete a user, their rows and their courses in bounded transactions; returns the rows deleted"""
+    deleted = purge_in_batches(purge_enrollments, Enrollment.__table__.c.user_id == user_id)
+    deleted += purge_in_batches(purge_reviews, Review.__table__.c.user_id == user_id)
+    course_ids = db.session.scalars(select(Course.id).where(Course.instructor_id == user_id)).all()
+    for course_id in course_ids:
+        deleted += purge_course(course_id)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        db.session.delete(user)
+        db.session.commit()
+        admin_stats_cache.clear()
+    return deleted
+
+def soft_delete_course(course):
+    """Hide a course at once; its listeners take it off the catalog, search and rankings"""
+    course.deleted_at = datetime.utcnow()
+    listing_counts.clear()
+
+def soft_delete_user(user):
+    """Sign a user out and hide them and their courses at once"""
+    user.deleted_at = datetime.utcnow()
+    for course in Course.query.filter_by(instructor_id=user.id, deleted_at=None):
+        soft_delete_course(course)
+    admin_stats_cache.clear()
+
+# ==================== BACKGROUND JOBS ====================
+# Work too slow for a request runs in `python app.py worker` processes. Tasks run in
+# another process, so their cache invalidations reach the web workers only through a
+# shared cache backend: the default CACHE_BACKEND=sqlite, never 'memory'.
+
+job_queue = JobQueue(
+    path=app.config['JOB_QUEUE_PATH'],
+    max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+    backoff=app.config['JOB_RETRY_BACKOFF'],
+    max_backoff=app.config['JOB_MAX_BACKOFF'],
+    lease=app.config['JOB_LEASE_SECONDS'],
+    retention=app.config['JOB_RETENTION_DAYS'] * 86400
+)
+
+def run_job(handler, payload):
+    """Run a task in its own app context, as a request would"""
+    with app.app_context():
+        return handler(**payload)
+
+def save_job_file(stream, format):
+    """Copy an upload to JOB_FILES_PATH for a job to read later; returns the file name"""
+    os.makedirs(app.config['JOB_FILES_PATH'], exist_ok=True)
+    name = f'{secrets.token_hex(16)}.{format}'
+    with open(os.path.join(app.config['JOB_FILES_PATH'], name), 'wb') as output:
+        shutil.copyfileobj(stream, output)
+    return name
+
+def import_job_file(name, importer):
+    """Run an importer over a saved upload, deleting the file once it has been read"""
+    path = os.path.join(app.config['JOB_FILES_PATH'], os.path.basename(name))
+    if not os.path.exists(path):
+        raise PermanentError(f'Upload {name} is missing')
+    with open(path, 'rb') as binary:
+        report = importer(iter_records(text_stream(binary), detect_format(path)))
+    os.remove(path)
+    return report.as_dict()
+
+@job_queue.task('delete_user')
+def delete_user_job(user_id):
+    """Delete a user with their enrollments, reviews and taught courses"""
+    user = db.session.get(User, user_id)
+    if user is None:
+        return {'deleted': False}
+    user_name = user.name
+    return {'deleted': True, 'name': user_name, 'rows': purge_user(user_id)}
+
+@job_queue.task('delete_course')
+def delete_course_job(course_id):
+    """Delete a course with its enrollments and reviews"""
+    course = db.session.get(Course, course_id)
+    if course is None:
+        return {'deleted': False}
+    course_title = course.title
+    return {'deleted': True, 'title': course_title, 'rows': purge_course(course_id)}
+
+@job_queue.task('import_enrollments')
+def import_enrollments_job(file):
+    return import_job_file(file, import_enrollments)
+
+@job_queue.task('recount_co_enrollments')
+def recount_co_enrollments_job(course_ids):
+    return {'pairs': recount_co_enrollments(course_ids)}
+
+@job_queue.task('import_courses')
+def import_courses_job(file):
+    return import_job_file(file, import_courses)
+
+@job_queue.task('repair_counters')
+def repair_counters_job():
+    repaired = repair_course_counters()
+    if repaired:
+        cache.clear()
+    return {'repaired': repaired}
+
+@job_queue.task('rebuild_search')
+def rebuild_search_job():
+    indexed = rebuild_course_search()
+    if indexed is not None:
+        cache.invalidate('catalog')
+    return {'indexed': indexed}
+
+@job_queue.task('rebuild_recommendations')
+def rebuild_recommendations_job():
+    return {'pairs': rebuild_recommendations()}
+
+@job_queue.task('refresh_rankings')
+def refresh_rankings_job():
+    return {'ranked': refresh_course_rankings()}
+
+@job_queue.task('rebuild_analytics')
+def rebuild_analytics_job():
+    return {'rows': rebuild_course_daily_stats()}
+
+@job_queue.task('rebase_rankings')
+def rebase_rankings_job():
+    rescaled = rebase_course_rankings()
+    schedule_ranking_rebase()
+    return {'rescaled': rescaled}
+
+def schedule_ranking_rebase():
+    """Queue the rebase for the start of the next trending era, once however often it is asked"""
+    era = course_ranker.era() + 1
+    delay = (course_ranker.era_start(era) - datetime.utcnow()).total_seconds()
+    return job_queue.enqueue('rebase_rankings', key=f'rebase_rankings:{era}', delay=max(delay, 0))
+
+# Tasks an admin may start from POST /admin/jobs/<name>
+MAINTENANCE_TASKS = ('repair_counters', 'rebuild_search', 'rebuild_recommendations',
+                     'refresh_rankings', 'rebuild_analytics')
+
+def job_accepted(job):
+    """202 response pointing the client at the job's status"""
+    status_url = url_for('job_status', job_id=job.id)
+    response = jsonify({'job': job.as_dict(), 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
 # ==================== FLASK-LOGIN SETUP ====================
 
+def fetch_user_identity(user_id):
+    """Read just the columns the identity snapshot holds"""
+    return db.session.execute(
+        select(User.id, User.name, User.role).where(User.id == user_id, User.deleted_at.is_(None))
+    ).first()
+
+user_identities = create_identity_cache(
+    fetch_user_identity,
+    lambda user_id: db.session.get(User, user_id),
+    backend=app.config['USER_CACHE_BACKEND'],
+    path=app.config['USER_CACHE_PATH'],
+    max_entries=app.config['USER_CACHE_MAX_ENTRIES'],
+    ttl=app.config['USER_CACHE_TTL']
+)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def user_identity_changed(mapper, connection, target):
+    # Drop the snapshot now, and again after commit in case a concurrent
+    # request re-cached the old row in between
+    user_identities.invalidate(target.id)
+    session_ = object_session(target)
+    if session_ is not None:
+        session_.info.setdefault('identity_invalidations', set()).add(target.id)
+
+@event.listens_for(SessionBase, 'after_commit')
+def apply_identity_invalidations(session_):
+    user_ids = session_.info.pop('identity_invalidations', None)
+    if user_ids:
+        user_identities.invalidate(*user_ids)
+
+@event.listens_for(SessionBase, 'after_rollback')
+def discard_identity_invalidations(session_):
+    session_.info.pop('identity_invalidations', None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_identities.get(int(user_id))
 
 # Template filters
 @app.template_filter('currency')
@@ -288,55 +2339,98 @@ def date_filter(date):
 # ==================== PUBLIC ROUTES ====================
 
 @app.route('/')
+@cached_page('catalog', 'categories')
 def index():
-    """Home page with featured courses"""
-    featured_courses = Course.query.order_by(Course.created_at.desc()).limit(6).all()
-    categories = Category.query.all()
+    """Home page with the trending courses"""
+    query, sort_key = ranked_course_query('trending')
+    featured_courses = query.order_by(*(column.desc() for column in sort_key)).limit(6).all()
+    categories = all_categories()
     return render_template('index.html', courses=featured_courses, categories=categories)
 
 @app.route('/courses')
+@cached_page('catalog', 'categories')
 def courses():
     """Browse all courses with search and filter"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     category_id = request.args.get('category', type=int)
+    sort = request.args.get('sort', '')
+    if sort not in COURSE_RANKINGS:
+        sort = ''
     
-    query = Course.query
+    if sort:
+        query, sort_key = ranked_course_query(sort, category_id)
+    else:
+        query = course_listing_query()
+        if category_id:
+            query = query.filter_by(category_id=category_id)
     
+    relevance = None
     if search:
-        query = query.filter(or_(
-            Course.title.contains(search),
-            Course.description.contains(search)
-        ))
+        query, relevance = apply_course_search(query, search)
     
-    if category_id:
-        query = query.filter_by(category_id=category_id)
+    if sort:
+        descending = True
+    elif relevance is not None:
+        sort_key, descending = (relevance, Course.id), False
+    else:
+        sort_key, descending = (Course.created_at, Course.id), True
     
-    courses = query.order_by(Course.created_at.desc()).paginate(
-        page=page, per_page=app.config['COURSES_PER_PAGE'], error_out=False
+    total = listing_counts.get(
+        ('courses', search, category_id), lambda: query.order_by(None).count()
     )
+    courses = keyset_paginate(query, sort_key, cursor=cursor,
+                              per_page=app.config['COURSES_PER_PAGE'],
+                              descending=descending, total=total)
     
-    categories = Category.query.all()
+    categories = all_categories()
     return render_template('courses.html', courses=courses, categories=categories, 
-                         search=search, selected_category=category_id)
+                         search=search, selected_category=category_id, sort=sort)
 
 @app.route('/course/<int:course_id>')
+@cached_page('course:{course_id}', 'recommendations')
 def course_details(course_id):
     """Display single course details"""
-    course = Course.query.get_or_404(course_id)
-    reviews = Review.query.filter_by(course_id=course_id).order_by(Review.created_at.desc()).all()
+    course = course_listing_query().filter_by(id=course_id).first_or_404()
+    reviews = review_page(course_id)
+    instructor_course_count = db.session.scalar(
+        select(func.count()).where(Course.instructor_id == course.instructor_id, Course.deleted_at.is_(None))
+    )
     
     is_enrolled = False
+    own_review = None
     if current_user.is_authenticated:
         enrollment = Enrollment.query.filter_by(
             user_id=current_user.id, course_id=course_id
         ).first()
         is_enrolled = enrollment is not None
+        if is_enrolled:
+            own_review = Review.query.filter_by(user_id=current_user.id, course_id=course_id).first()
+    
+    review_form = None
+    if is_enrolled:
+        review_form = ReviewForm(obj=own_review)
+        if own_review:
+            review_form.submit.label.text = 'Update Review'
     
     return render_template('course_details.html', course=course, 
-                         reviews=reviews, is_enrolled=is_enrolled)
+                         reviews=reviews, is_enrolled=is_enrolled,
+                         instructor_course_count=instructor_course_count,
+                         own_review=own_review, review_form=review_form,
+                         delete_form=FlaskForm(),
+                         recommendations=recommendations_for(course_id))
+
+@app.route('/course/<int:course_id>/reviews')
+@cached_page('course:{course_id}')
+def course_reviews(course_id):
+    """The next page of a course's reviews, as HTML for the "load more" button"""
+    reviews = review_page(course_id, request.args.get('cursor'))
+    return render_template('course_reviews.html', course_id=course_id, reviews=reviews)
+
+HASHING_BUSY_MESSAGE = 'We are signing in a lot of people right now. Please try again in a moment.'
 
 @app.route('/register', methods=['GET', 'POST'])
+@retry_write
 def register():
     """User registration"""
     if current_user.is_authenticated:
@@ -349,10 +2443,20 @@ def register():
             email=form.email.data,
             role=form.role.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            flash(HASHING_BUSY_MESSAGE, 'warning')
+            return render_template('register.html', form=form), 503
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with another registration for the same email
+            db.session.rollback()
+            form.email.errors.append('Email already registered. Please use a different email.')
+            return render_template('register.html', form=form)
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -367,9 +2471,17 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = User.query.filter_by(email=form.email.data, deleted_at=None).first()
+        
+        try:
+            verified = user is not None and user.check_password(form.password.data)
+            if verified and user.upgrade_password_hash(form.password.data):
+                db.session.commit()
+        except HashingBusy:
+            flash(HASHING_BUSY_MESSAGE, 'warning')
+            return render_template('login.html', form=form), 503
         
-        if user and user.check_password(form.password.data):
+        if verified:
             login_user(user)
             flash(f'Welcome back, {user.name}!', 'success')
             
@@ -397,38 +2509,82 @@ def logout():
 
 # ==================== STUDENT ROUTES ====================
 
+def write_progress(updates):
+    """Apply buffered (user_id, course_id, progress) heartbeats in one transaction
+
+    Stored progress only ever goes up, and reaching 100 marks the course completed.
+    """
+    enrollments_table = Enrollment.__table__
+    progress = bindparam('new_progress')
+    statement = enrollments_table.update().where(
+        enrollments_table.c.user_id == bindparam('enrolled_user_id'),
+        enrollments_table.c.course_id == bindparam('enrolled_course_id'),
+        func.coalesce(enrollments_table.c.progress, 0) < progress
+    ).values(progress=progress)
+    finished = [(user_id, course_id) for user_id, course_id, value in updates if value >= 100]
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(statement, [
+            {'enrolled_user_id': user_id, 'enrolled_course_id': course_id, 'new_progress': value}
+            for user_id, course_id, value in updates
+        ])
+        # Completing is a separate UPDATE so it can report which enrollments just completed
+        completed, completed_days = Counter(), Counter()
+        for batch in batched(finished, 500):
+            for course_id, enrolled_at in connection.execute(
+                enrollments_table.update().where(
+                    tuple_(enrollments_table.c.user_id, enrollments_table.c.course_id).in_(batch),
+                    enrollments_table.c.completed.is_not(True)
+                ).values(completed=True)
+                .returning(enrollments_table.c.course_id, enrollments_table.c.enrolled_at)
+            ):
+                completed[course_id] += 1
+                completed_days[course_id, stat_day(enrolled_at)] += 1
+        # Core statements skip the Enrollment listeners that keep these counts
+        for course_id, count in completed.items():
+            adjust_course_counters(connection, course_id, completion_count=count)
+        apply_daily_stats(connection, {key: {'completions': count} for key, count in completed_days.items()})
+
+# Flushed on exit too; gunicorn.conf.py flushes it when a worker stops
+progress_tracker = ProgressTracker(write_progress,
+                                   interval=app.config['PROGRESS_FLUSH_INTERVAL'],
+                                   max_pending=app.config['PROGRESS_MAX_PENDING'])
+
 @app.route('/dashboard/student')
 @login_required
 @role_required('student')
 def student_dashboard():
     """Student dashboard showing enrolled courses"""
-    enrollments = Enrollment.query.filter_by(user_id=current_user.id).all()
-    return render_template('student_dashboard.html', enrollments=enrollments)
+    enrollments = enrollment_listing_query(current_user.id).all()
+    suggestions = blend_recommendations(recommendation_registry.get(),
+                                        [enrollment.course_id for enrollment in enrollments], limit=6)
+    return render_template('student_dashboard.html', enrollments=enrollments, suggestions=suggestions)
 
 @app.route('/enroll/<int:course_id>')
 @login_required
 @role_required('student')
+@retry_write
 def enroll_course(course_id):
     """Enroll student in a course"""
-    course = Course.query.get_or_404(course_id)
-    
-    existing = Enrollment.query.filter_by(
-        user_id=current_user.id, course_id=course_id
-    ).first()
+    course = live_courses().filter_by(id=course_id).first_or_404()
+    course_title = course.title
     
-    if existing:
+    # The unique_enrollment constraint decides; no SELECT-then-INSERT race
+    enrollment = Enrollment(user_id=current_user.id, course_id=course_id)
+    db.session.add(enrollment)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
         flash('You are already enrolled in this course.', 'info')
     else:
-        enrollment = Enrollment(user_id=current_user.id, course_id=course_id)
-        db.session.add(enrollment)
-        db.session.commit()
-        flash(f'Successfully enrolled in {course.title}!', 'success')
+        flash(f'Successfully enrolled in {course_title}!', 'success')
     
     return redirect(url_for('student_dashboard'))
 
 @app.route('/unenroll/<int:enrollment_id>')
 @login_required
 @role_required('student')
+@retry_write
 def unenroll_course(enrollment_id):
     """Unenroll from a course"""
     enrollment = Enrollment.query.get_or_404(enrollment_id)
@@ -438,11 +2594,115 @@ def unenroll_course(enrollment_id):
         return redirect(url_for('student_dashboard'))
     
     course_title = enrollment.course.title
+    course_id = enrollment.course_id
     db.session.delete(enrollment)
     db.session.commit()
+    progress_tracker.forget(current_user.id, course_id)
     flash(f'Unenrolled from {course_title}.', 'info')
     return redirect(url_for('student_dashboard'))
 
+@app.route('/progress/<int:course_id>', methods=['POST'])
+@login_required
+@role_required('student')
+def track_progress(course_id):
+    """Progress heartbeat (0-100) for an enrolled course, written in the next batch"""
+    data = request.get_json(silent=True) or request.form
+    try:
+        progress = int(data.get('progress'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'progress must be a whole number from 0 to 100'}), 400
+    if not 0 <= progress <= 100:
+        return jsonify({'error': 'progress must be a whole number from 0 to 100'}), 400
+    
+    # Only a pair's first heartbeat in this worker reads the database
+    stored = 0
+    if progress_tracker.highest(current_user.id, course_id) is None:
+        stored = db.session.scalar(
+            select(func.coalesce(Enrollment.progress, 0))
+            .where(Enrollment.user_id == current_user.id, Enrollment.course_id == course_id)
+        )
+        if stored is None:
+            return jsonify({'error': 'You are not enrolled in this course'}), 404
+    
+    progress = progress_tracker.record(current_user.id, course_id, progress, stored)
+    return jsonify({'course_id': course_id, 'progress': progress, 'completed': progress >= 100}), 202
+
+# ==================== REVIEW ROUTES ====================
+
+def review_form_errors(form):
+    for errors in form.errors.values():
+        for error in errors:
+            flash(error, 'danger')
+
+@app.route('/course/<int:course_id>/review', methods=['POST'])
+@login_required
+@role_required('student')
+@retry_write
+def add_review(course_id):
+    """Review a course the student is enrolled in"""
+    if not Enrollment.query.filter_by(user_id=current_user.id, course_id=course_id).first():
+        flash('Enroll in this course to review it.', 'warning')
+        return redirect(url_for('course_details', course_id=course_id))
+    
+    form = ReviewForm()
+    if not form.validate_on_submit():
+        review_form_errors(form)
+        return redirect(url_for('course_details', course_id=course_id, _anchor='reviews'))
+    
+    # The unique_review constraint decides; a second review is turned into an edit
+    db.session.add(Review(user_id=current_user.id, course_id=course_id,
+                          rating=form.rating.data, comment=form.comment.data or None))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('You have already reviewed this course. You can edit your review instead.', 'info')
+    else:
+        flash('Thank you for your review!', 'success')
+    
+    return redirect(url_for('course_details', course_id=course_id, _anchor='reviews'))
+
+@app.route('/review/<int:review_id>/edit', methods=['POST'])
+@login_required
+@retry_write
+def edit_review(review_id):
+    """Change the rating or comment of one's own review"""
+    review = Review.query.get_or_404(review_id)
+    
+    if review.user_id != current_user.id:
+        flash('You can only edit your own reviews.', 'danger')
+        return redirect(url_for('course_details', course_id=review.course_id))
+    
+    form = ReviewForm()
+    if form.validate_on_submit():
+        review.rating = form.rating.data
+        review.comment = form.comment.data or None
+        db.session.commit()
+        flash('Review updated.', 'success')
+    else:
+        review_form_errors(form)
+    
+    return redirect(url_for('course_details', course_id=review.course_id, _anchor='reviews'))
+
+@app.route('/review/<int:review_id>/delete', methods=['POST'])
+@login_required
+@retry_write
+def delete_review(review_id):
+    """Delete one's own review; admins can delete any review"""
+    review = Review.query.get_or_404(review_id)
+    course_id = review.course_id
+    
+    if review.user_id != current_user.id and current_user.role != 'admin':
+        flash('You can only delete your own reviews.', 'danger')
+    elif not FlaskForm().validate_on_submit():
+        flash('Your session expired. Please try again.', 'warning')
+    else:
+        db.session.delete(review)
+        db.session.commit()
+        flash('Review deleted.', 'info')
+    
+    return redirect(url_for('course_details', course_id=course_id, _anchor='reviews'))
+
 # ==================== INSTRUCTOR ROUTES ====================
 
 @app.route('/dashboard/instructor')
@@ -450,16 +2710,55 @@ def unenroll_course(enrollment_id):
 @role_required('instructor')
 def instructor_dashboard():
     """Instructor dashboard for managing courses"""
-    courses = Course.query.filter_by(instructor_id=current_user.id).all()
+    courses = course_listing_query().filter_by(instructor_id=current_user.id).all()
     return render_template('instructor_dashboard.html', courses=courses)
 
+# Analytics windows in days, by the `days` query parameter; 0 is all time
+ANALYTICS_WINDOWS = {30: 'Last 30 days', 90: 'Last 90 days', 365: 'Last 12 months', 0: 'All time'}
+
+@app.route('/dashboard/instructor/analytics')
+@login_required
+@role_required('instructor')
+def instructor_analytics():
+    """Enrollments, completion, ratings and revenue of the instructor's courses over time"""
+    days = request.args.get('days', 90, type=int)
+    if days not in ANALYTICS_WINDOWS:
+        days = 90
+    course_id = request.args.get('course', type=int)
+    courses = live_courses().filter_by(instructor_id=current_user.id).order_by(Course.title).all()
+    if course_id is not None and course_id not in {course.id for course in courses}:
+        flash('You can only view analytics for your own courses.', 'danger')
+        return redirect(url_for('instructor_analytics', days=days))
+    
+    last_day = datetime.utcnow().date()
+    if days:
+        first_day = last_day - timedelta(days=days - 1)
+    else:
+        first_day = min((course.created_at.date() for course in courses if course.created_at),
+                        default=last_day)
+    # All-time figures come from the courses' own counters
+    if days:
+        activity = course_window_totals(current_user.id, first_day)
+    else:
+        activity = {course.id: course_lifetime_totals(course) for course in courses}
+    selected = next((course for course in courses if course.id == course_id), None)
+    bucket, series = activity_series(current_user.id, first_day, last_day, selected)
+    if selected is not None:
+        totals = activity.get(course_id, EMPTY_TOTALS)
+    else:
+        totals = Totals(*map(sum, zip(EMPTY_TOTALS, *activity.values())))
+    
+    return render_template('instructor_analytics.html', courses=courses, activity=activity,
+                           series=series, bucket=bucket, totals=totals, days=days,
+                           windows=ANALYTICS_WINDOWS, selected_course=course_id)
+
 @app.route('/course/create', methods=['GET', 'POST'])
 @login_required
 @role_required('instructor')
 def create_course():
     """Create a new course"""
     form = CourseForm()
-    form.category_id.choices = [(c.id, c.name) for c in Category.query.all()]
+    form.category_id.choices = category_choices()
     
     if form.validate_on_submit():
         course = Course(
@@ -483,14 +2782,14 @@ def create_course():
 @role_required('instructor')
 def edit_course(course_id):
     """Edit existing course"""
-    course = Course.query.get_or_404(course_id)
+    course = live_courses().filter_by(id=course_id).first_or_404()
     
     if course.instructor_id != current_user.id:
         flash('You can only edit your own courses.', 'danger')
         return redirect(url_for('instructor_dashboard'))
     
     form = CourseForm(obj=course)
-    form.category_id.choices = [(c.id, c.name) for c in Category.query.all()]
+    form.category_id.choices = category_choices()
     
     if form.validate_on_submit():
         course.title = form.title.data
@@ -511,16 +2810,23 @@ def edit_course(course_id):
 @role_required('instructor')
 def delete_course(course_id):
     """Delete a course"""
-    course = Course.query.get_or_404(course_id)
+    course = live_courses().filter_by(id=course_id).first_or_404()
     
     if course.instructor_id != current_user.id:
         flash('You can only delete your own courses.', 'danger')
         return redirect(url_for('instructor_dashboard'))
     
-    course_title = course.title
-    db.session.delete(course)
-    db.session.commit()
-    flash(f'Course "{course_title}" deleted successfully.', 'success')
+    # Enrollments and reviews are purged in batches by a worker; the key makes a
+    # repeated click return the same job
+    job = job_queue.enqueue('delete_course', {'course_id': course.id},
+                            key=f'delete_course:{course.id}:{course.created_at.isoformat()}',
+                            owner_id=current_user.id)
+    if app.config['SOFT_DELETE']:
+        soft_delete_course(course)
+        db.session.commit()
+        flash(f'Course "{course.title}" deleted successfully.', 'success')
+    else:
+        flash(f'Course "{course.title}" is being deleted in the background (job #{job.id}).', 'info')
     return redirect(url_for('instructor_dashboard'))
 
 # ==================== ADMIN ROUTES ====================
@@ -530,19 +2836,164 @@ def delete_course(course_id):
 @role_required('admin')
 def admin_panel():
     """Admin panel for managing users and categories"""
-    users = User.query.all()
-    categories = Category.query.all()
-    courses = Course.query.all()
-    
-    stats = {
-        'total_users': len(users),
-        'total_courses': len(courses),
-        'total_enrollments': Enrollment.query.count(),
-        'total_categories': len(categories)
-    }
+    categories = all_categories()
+    stats = admin_stats_cache.get('stats', platform_stats)
     
-    return render_template('admin_panel.html', users=users, categories=categories, 
-                         courses=courses, stats=stats)
+    return render_template('admin_panel.html', categories=categories, stats=stats)
+
+@app.route('/admin/users')
+@login_required
+@role_required('admin')
+def admin_users():
+    """Paginated, sortable users table for the admin panel"""
+    q = request.args.get('q', '').strip()
+    role = request.args.get('role', '')
+    
+    query = User.query.filter(User.deleted_at.is_(None))
+    if q:
+        query = query.filter(or_(User.name.icontains(q, autoescape=True),
+                                     User.email.icontains(q, autoescape=True)))
+    if role:
+        query = query.filter_by(role=role)
+    
+    users, sort, descending = admin_table_page(
+        query, ADMIN_USER_SORTS, 'joined', User.id, app.config['USERS_PER_PAGE']
+    )
+    return render_template('admin_users_table.html', users=users, sort=sort,
+                         descending=descending, q=q, role=role)
+
+@app.route('/admin/courses')
+@login_required
+@role_required('admin')
+def admin_courses():
+    """Paginated, sortable courses table for the admin panel"""
+    q = request.args.get('q', '').strip()
+    category_id = request.args.get('category', type=int)
+    
+    query = course_listing_query()
+    if q:
+        query = query.filter(Course.title.icontains(q, autoescape=True))
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    
+    courses, sort, descending = admin_table_page(
+        query, ADMIN_COURSE_SORTS, 'created', Course.id, app.config['ADMIN_COURSES_PER_PAGE']
+    )
+    return render_template('admin_courses_table.html', courses=courses, sort=sort,
+                         descending=descending, q=q, category_id=category_id,
+                         categories=sorted(all_categories(), key=lambda category: category.name))
+
+@app.route('/admin/cache')
+@login_required
+@role_required('admin')
+def cache_stats():
+    """Hit/miss counters of the page and fragment cache"""
+    return jsonify(cache.stats())
+
+@app.route('/admin/metrics')
+def metrics():
+    """Per-route request, query and render metrics in the Prometheus text format"""
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.role == 'admin'):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(profiler.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/metrics/slow')
+@login_required
+@role_required('admin')
+def slow_requests():
+    """The most recent slow requests in this worker, newest first"""
+    return jsonify({
+        'enabled': profiler.enabled,
+        'slow_request_ms': app.config['SLOW_REQUEST_MS'],
+        'slow_request_queries': app.config['SLOW_REQUEST_QUERIES'],
+        'requests': list(reversed(profiler.recent_slow)),
+    })
+
+@app.route('/admin/metrics/profiling', methods=['POST'])
+@login_required
+@role_required('admin')
+def toggle_profiling():
+    """Switch request profiling on or off; `reset=1` also clears the collected metrics"""
+    enabled = request.form.get('enabled', request.args.get('enabled'))
+    profiler.set_enabled(not profiler.enabled if enabled is None else enabled.lower() in ('1', 'true', 'on'))
+    if request.values.get('reset'):
+        profiler.reset()
+    return jsonify({'enabled': profiler.enabled})
+
+@app.route('/admin/import/enrollments', methods=['POST'])
+@login_required
+@role_required('admin')
+def bulk_import_enrollments():
+    """Enroll students from an uploaded CSV/JSON file of email, course_id rows"""
+    if request.args.get('background'):
+        return enqueue_import('import_enrollments')
+    records = uploaded_records()
+    if records is None:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    return jsonify(import_enrollments(records).as_dict())
+
+@app.route('/admin/import/courses', methods=['POST'])
+@login_required
+@role_required('admin')
+def bulk_import_courses():
+    """Create or update courses from an uploaded CSV/JSON file of course definitions"""
+    if request.args.get('background'):
+        # Rows without an id would be created again by a retry, so there is none
+        return enqueue_import('import_courses', max_attempts=1)
+    records = uploaded_records()
+    if records is None:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    return jsonify(import_courses(records).as_dict())
+
+def enqueue_import(task, max_attempts=None):
+    """Save the upload and hand it to a background import; 202 with the job's status"""
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        job = job_queue.get_by_key(f'{task}:{key}')
+        if job is not None and job.status != 'failed':
+            return job_accepted(job)
+    format, stream = uploaded_stream()
+    if format not in FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    job = job_queue.enqueue(task, {'file': save_job_file(stream, format)},
+                            key=f'{task}:{key}' if key else None,
+                            owner_id=current_user.id, max_attempts=max_attempts)
+    return job_accepted(job)
+
+@app.route('/admin/export/<name>')
+@login_required
+@role_required('admin')
+def export_data(name):
+    """Stream a table as CSV, JSON or JSON Lines, optionally only rows changed since a time"""
+    if name not in EXPORTS:
+        return jsonify({'error': f'Unknown export {name!r}'}), 404
+    format = request.args.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+    
+    # Pass X-Export-Until as the next export's `since` to pick up only later changes
+    until = datetime.utcnow()
+    columns, query = export_query(name, since, until)
+    chunks = export_chunks(format, columns, export_rows(query))
+    filename = f'{name}-{until:%Y%m%dT%H%M%S}.{format}'
+    mimetype = EXPORT_FORMATS[format]
+    headers = {'X-Export-Until': until.isoformat(), 'Vary': 'Accept-Encoding'}
+    if request.args.get('gzip'):
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    elif 'gzip' in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
 
 @app.route('/admin/category/add', methods=['POST'])
 @login_required
@@ -556,6 +3007,7 @@ def add_category():
         category = Category(name=name, description=description)
         db.session.add(category)
         db.session.commit()
+        admin_stats_cache.clear()
         flash('Category added successfully!', 'success')
     else:
         flash('Category name is required.', 'danger')
@@ -569,11 +3021,13 @@ def delete_category(category_id):
     """Delete a category"""
     category = Category.query.get_or_404(category_id)
     
-    if category.courses:
+    has_courses = db.session.scalar(select(select(Course.id).where(Course.category_id == category_id).exists()))
+    if has_courses:
         flash('Cannot delete category with existing courses.', 'danger')
     else:
         db.session.delete(category)
         db.session.commit()
+        admin_stats_cache.clear()
         flash('Category deleted successfully.', 'success')
     
     return redirect(url_for('admin_panel'))
@@ -583,30 +3037,74 @@ def delete_category(category_id):
 @role_required('admin')
 def delete_user(user_id):
     """Delete a user"""
-    user = User.query.get_or_404(user_id)
+    user = User.query.filter_by(id=user_id, deleted_at=None).first_or_404()
     
     if user.id == current_user.id:
         flash('You cannot delete your own account.', 'danger')
     else:
-        user_name = user.name
-        db.session.delete(user)
-        db.session.commit()
-        flash(f'User "{user_name}" deleted successfully.', 'success')
+        # Deleting cascades through everything the user owns, so a worker does it;
+        # the key makes a repeated click return the same job. Ids can be reused
+        # once a user is gone, hence the creation time.
+        job = job_queue.enqueue('delete_user', {'user_id': user.id},
+                                key=f'delete_user:{user.id}:{user.created_at.isoformat()}',
+                                owner_id=current_user.id)
+        if app.config['SOFT_DELETE']:
+            soft_delete_user(user)
+            db.session.commit()
+            # A user writes at most one review per course, few enough to take off the
+            # course pages, ratings and rankings now rather than when the job runs
+            purge_in_batches(purge_reviews, Review.__table__.c.user_id == user.id)
+            flash(f'User "{user.name}" deleted successfully.', 'success')
+        else:
+            flash(f'User "{user.name}" is being deleted in the background (job #{job.id}).', 'info')
     
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/jobs')
+@login_required
+@role_required('admin')
+def admin_jobs():
+    """Job counts by status and the most recent jobs"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'counts': job_queue.counts(),
+                    'jobs': [job.as_dict() for job in job_queue.recent(limit)]})
+
+@app.route('/admin/jobs/<name>', methods=['POST'])
+@login_required
+@role_required('admin')
+def start_maintenance_job(name):
+    """Queue a maintenance task (counter repair or an index rebuild)"""
+    if name not in MAINTENANCE_TASKS:
+        return jsonify({'error': f'Unknown task {name!r}. Available: {", ".join(MAINTENANCE_TASKS)}'}), 404
+    key = request.headers.get('Idempotency-Key')
+    job = job_queue.enqueue(name, key=f'{name}:{key}' if key else None, owner_id=current_user.id)
+    return job_accepted(job)
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Poll a job started by the signed-in user (admins see every job)"""
+    job = job_queue.get(job_id)
+    if job is None or (job.owner_id != current_user.id and current_user.role != 'admin'):
+        return jsonify({'error': 'Job not found'}), 404
+    response = jsonify(job.as_dict())
+    if not job.finished:
+        response.headers['Retry-After'] = str(max(1, round(app.config['JOB_POLL_INTERVAL'])))
+    return response
+
 # ==================== PROFILE ROUTES ====================
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     """User profile page"""
-    form = ProfileForm(obj=current_user)
+    user = db.session.get(User, current_user.id)
+    form = ProfileForm(obj=user)
     
     if form.validate_on_submit():
-        current_user.name = form.name.data
-        current_user.email = form.email.data
-        current_user.bio = form.bio.data
+        user.name = form.name.data
+        user.email = form.email.data
+        user.bio = form.bio.data
         
         db.session.commit()
         flash('Profile updated successfully!', 'success')
@@ -614,11 +3112,165 @@ def profile():
     
     return render_template('profile.html', form=form)
 
+# ==================== JSON API ====================
+
+def person_reference(user):
+    return {'id': user.id, 'name': user.name}
+
+COURSE_FIELDS = {
+    'id': lambda course: course.id,
+    'title': lambda course: course.title,
+    'description': lambda course: course.description,
+    'price': lambda course: course.price,
+    'duration': lambda course: course.duration,
+    'level': lambda course: course.level,
+    'category': lambda course: {'id': course.category_id, 'name': course.category.name},
+    'instructor': lambda course: person_reference(course.instructor),
+    'enrollment_count': lambda course: course.get_enrollment_count(),
+    'review_count': lambda course: course.review_count or 0,
+    'average_rating': lambda course: round(course.get_average_rating(), 2),
+    'rating_histogram': lambda course: {str(stars): count for stars, count, _ in course.get_rating_histogram()},
+    'created_at': lambda course: course.created_at,
+    'updated_at': lambda course: course.updated_at,
+}
+# Listings leave out the long and per-course fields unless asked for with `fields`
+COURSE_LIST_FIELDS = [name for name in COURSE_FIELDS if name not in ('description', 'rating_histogram')]
+
+CATEGORY_FIELDS = {
+    'id': lambda category: category.id,
+    'name': lambda category: category.name,
+    'description': lambda category: category.description,
+    'course_count': lambda category: category.course_count,
+}
+
+ENROLLMENT_FIELDS = {
+    'id': lambda enrollment: enrollment.id,
+    'course': lambda enrollment: {
+        'id': enrollment.course_id,
+        'title': enrollment.course.title,
+        'category': enrollment.course.category.name,
+        'instructor': enrollment.course.instructor.name,
+    },
+    # Include heartbeats this worker has not written yet
+    'progress': lambda enrollment: max(
+        enrollment.progress or 0,
+        progress_tracker.highest(enrollment.user_id, enrollment.course_id) or 0
+    ),
+    'completed': lambda enrollment: bool(enrollment.completed) or (
+        progress_tracker.highest(enrollment.user_id, enrollment.course_id) or 0) >= 100,
+    'enrolled_at': lambda enrollment: enrollment.enrolled_at,
+}
+
+@app.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+def api_page_size():
+    limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+def page_payload(page, fields, serializers):
+    return {
+        'data': [serialize(item, fields, serializers) for item in page],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+def cached_api(*namespaces):
+    """Serve a public JSON API view from the response cache, with conditional GET
+
+    The view returns the payload. Its serialized body is cached under the
+    same versioned namespaces as the HTML pages, so a client polling an
+    unchanged resource costs a cache lookup and a 304. Only an ETag is
+    sent: counter writes leave updated_at alone, and a course leaving a
+    listing never raises its newest updated_at, so Last-Modified would
+    answer 304 for changed responses.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            depends_on = [namespace.format(**kwargs) for namespace in namespaces]
+            key = None
+            if app.config['PAGE_CACHE_ENABLED']:
+                key = cache.versioned_key('api', request.full_path, depends_on)
+                body = cache.get('api', key)
+                if body is not None:
+                    return conditional_json(body)
+            
+            body = compact_json(f(*args, **kwargs))
+            if key is not None:
+                cache.set(key, body)
+            return conditional_json(body)
+        return decorated_function
+    return decorator
+
+@app.route('/api/v1/courses')
+@cached_api('catalog')
+def api_courses():
+    """Courses newest first (or by relevance with `search`, or by a `sort` ranking), a cursor page at a time"""
+    fields = parse_fields(request.args.get('fields'), COURSE_FIELDS, COURSE_LIST_FIELDS)
+    search = request.args.get('search', '').strip()
+    category_id = request.args.get('category', type=int)
+    sort = request.args.get('sort')
+    if sort is not None and sort not in COURSE_RANKINGS:
+        raise ApiError(400, f'Unknown sort: {sort}. Available: {", ".join(COURSE_RANKINGS)}')
+    
+    if sort:
+        query, sort_key = ranked_course_query(sort, category_id)
+    else:
+        query = course_listing_query()
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+    relevance = None
+    if search:
+        query, relevance = apply_course_search(query, search)
+    
+    if sort:
+        descending = True
+    elif relevance is not None:
+        sort_key, descending = (relevance, Course.id), False
+    else:
+        sort_key, descending = (Course.created_at, Course.id), True
+    page = keyset_paginate(query, sort_key, cursor=request.args.get('cursor'),
+                           per_page=api_page_size(), descending=descending)
+    return page_payload(page, fields, COURSE_FIELDS)
+
+@app.route('/api/v1/courses/<int:course_id>')
+@cached_api('course:{course_id}')
+def api_course(course_id):
+    """One course with its description and rating histogram"""
+    fields = parse_fields(request.args.get('fields'), COURSE_FIELDS, COURSE_FIELDS)
+    course = course_listing_query().filter_by(id=course_id).first()
+    if course is None:
+        raise ApiError(404, 'Course not found')
+    return {'data': serialize(course, fields, COURSE_FIELDS)}
+
+@app.route('/api/v1/categories')
+@cached_api('categories')
+def api_categories():
+    """Every category with its number of courses"""
+    fields = parse_fields(request.args.get('fields'), CATEGORY_FIELDS, CATEGORY_FIELDS)
+    return {'data': [serialize(category, fields, CATEGORY_FIELDS) for category in all_categories()]}
+
+@app.route('/api/v1/me/enrollments')
+def api_my_enrollments():
+    """The signed-in student's enrollments with progress, newest first"""
+    if not current_user.is_authenticated:
+        raise ApiError(401, 'Sign in to see your enrollments')
+    fields = parse_fields(request.args.get('fields'), ENROLLMENT_FIELDS, ENROLLMENT_FIELDS)
+    page = keyset_paginate(enrollment_listing_query(current_user.id),
+                           (Enrollment.enrolled_at, Enrollment.id),
+                           cursor=request.args.get('cursor'), per_page=api_page_size())
+    # Progress changes leave no timestamp behind, so only the ETag validates this one
+    return conditional_json(compact_json(page_payload(page, fields, ENROLLMENT_FIELDS)), private=True)
+
 # ==================== ERROR HANDLERS ====================
 
 @app.errorhandler(404)
 def not_found_error(error):
     """Handle 404 errors"""
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Not found'}), 404
     return render_template('404.html'), 404
 
 @app.errorhandler(500)
@@ -627,14 +3279,128 @@ def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
+# ==================== MIGRATIONS ====================
+# Append new schema changes here with the next version number; never edit or
+# renumber one that has shipped. Migrations must work on both a fresh database
+# and one created by an older release, so they check before they change.
+
+schema = MigrationRegistry()
+
+BASE_TABLES = ('users', 'categories', 'courses', 'enrollments', 'reviews')
+RECOMMENDATION_TABLES = ('course_co_enrollments', 'course_recommendations')
+ANALYTICS_TABLES = ('course_daily_stats', 'instructor_daily_stats')
+
+@schema.migration(1, 'Create base tables')
+def create_base_tables(context):
+    context.create_tables(db.metadata, [db.metadata.tables[name] for name in BASE_TABLES])
+
+@schema.migration(2, 'Add denormalized course counters')
+def add_course_counters(context):
+    added = [name for name in COURSE_COUNTER_COLUMNS
+             if context.add_column('courses', name, 'INTEGER NOT NULL DEFAULT 0')]
+    if added:
+        context.backfill(course_counter_update(only_drifted=False, columns=COURSE_COUNTER_COLUMNS),
+                         Course.__table__.c.id,
+                         batch_size=app.config['MIGRATION_BATCH_SIZE'],
+                         pause=app.config['MIGRATION_BATCH_PAUSE'],
+                         label='courses counters')
+
+@schema.migration(3, 'Index hot query paths')
+def index_hot_query_paths(context):
+    for name in BASE_TABLES:
+        context.create_indexes(db.metadata.tables[name])
+    with db.engine.begin() as connection:
+        # Let the planner see the new indexes' selectivity
+        connection.exec_driver_sql('ANALYZE')
+
+@schema.migration(4, 'Build the course search index')
+def build_course_search(context):
+    indexed = rebuild_course_search()
+    if indexed is None:
+        context.out('   full-text search unavailable on this database; using LIKE search')
+    else:
+        context.out(f'   {indexed} course(s) indexed')
+
+@schema.migration(5, 'Add course rating histogram counters')
+def add_rating_histogram(context):
+    added = [name for name in RATING_COUNT_COLUMNS
+             if context.add_column('courses', name, 'INTEGER NOT NULL DEFAULT 0')]
+    if added:
+        context.backfill(course_counter_update(only_drifted=False, columns=RATING_COUNT_COLUMNS),
+                         Course.__table__.c.id,
+                         batch_size=app.config['MIGRATION_BATCH_SIZE'],
+                         pause=app.config['MIGRATION_BATCH_PAUSE'],
+                         label='courses rating histogram')
+
+@schema.migration(6, 'Store category course counts')
+def add_category_course_counts(context):
+    if context.add_column('categories', 'course_count', 'INTEGER NOT NULL DEFAULT 0'):
+        context.backfill(category_counter_update(only_drifted=False), Category.__table__.c.id,
+                         batch_size=app.config['MIGRATION_BATCH_SIZE'],
+                         pause=app.config['MIGRATION_BATCH_PAUSE'],
+                         label='categories course counts')
+
+@schema.migration(7, 'Add course recommendations')
+def add_course_recommendations(context):
+    context.create_tables(db.metadata, [db.metadata.tables[name] for name in RECOMMENDATION_TABLES])
+    context.out(f'   {rebuild_recommendations()} co-enrolled course pair(s) counted')
+
+@schema.migration(8, 'Add course rankings')
+def add_course_rankings(context):
+    context.create_tables(db.metadata, [db.metadata.tables['course_rankings']])
+    context.out(f'   {refresh_course_rankings()} course(s) ranked')
+    with db.engine.begin() as connection:
+        # Without statistics SQLite sorts the whole catalog instead of walking a ranking index
+        connection.exec_driver_sql('ANALYZE course_rankings')
+
+@schema.migration(9, 'Add instructor analytics rollups')
+def add_analytics_rollups(context):
+    if context.add_column('courses', 'completion_count', 'INTEGER NOT NULL DEFAULT 0'):
+        context.backfill(course_counter_update(only_drifted=False, columns=COMPLETION_COUNT_COLUMNS),
+                         Course.__table__.c.id,
+                         batch_size=app.config['MIGRATION_BATCH_SIZE'],
+                         pause=app.config['MIGRATION_BATCH_PAUSE'],
+                         label='courses completion counts')
+    context.create_tables(db.metadata, [db.metadata.tables[name] for name in ANALYTICS_TABLES])
+    context.out(f'   {rebuild_course_daily_stats()} course day(s) rolled up')
+    with db.engine.begin() as connection:
+        for name in ANALYTICS_TABLES:
+            connection.exec_driver_sql(f'ANALYZE {name}')
+
+@schema.migration(10, 'Cascade deletes and soft delete')
+def add_cascade_deletes(context):
+    context.add_column('users', 'deleted_at', 'DATETIME')
+    context.add_column('courses', 'deleted_at', 'DATETIME')
+    # Parents first, so a course removed for a missing instructor takes its rows with it
+    tables = [table for table in db.metadata.sorted_tables if table.foreign_key_constraints]
+    orphans = sum(context.delete_orphans(table) for table in tables)
+    for table in tables:
+        context.sync_foreign_keys(table)
+    if orphans:
+        context.out(f'   {repair_course_counters()} counter(s) repaired')
+        rebuild_course_search()
+        rebuild_recommendations()
+        refresh_course_rankings()
+        rebuild_course_daily_stats()
+        context.out('   search, recommendations, rankings and analytics rebuilt')
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+@schema.migration(11, 'Store trending scores per era')
+def add_trending_eras(context):
+    context.add_column('course_rankings', 'trending_era', 'INTEGER NOT NULL DEFAULT 0')
+    # Recomputed rather than rescaled: scores relative to a fixed epoch may already be inf
+    context.out(f'   {refresh_course_rankings()} course(s) ranked')
+
+def migrate_database(target=None):
+    """Apply pending migrations; returns the migrations that ran"""
+    return Migrator(db.engine, schema).upgrade(target)
+
 # ==================== DATABASE INITIALIZATION ====================
 
 def init_database():
     """Initialize the database with tables"""
-    with app.app_context():
-        db.create_all()
-        print('✅ Database tables created successfully!')
-        print('📊 Tables created: users, courses, categories, enrollments, reviews')
+    migrate()
 
 def seed_database():
     """Seed database with sample data"""
@@ -671,6 +3437,290 @@ def seed_database():
         print('📂 Categories created: 6')
         print('👤 Admin user created: 1')
 
+# Every generated account signs in with this password (for HTTP load tests)
+SCALE_PASSWORD = 'password123'
+
+def insert_rows(table, rows, label, returning=None):
+    """Insert rows in IMPORT_BATCH_SIZE transactions, printing progress; returns RETURNING rows"""
+    started = time.monotonic()
+    inserted = 0
+    returned = []
+    for batch in batched(rows, app.config['IMPORT_BATCH_SIZE']):
+        with db.engine.begin() as connection:
+            if returning is not None:
+                returned += connection.execute(
+                    table.insert().returning(*returning, sort_by_parameter_order=True), batch
+                ).all()
+            else:
+                connection.execute(table.insert(), batch)
+        inserted += len(batch)
+    elapsed = time.monotonic() - started
+    print(f'   {label}: {inserted} rows in {elapsed:.1f}s ({inserted / elapsed if elapsed else 0:.0f} rows/s)')
+    return returned
+
+def seed_scale(arguments):
+    """Generate a production-sized dataset with skewed, reproducible activity"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='python app.py seed_scale')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--enrollments', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42, help='same seed, same data')
+    options = parser.parse_args(arguments)
+    rng = random.Random(options.seed)
+    now = datetime.utcnow()
+    
+    users_table = User.__table__
+    courses_table = Course.__table__
+    with app.app_context():
+        with db.engine.connect() as connection:
+            category_ids = connection.execute(select(Category.__table__.c.id)).scalars().all()
+            already_seeded = connection.execute(
+                select(users_table.c.id).where(users_table.c.email == user_email(options.seed, 0))
+            ).first()
+        if not category_ids:
+            print('⚠️  No categories yet; run python app.py seed_db first')
+            return
+        if already_seeded:
+            print(f'⚠️  Seed {options.seed} was already generated; pass a different --seed')
+            return
+        
+        users = insert_rows(users_table, generate_users(
+            rng, options.users, options.seed, password_hasher.hash(SCALE_PASSWORD), now
+        ), 'users', returning=(users_table.c.id, users_table.c.role))
+        instructor_ids = [user_id for user_id, role in users if role == 'instructor']
+        student_ids = [user_id for user_id, role in users if role == 'student']
+        courses = insert_rows(courses_table, generate_courses(
+            rng, options.courses, instructor_ids, category_ids, now
+        ), 'courses', returning=(courses_table.c.id, courses_table.c.created_at))
+        
+        enrollments = min(options.enrollments, len(student_ids) * len(courses))
+        started = time.monotonic()
+        written = reviewed = 0
+        activity = generate_activity(rng, enrollments, options.reviews, student_ids, courses, now)
+        for batch in batched(activity, app.config['IMPORT_BATCH_SIZE']):
+            reviews = [review for _, review in batch if review is not None]
+            with db.engine.begin() as connection:
+                connection.execute(insert_ignoring_conflicts(Enrollment.__table__),
+                                   [enrollment for enrollment, _ in batch])
+                if reviews:
+                    connection.execute(insert_ignoring_conflicts(Review.__table__), reviews)
+            written += len(batch)
+            reviewed += len(reviews)
+        elapsed = time.monotonic() - started
+        print(f'   enrollments: {written} rows, reviews: {reviewed} rows in {elapsed:.1f}s '
+              f'({(written + reviewed) / elapsed if elapsed else 0:.0f} rows/s)')
+        
+        # Core inserts skip the listeners: recompute counters, index and caches in one go
+        db.session.execute(course_counter_update(only_drifted=False))
+        db.session.execute(category_counter_update(only_drifted=False))
+        db.session.commit()
+        rebuild_course_search()
+        rebuild_recommendations()
+        refresh_course_rankings()
+        rebuild_course_daily_stats()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        cache.clear()
+        listing_counts.clear()
+        admin_stats_cache.clear()
+    print(f'✅ Generated seed {options.seed}; every account\'s password is {SCALE_PASSWORD}')
+
+def migrate(target=None):
+    """Bring the database schema up to date"""
+    with app.app_context():
+        applied = migrate_database(target)
+        if applied:
+            print(f'✅ Applied {len(applied)} migration(s); schema at version {applied[-1].version}')
+        else:
+            print('✅ Database schema is up to date')
+
+def migration_status():
+    """List applied and pending migrations"""
+    with app.app_context():
+        pending = {migration.version for migration in Migrator(db.engine, schema).pending()}
+    for migration in schema:
+        marker = '⏳ pending ' if migration.version in pending else '✅ applied '
+        print(f'{marker} {migration.version:04d} {migration.name}')
+
+def repair_counters():
+    """Repair the denormalized course aggregates"""
+    with app.app_context():
+        repaired = repair_course_counters()
+        if repaired:
+            cache.clear()
+        print(f'✅ Counters repaired: {repaired} course(s) and category(s) updated')
+
+def rebuild_search():
+    """Rebuild the full-text course search index"""
+    with app.app_context():
+        indexed = rebuild_course_search()
+        if indexed is None:
+            print('⚠️  Full-text search is unavailable on this database; using LIKE search')
+        else:
+            print(f'✅ Search index rebuilt: {indexed} course(s) indexed')
+            cache.invalidate('catalog')
+
+def rebuild_recommendation_index():
+    """Recount co-enrollments and re-rank every course's recommendations"""
+    if numpy is None:
+        print('⚠️  NumPy is not installed; recounting in pure Python, about 20 times slower '
+              '(pip install -r requirements.txt)')
+    with app.app_context():
+        started = time.monotonic()
+        pairs = rebuild_recommendations()
+        print(f'✅ Recommendations rebuilt: {pairs} co-enrolled course pair(s) in '
+              f'{time.monotonic() - started:.1f}s')
+
+def refresh_rankings():
+    """Recompute trending, top rated and most enrolled scores"""
+    with app.app_context():
+        started = time.monotonic()
+        ranked = refresh_course_rankings()
+        print(f'✅ Rankings refreshed: {ranked} course(s) in {time.monotonic() - started:.1f}s')
+
+def rebuild_analytics():
+    """Recompute the instructor analytics rollup"""
+    with app.app_context():
+        started = time.monotonic()
+        rows = rebuild_course_daily_stats()
+        print(f'✅ Analytics rebuilt: {rows} course day(s) in {time.monotonic() - started:.1f}s')
+
+def purge_deleted():
+    """Purge every soft-deleted user and course without waiting for the worker"""
+    with app.app_context():
+        started = time.monotonic()
+        user_ids = db.session.scalars(select(User.id).where(User.deleted_at.is_not(None))).all()
+        rows = sum(purge_user(user_id) for user_id in user_ids)
+        # What is left are courses deleted on their own
+        course_ids = db.session.scalars(select(Course.id).where(Course.deleted_at.is_not(None))).all()
+        rows += sum(purge_course(course_id) for course_id in course_ids)
+        print(f'✅ Purged {len(user_ids)} user(s) and {len(course_ids)} course(s) with {rows} '
+              f'enrollment(s) and review(s) in {time.monotonic() - started:.1f}s')
+
+def run_worker(arguments):
+    """Run background jobs until stopped: worker [--burst]"""
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(prog='python app.py worker')
+    parser.add_argument('--burst', action='store_true', help='exit once no job is due')
+    options = parser.parse_args(arguments)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    
+    if app.config['CACHE_BACKEND'] == 'memory':
+        print('⚠️  CACHE_BACKEND=memory: pages cached by the web server will not see this worker\'s changes')
+    worker = Worker(job_queue, run=run_job, poll_interval=app.config['JOB_POLL_INTERVAL'])
+    # Each rebase queues the next one; this starts the chain on a fresh queue
+    schedule_ranking_rebase()
+    print(f'⏳ Worker {worker.name} waiting for jobs in {job_queue.path}')
+    processed = worker.run(burst=options.burst)
+    print(f'✅ Worker stopped after {processed} job(s)')
+
+def import_file(path, importer, label):
+    """Run an importer over a CSV, JSON or JSON Lines file and print its report"""
+    with app.app_context(), open(path, 'rb') as binary:
+        report = importer(iter_records(text_stream(binary), detect_format(path)))
+    summary = report.as_dict()
+    for error in summary['error_details']:
+        print(f'❌ row {error["row"]}: {error["error"]}')
+    print(f'✅ {label}: {summary["inserted"]} inserted, {summary["updated"]} updated, '
+          f'{summary["skipped"]} already present, {summary["errors"]} error(s) '
+          f'from {summary["rows"]} row(s) in {summary["seconds"]}s '
+          f'({summary["rows_per_second"]} rows/s)')
+    return summary['errors']
+
+def export_file(arguments):
+    """Write one table to a file: export <name> [path] [--since ISO]
+
+    The format follows the file extension (.csv, .json, .jsonl), and a
+    trailing .gz compresses the output.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python app.py export')
+    parser.add_argument('name', choices=sorted(EXPORTS))
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--since', type=parse_since, help='only rows changed at or after this ISO time')
+    options = parser.parse_args(arguments)
+    path = options.path or f'{options.name}.csv'
+    compressed = path.endswith('.gz')
+    format = (path[:-3] if compressed else path).rsplit('.', 1)[-1]
+    if format not in EXPORT_FORMATS:
+        parser.error(f'file extension must be one of {", ".join(EXPORT_FORMATS)} (optionally .gz)')
+    
+    with app.app_context():
+        until = datetime.utcnow()
+        columns, query = export_query(options.name, options.since, until)
+        chunks = export_chunks(format, columns, export_rows(query))
+        if compressed:
+            chunks = gzip_chunks(chunks)
+        written = 0
+        with open(path, 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+    print(f'✅ Exported {options.name} to {path} ({written} bytes)')
+    print(f'⏭️  Next incremental export: --since {until.isoformat()}')
+
+def hot_route_requests():
+    """Yield (client, path, budget) for every ROUTE_QUERY_BUDGETS route, logged in as its role"""
+    with app.app_context():
+        accounts = {role: User.query.filter_by(role=role).first() for role in ROUTE_QUERY_BUDGETS if role}
+        account_ids = {role: user.id for role, user in accounts.items() if user}
+        sample_ids = {
+            'course_id': db.session.scalar(select(func.min(Course.id))),
+            'category_id': db.session.scalar(select(func.min(Category.id))),
+        }
+    
+    # Requests run outside the app context above so each gets a fresh `g`;
+    # whole-page caching is off so every request really renders
+    app.config['PAGE_CACHE_ENABLED'] = False
+    for role, routes in ROUTE_QUERY_BUDGETS.items():
+        client = app.test_client()
+        if role:
+            if role not in account_ids:
+                print(f'⚠️  No {role} account; skipping {", ".join(routes)}')
+                continue
+            with client.session_transaction() as client_session:
+                client_session['_user_id'] = str(account_ids[role])
+                client_session['_fresh'] = True
+        for path, budget in routes.items():
+            if '{' in path:
+                if None in sample_ids.values():
+                    print(f'⚠️  No courses or categories; skipping {path}')
+                    continue
+                path = path.format(**sample_ids)
+            client.get(path)  # warm per-process caches first
+            yield client, path, budget
+
+def check_queries():
+    """Render each listing route and compare its query count with ROUTE_QUERY_BUDGETS"""
+    with app.app_context():
+        engine = db.engine
+    failures = 0
+    for client, path, budget in hot_route_requests():
+        try:
+            count = assert_route_queries(client, engine, path, budget)
+            print(f'✅ {path}: {count} queries (budget {budget})')
+        except AssertionError as error:
+            failures += 1
+            print(f'❌ {error}')
+    return failures
+
+def check_query_plans():
+    """EXPLAIN every query the hot routes run and fail on full table scans"""
+    with app.app_context():
+        engine = db.engine
+    failures = 0
+    for client, path, budget in hot_route_requests():
+        try:
+            count = assert_route_plans(client, engine, path, PLAN_SCAN_ALLOWED)
+            print(f'✅ {path}: {count} queries, all indexed')
+        except AssertionError as error:
+            failures += 1
+            print(f'❌ {error}')
+    return failures
+
 # ==================== RUN APPLICATION ====================
 
 if __name__ == '__main__':
@@ -678,7 +3728,14 @@ if __name__ == '__main__':
     
     # Check command line arguments
     if len(sys.argv) > 1:
-        if sys.argv[1] == 'init_db':
+        if sys.argv[1] == 'migrate':
+            if len(sys.argv) > 2 and sys.argv[2] == 'status':
+                migration_status()
+            else:
+                print('🔧 Migrating database...')
+                migrate(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+            sys.exit(0)
+        elif sys.argv[1] == 'init_db':
             print('🔧 Initializing database...')
             init_database()
             sys.exit(0)
@@ -686,6 +3743,54 @@ if __name__ == '__main__':
             print('🌱 Seeding database...')
             seed_database()
             sys.exit(0)
+        elif sys.argv[1] == 'seed_scale':
+            print('🌱 Generating synthetic data...')
+            seed_scale(sys.argv[2:])
+            sys.exit(0)
+        elif sys.argv[1] == 'repair_counters':
+            print('🧮 Repairing course counters...')
+            repair_counters()
+            sys.exit(0)
+        elif sys.argv[1] == 'rebuild_search':
+            print('🔎 Rebuilding search index...')
+            rebuild_search()
+            sys.exit(0)
+        elif sys.argv[1] == 'rebuild_recommendations':
+            print('🧭 Rebuilding course recommendations...')
+            rebuild_recommendation_index()
+            sys.exit(0)
+        elif sys.argv[1] == 'refresh_rankings':
+            print('📈 Refreshing course rankings...')
+            refresh_rankings()
+            sys.exit(0)
+        elif sys.argv[1] == 'rebuild_analytics':
+            print('📊 Rebuilding instructor analytics...')
+            rebuild_analytics()
+            sys.exit(0)
+        elif sys.argv[1] == 'purge_deleted':
+            print('🗑️  Purging deleted users and courses...')
+            purge_deleted()
+            sys.exit(0)
+        elif sys.argv[1] == 'worker':
+            print('👷 Starting background job worker...')
+            run_worker(sys.argv[2:])
+            sys.exit(0)
+        elif sys.argv[1] == 'import_enrollments' and len(sys.argv) > 2:
+            print('📥 Importing enrollments...')
+            sys.exit(1 if import_file(sys.argv[2], import_enrollments, 'Enrollments') else 0)
+        elif sys.argv[1] == 'import_courses' and len(sys.argv) > 2:
+            print('📥 Importing courses...')
+            sys.exit(1 if import_file(sys.argv[2], import_courses, 'Courses') else 0)
+        elif sys.argv[1] == 'export':
+            print('📤 Exporting...')
+            export_file(sys.argv[2:])
+            sys.exit(0)
+        elif sys.argv[1] == 'check_queries':
+            print('🧪 Checking query budgets...')
+            sys.exit(1 if check_queries() else 0)
+        elif sys.argv[1] == 'check_query_plans':
+            print('🧪 Checking query plans...')
+            sys.exit(1 if check_query_plans() else 0)
     
     # Run Flask application
     print('━' * 50)
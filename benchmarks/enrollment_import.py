@@ -0,0 +1,82 @@
+"""
+Bulk enrollment import benchmark for EduSphere
+Imports new (email, course_id) rows into the app's database and reports rows per second;
+with --min-rate it exits non-zero when the import is slower, so it can gate a change
+
+    python app.py seed_scale --users 20000 --courses 1000 --enrollments 1000000 --reviews 0
+    python benchmarks/enrollment_import.py --rows 20000 --min-rate 10000
+
+Every run adds its rows for good, so point DATABASE_URL at a scratch copy of the database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as edusphere  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+
+def new_enrollments(rows, seed):
+    """`rows` (row number, record) pairs enrolling students in courses they are not in yet"""
+    User, Course, Enrollment = edusphere.User, edusphere.Course, edusphere.Enrollment
+    session = edusphere.db.session
+    students = session.execute(
+        select(User.id, User.email).where(User.role == 'student', User.deleted_at.is_(None))
+    ).all()
+    course_ids = session.scalars(select(Course.id).where(Course.deleted_at.is_(None))).all()
+    if not students or not course_ids:
+        sys.exit('No students or courses; run python app.py seed_scale first')
+    taken = set(session.execute(select(Enrollment.user_id, Enrollment.course_id)).all())
+    if rows > len(students) * len(course_ids) - len(taken):
+        sys.exit(f'Fewer than {rows} students and courses are left to pair up')
+
+    rng = random.Random(seed)
+    records, chosen = [], set()
+    while len(records) < rows:
+        user_id, email = rng.choice(students)
+        pair = (user_id, rng.choice(course_ids))
+        if pair in taken or pair in chosen:
+            continue
+        chosen.add(pair)
+        records.append((len(records) + 1, {'email': email, 'course_id': pair[1]}))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bulk enrollment import')
+    parser.add_argument('--rows', type=int, default=20_000, help='new enrollments to import')
+    parser.add_argument('--seed', type=int, default=None, help='pick the same rows as an earlier run')
+    parser.add_argument('--min-rate', type=float, help='fail below this many rows per second')
+    parser.add_argument('--output', help='save results as JSON')
+    args = parser.parse_args()
+
+    with edusphere.app.app_context():
+        records = new_enrollments(args.rows, args.seed if args.seed is not None else time.time_ns())
+        started = time.perf_counter()
+        report = edusphere.import_enrollments(records)
+        elapsed = time.perf_counter() - started
+    rate = report.inserted / elapsed if elapsed else 0
+    print(f'{report.inserted} of {report.rows} rows inserted ({report.skipped} skipped, '
+          f'{report.error_count} errors) in {elapsed:.2f} s: {rate:,.0f} rows/s')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as handle:
+            json.dump({'started_at': datetime.utcnow().isoformat(), 'rows': report.rows,
+                       'inserted': report.inserted, 'seconds': round(elapsed, 3),
+                       'rows_per_second': round(rate)}, handle, indent=2)
+        print(f'saved {args.output}')
+    if report.inserted < args.rows:
+        sys.exit(f'FAIL: only {report.inserted} of {args.rows} rows were inserted')
+    if args.min_rate is not None and rate < args.min_rate:
+        sys.exit(f'FAIL: {rate:,.0f} rows/s is below the {args.min_rate:,.0f} rows/s floor')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Load-test benchmark for EduSphere's hot routes
+Drives the Flask test client in-process (default) or a running server over HTTP,
+and reports latency percentiles, queries per request and throughput
+
+    python app.py seed_scale --users 20000 --courses 1000 --enrollments 200000 --reviews 40000
+    python benchmarks/load_test.py --requests 200 --output results/before.json
+    gunicorn -w 4 app:app &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 8 --compare results/before.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as edusphere  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+# Route name -> (role to sign in as, path template)
+ROUTES = {
+    'home': (None, '/'),
+    'catalog': (None, '/courses'),
+    'catalog_search': (None, '/courses?search={search}'),
+    'catalog_category': (None, '/courses?category={category_id}'),
+    'course_popular': (None, '/course/{popular_course_id}'),
+    'student_dashboard': ('student', '/dashboard/student'),
+    'instructor_dashboard': ('instructor', '/dashboard/instructor'),
+    'admin': ('admin', '/admin'),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def pick_fixtures():
+    """Busiest accounts and courses from the database the server is using"""
+    User, Course, Enrollment = edusphere.User, edusphere.Course, edusphere.Enrollment
+    with edusphere.app.app_context():
+        session = edusphere.db.session
+        popular = session.execute(
+            select(Course.id, Course.title).order_by(Course.enrollment_count.desc()).limit(1)
+        ).first()
+        if popular is None:
+            sys.exit('No courses; run python app.py seed_scale first')
+        student = session.execute(
+            select(User.id, User.email).join(Enrollment, Enrollment.user_id == User.id)
+            .where(User.email.like('%@scale.example.com'))
+            .group_by(User.id).order_by(func.count().desc()).limit(1)
+        ).first() or session.execute(
+            select(User.id, User.email).where(User.role == 'student').limit(1)
+        ).first()
+        instructor = session.execute(
+            select(User.id, User.email).join(Course, Course.instructor_id == User.id)
+            .group_by(User.id).order_by(func.count().desc()).limit(1)
+        ).first()
+        admin = session.execute(select(User.id, User.email).where(User.role == 'admin').limit(1)).first()
+        return {
+            'values': {
+                'popular_course_id': popular.id,
+                'search': popular.title.split()[-1],
+                'category_id': session.scalar(select(func.min(edusphere.Category.id))),
+            },
+            'accounts': {role: account for role, account in
+                         (('student', student), ('instructor', instructor), ('admin', admin)) if account},
+        }
+
+
+class TestClientDriver:
+    """Requests through Flask's test client, counting the SQL each one runs"""
+
+    counts_queries = True
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.local = threading.local()
+
+    def client(self, role):
+        clients = self.local.__dict__.setdefault('clients', {})
+        if role not in clients:
+            client = edusphere.app.test_client()
+            if role:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(self.accounts[role].id)
+                    session['_fresh'] = True
+            clients[role] = client
+        return clients[role]
+
+    def count_query(self, *args):
+        # The listener sees every thread's queries; tally them per thread
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+
+    def get(self, role, path):
+        self.local.queries = 0
+        response = self.client(role).get(path)
+        return response.status_code, self.local.queries
+
+    def __enter__(self):
+        # Requests run outside this context so each gets a fresh `g`
+        with edusphere.app.app_context():
+            self.engine = edusphere.db.engine
+        event.listen(self.engine, 'before_cursor_execute', self.count_query)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self.count_query)
+        return False
+
+
+class HTTPDriver:
+    """Requests against a running server, signing in through the login form"""
+
+    counts_queries = False
+
+    def __init__(self, base_url, accounts, passwords):
+        self.base_url = base_url.rstrip('/')
+        self.accounts = accounts
+        self.passwords = passwords
+        self.openers = {}
+        self.lock = threading.Lock()
+
+    def opener(self, role):
+        # Shared by all threads (the cookie jar locks itself), so signing in
+        # happens once, during warm-up, and stays out of the measurements
+        with self.lock:
+            if role not in self.openers:
+                opener = urllib.request.build_opener(
+                    urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+                if role:
+                    self.login(opener, self.accounts[role].email, self.passwords[role])
+                self.openers[role] = opener
+            return self.openers[role]
+
+    def login(self, opener, email, password):
+        page = opener.open(self.base_url + '/login').read().decode()
+        token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page)
+        form = {'email': email, 'password': password, 'csrf_token': token.group(1) if token else ''}
+        opener.open(self.base_url + '/login', urllib.parse.urlencode(form).encode())
+
+    def get(self, role, path):
+        try:
+            with self.opener(role).open(self.base_url + path) as response:
+                response.read()
+                # A redirect (e.g. to /login) would otherwise look like a 200
+                if response.geturl() != self.base_url + path:
+                    return 'redirected', None
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def run_route(driver, role, path, requests, concurrency, warmup):
+    for _ in range(warmup):
+        driver.get(role, path)
+
+    def timed(_):
+        started = time.perf_counter()
+        status, queries = driver.get(role, path)
+        return time.perf_counter() - started, status, queries
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        'path': path,
+        'role': role,
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(requests / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'statuses': statuses,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f'{"route":<22} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8}  status')
+    for name, result in results['routes'].items():
+        queries = result['queries_per_request']
+        line = (f'{name:<22} {result["p50_ms"]:>8} {result["p95_ms"]:>8} {result["p99_ms"]:>8} '
+                f'{result["throughput_rps"]:>8} {queries if queries is not None else "-":>8}  '
+                f'{",".join(f"{code}x{count}" for code, count in result["statuses"].items())}')
+        before = (baseline or {}).get('routes', {}).get(name)
+        if before:
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            line += f'  (p95 {change:+.0f}% vs baseline)'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark EduSphere routes')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process test client')
+    parser.add_argument('--requests', type=int, default=100, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per route first')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--routes', nargs='+', choices=sorted(ROUTES), default=list(ROUTES))
+    parser.add_argument('--no-page-cache', action='store_true',
+                        help='render every anonymous page (test client only)')
+    parser.add_argument('--password', default=edusphere.SCALE_PASSWORD,
+                        help='password of the generated student and instructor accounts')
+    parser.add_argument('--admin-password', default='admin123')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare p95 with')
+    args = parser.parse_args()
+
+    fixtures = pick_fixtures()
+    if args.url:
+        driver = HTTPDriver(args.url, fixtures['accounts'], {
+            'student': args.password, 'instructor': args.password, 'admin': args.admin_password})
+    else:
+        driver = TestClientDriver(fixtures['accounts'])
+        if args.no_page_cache:
+            edusphere.app.config['PAGE_CACHE_ENABLED'] = False
+
+    results = {
+        'started_at': datetime.utcnow().isoformat(),
+        'commit': git_commit(),
+        'target': args.url or 'test-client',
+        'settings': {'requests': args.requests, 'warmup': args.warmup, 'concurrency': args.concurrency,
+                     'page_cache': not args.no_page_cache},
+        'fixtures': fixtures['values'],
+        'routes': {},
+    }
+    with driver:
+        for name in args.routes:
+            role, template = ROUTES[name]
+            if role and role not in fixtures['accounts']:
+                print(f'skipping {name}: no {role} account')
+                continue
+            path = template.format(**fixtures['values'])
+            results['routes'][name] = run_route(driver, role, path, args.requests,
+                                                args.concurrency, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+    print_results(results, baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f'saved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
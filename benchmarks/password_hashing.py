@@ -0,0 +1,65 @@
+"""
+Password hashing benchmark for EduSphere
+Reports how many logins per second one worker can verify at each hashing cost
+
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --methods scrypt:16384:8:1 pbkdf2:sha256:300000 --concurrency 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, normalize_method  # noqa: E402
+
+DEFAULT_METHODS = (
+    'pbkdf2:sha256:150000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+)
+
+
+def measure(method, logins, concurrency):
+    """Verify `logins` passwords through a PasswordHasher; returns (logins/sec, mean latency in ms)"""
+    hasher = PasswordHasher(method=method, max_concurrent=concurrency, queue_timeout=60)
+    password_hash = hasher.hash('correct horse battery staple')
+    hasher.verify(password_hash, 'correct horse battery staple')  # warm up
+
+    latencies = []
+
+    def login(_):
+        started = time.perf_counter()
+        hasher.verify(password_hash, 'correct horse battery staple')
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    # Twice as many callers as hashing slots, like a worker under a login storm
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1) * 2) as callers:
+        list(callers.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return logins / elapsed, 1000 * sum(latencies) / len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS,
+                        help='Werkzeug hash methods to compare')
+    parser.add_argument('--logins', type=int, default=40, help='logins verified per setting')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4],
+                        help='PASSWORD_HASH_CONCURRENCY values to try')
+    args = parser.parse_args()
+
+    print(f'{"method":<24} {"concurrency":>11} {"logins/sec":>11} {"latency ms":>10}')
+    for method in args.methods:
+        for concurrency in args.concurrency:
+            rate, mean_ms = measure(normalize_method(method), args.logins, concurrency)
+            print(f'{normalize_method(method):<24} {concurrency:>11} {rate:>11.1f} {mean_ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Recommendation rebuild benchmark for EduSphere
+Times the co-enrollment count over synthetic enrollments, vectorized (NumPy) and in
+pure Python, and reports peak memory; optionally times a full rebuild of the database
+
+    python benchmarks/recommendation_rebuild.py --enrollments 1000000
+    python app.py seed_scale --users 20000 --courses 1000 --enrollments 1000000 --reviews 0
+    python benchmarks/recommendation_rebuild.py --database
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recommendations  # noqa: E402
+from synthetic import generate_activity  # noqa: E402
+
+
+def synthetic_enrollments(students, courses, enrollments, seed):
+    """(user_ids, course_ids) arrays sorted by user, with production-shaped skew"""
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    course_rows = [(course_id, now - timedelta(days=rng.uniform(0, 720))) for course_id in range(1, courses + 1)]
+    pairs = sorted((enrollment['user_id'], enrollment['course_id']) for enrollment, _ in generate_activity(
+        rng, enrollments, 0, list(range(1, students + 1)), course_rows, now))
+    return array('q', (user_id for user_id, _ in pairs)), array('q', (course_id for _, course_id in pairs))
+
+
+def measure(label, function, *args, trace=True):
+    """Run function for its wall time, then again under tracemalloc for its peak memory
+
+    Tracing slows allocation-heavy code severalfold, so the two are measured apart.
+    """
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    stats = {'seconds': round(elapsed, 3), 'peak_mib': None}
+    if trace:
+        del result
+        tracemalloc.start()
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats['peak_mib'] = round(peak / 2 ** 20, 1)
+    peak = f'{stats["peak_mib"]:>9.1f} MiB' if stats['peak_mib'] is not None else f'{"-":>13}'
+    print(f'{label:<14} {elapsed:>8.2f} s {peak}')
+    return result, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the co-enrollment rebuild')
+    parser.add_argument('--enrollments', type=int, default=1_000_000)
+    parser.add_argument('--students', type=int, default=50_000)
+    parser.add_argument('--courses', type=int, default=1_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-python', action='store_true', help='only time the NumPy path')
+    parser.add_argument('--database', action='store_true',
+                        help="time python app.py rebuild_recommendations against the app's database instead")
+    parser.add_argument('--output', help='save results as JSON')
+    args = parser.parse_args()
+
+    results = {'started_at': datetime.utcnow().isoformat(), 'numpy': getattr(recommendations.numpy, '__version__', None)}
+    print(f'{"":<14} {"time":>10} {"peak memory":>13}')
+    if args.database:
+        import app as edusphere
+        with edusphere.app.app_context():
+            pairs, results['rebuild'] = measure('rebuild', edusphere.rebuild_recommendations, trace=False)
+            results['enrollments'] = edusphere.db.session.query(edusphere.Enrollment).count()
+        results['pairs'] = pairs
+    else:
+        started = time.perf_counter()
+        user_ids, course_ids = synthetic_enrollments(args.students, args.courses, args.enrollments, args.seed)
+        print(f'generated {len(user_ids)} enrollments of {args.students} students in {args.courses} courses '
+              f'in {time.perf_counter() - started:.1f}s')
+        results['enrollments'] = len(user_ids)
+        results['settings'] = {'students': args.students, 'courses': args.courses, 'seed': args.seed}
+        if recommendations.numpy is None:
+            print('NumPy is not installed; timing the pure-Python path only')
+        else:
+            counts, results['numpy_rebuild'] = measure('numpy', recommendations.co_enrollment_counts,
+                                                       user_ids, course_ids)
+            results['pairs'] = len(counts[2])
+        if not args.skip_python:
+            numpy, recommendations.numpy = recommendations.numpy, None
+            try:
+                counts, results['python_rebuild'] = measure('pure python', recommendations.co_enrollment_counts,
+                                                            user_ids, course_ids)
+            finally:
+                recommendations.numpy = numpy
+            results['pairs'] = len(counts[2])
+    print(f'{results["pairs"]} co-enrolled course pairs from {results["enrollments"]} enrollments')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f'saved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
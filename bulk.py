@@ -0,0 +1,146 @@
+"""
+Bulk import helpers for EduSphere
+Stream-parses CSV, JSON arrays and JSON Lines into records and collects per-row results
+"""
+import csv
+import io
+import json
+import re
+import time
+from itertools import islice
+
+FORMATS = ('csv', 'json', 'jsonl')
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+class MalformedInput(ValueError):
+    """The input cannot be parsed any further"""
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the input format from a file name or MIME type; defaults to CSV"""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'jsonl'
+    if name.endswith('.json') or 'json' in content_type:
+        return 'json'
+    return 'csv'
+
+
+def text_stream(binary):
+    """Wrap a binary stream for decoding UTF-8 (with or without a BOM) on the fly"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def iter_csv(stream):
+    """Yield (row number, record) from CSV text with a header row"""
+    reader = csv.DictReader(stream)
+    try:
+        for record in reader:
+            yield reader.line_num, {key.strip(): value for key, value in record.items() if key}
+    except csv.Error as error:
+        raise MalformedInput(f'line {reader.line_num}: {error}') from error
+
+
+def iter_json_lines(stream):
+    """Yield (line number, record) from JSON Lines text"""
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                raise MalformedInput(f'line {number}: {error}') from error
+
+
+def iter_json_array(stream, chunk_size=65536):
+    """Yield (position, record) from a JSON array without loading the whole array"""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise MalformedInput('expected a JSON array')
+    position = 1
+    number = 0
+    exhausted = False
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            if position >= len(buffer):
+                raise ValueError('need more data')
+            record, end = decoder.raw_decode(buffer, position)
+            # A value ending at the buffer edge may be cut short (e.g. a number)
+            if end == len(buffer) and not exhausted:
+                raise ValueError('need more data')
+        except ValueError as error:
+            if exhausted:
+                raise MalformedInput(f'item {number + 1}: {error}') from error
+            chunk = stream.read(chunk_size)
+            exhausted = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        number += 1
+        yield number, record
+        position = end
+
+
+def iter_records(stream, format):
+    """Yield (row number, record) pairs from a text stream in the given format"""
+    if format == 'csv':
+        return iter_csv(stream)
+    if format == 'jsonl':
+        return iter_json_lines(stream)
+    if format == 'json':
+        return iter_json_array(stream)
+    raise ValueError(f'Unknown import format {format!r}')
+
+
+def batched(iterable, size):
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ImportReport:
+    """Counts and per-row errors for one import run"""
+
+    # Errors kept for the report; the count keeps going past this
+    MAX_ERRORS = 1000
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []
+        self._started = time.monotonic()
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'errors': self.error_count,
+            'error_details': self.errors,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows / elapsed) if elapsed else None,
+        }
@@ -0,0 +1,282 @@
+"""
+Response and fragment caching for EduSphere
+Pluggable backends (in-process LRU or a shared SQLite file) with versioned namespaces
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """In-process LRU cache with per-entry expiry; one copy per worker"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_versions(self, names):
+        with self._lock:
+            return {name: self._versions.get(name, 0) for name in names}
+
+    def bump_versions(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Cache stored in an SQLite file, shared by every worker on the host"""
+
+    # Expired rows are purged after this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_versions ('
+                'name TEXT PRIMARY KEY, version INTEGER NOT NULL)'
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at >= ?',
+            (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def purge(self):
+        """Drop expired rows, then the soonest-expiring rows beyond max_entries"""
+        connection = self._connection()
+        connection.execute('DELETE FROM cache_entries WHERE expires_at < ?', (time.time(),))
+        connection.execute(
+            'DELETE FROM cache_entries WHERE key IN ('
+            'SELECT key FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def get_versions(self, names):
+        names = list(names)
+        versions = dict.fromkeys(names, 0)
+        if names:
+            placeholders = ', '.join('?' for _ in names)
+            versions.update(self._connection().execute(
+                f'SELECT name, version FROM cache_versions WHERE name IN ({placeholders})', names
+            ).fetchall())
+        return versions
+
+    def bump_versions(self, names):
+        self._connection().executemany(
+            'INSERT INTO cache_versions (name, version) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET version = version + 1',
+            [(name,) for name in names]
+        )
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute('DELETE FROM cache_entries')
+        connection.execute('DELETE FROM cache_versions')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+
+class NullBackend:
+    """Backend that stores nothing; used when caching is switched off"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_versions(self, names):
+        return dict.fromkeys(names, 0)
+
+    def bump_versions(self, names):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class Cache:
+    """Versioned cache front end with per-kind hit/miss counters
+
+    Entries are stored under keys that embed the current version of every
+    namespace they depend on, so bumping a namespace makes its entries
+    unreachable without having to find and delete them.
+    """
+
+    def __init__(self, backend, default_ttl=300):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call callback(namespaces) after every invalidate(), and callback(None) after clear()"""
+        self._subscribers.append(callback)
+
+    def _count(self, kind, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(kind, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def versioned_key(self, kind, key, depends_on=()):
+        """Build the storage key for key under the current namespace versions"""
+        versions = self.backend.get_versions(sorted(set(depends_on)))
+        stamp = ','.join(f'{name}={version}' for name, version in versions.items())
+        return f'{kind}:{key}|{stamp}'
+
+    def get(self, kind, storage_key):
+        value = self.backend.get(storage_key)
+        self._count(kind, 'misses' if value is None else 'hits')
+        return value
+
+    def set(self, storage_key, value, ttl=None):
+        self.backend.set(storage_key, value, ttl or self.default_ttl)
+
+    def invalidate(self, *namespaces):
+        """Make every entry depending on any of namespaces stale"""
+        if namespaces:
+            self.backend.bump_versions(sorted(set(namespaces)))
+            for callback in self._subscribers:
+                callback(namespaces)
+
+    def stats(self):
+        with self._lock:
+            counters = {kind: dict(values) for kind, values in self._counters.items()}
+        for values in counters.values():
+            lookups = values['hits'] + values['misses']
+            values['hit_rate'] = round(values['hits'] / lookups, 4) if lookups else 0.0
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'counters': counters,
+        }
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._counters.clear()
+        for callback in self._subscribers:
+            callback(None)
+
+
+class VersionedSnapshot:
+    """An in-process copy of a small, rarely changing data set
+
+    `load()` rebuilds the copy when `namespace` is invalidated: at once in
+    this process, as soon as other workers see the new namespace version
+    (with a shared backend), and in any case after `ttl` seconds.
+    """
+
+    def __init__(self, cache, namespace, load, ttl=300):
+        self.cache = cache
+        self.namespace = namespace
+        self.load = load
+        self.ttl = ttl
+        self._entry = None
+        self._lock = threading.Lock()
+        cache.subscribe(self._invalidated)
+
+    def _invalidated(self, namespaces):
+        if namespaces is None or self.namespace in namespaces:
+            self.clear()
+
+    def get(self):
+        version = self.cache.backend.get_versions([self.namespace])[self.namespace]
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] != version or time.monotonic() - entry[1] > self.ttl:
+                entry = self._entry = (version, time.monotonic(), self.load())
+            return entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+def create_cache(backend='memory', path=None, max_entries=1024, default_ttl=300):
+    """Build a Cache from configuration values"""
+    if backend == 'sqlite':
+        return Cache(SQLiteBackend(path, max_entries=max_entries), default_ttl)
+    if backend == 'memory':
+        return Cache(MemoryBackend(max_entries=max_entries), default_ttl)
+    return Cache(NullBackend(), default_ttl)
@@ -0,0 +1,159 @@
+"""
+Database engine configuration for EduSphere
+Backend selection, per-backend pool settings, SQLite pragmas, read-replica
+routing and retries for transient lock errors
+"""
+import os
+import random
+import time
+from functools import wraps
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+# Applied to every new SQLite connection; each can be overridden by the
+# matching SQLITE_<NAME> environment variable (e.g. SQLITE_MMAP_SIZE)
+SQLITE_PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,           # milliseconds
+    'mmap_size': 268435456,         # 256 MiB
+    'cache_size': -65536,           # negative means KiB: 64 MiB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',           # enforce foreign keys and run ON DELETE CASCADE
+}
+
+LOCK_ERROR_MESSAGES = ('database is locked', 'database is busy', 'database table is locked')
+
+
+def database_url_from_env(name, default=None, environ=os.environ):
+    """Read a database URL, accepting the postgres:// scheme some hosts hand out"""
+    url = environ.get(name, default)
+    if url and url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _env_flag(environ, name, default):
+    return environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options_for(url, environ=os.environ):
+    """SQLAlchemy engine options tuned for the backend named in url"""
+    options = {
+        # Each gunicorn worker gets its own pool
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+    if make_url(url).get_backend_name() == 'sqlite':
+        busy_timeout = int(environ.get('SQLITE_BUSY_TIMEOUT', SQLITE_PRAGMA_DEFAULTS['busy_timeout']))
+        options['connect_args'] = {
+            'timeout': busy_timeout / 1000,
+            'check_same_thread': False,
+        }
+    else:
+        # Server databases drop idle connections; check and recycle them
+        options['pool_pre_ping'] = _env_flag(environ, 'DB_POOL_PRE_PING', True)
+        options['pool_recycle'] = int(environ.get('DB_POOL_RECYCLE', 1800))
+    return options
+
+
+def sqlite_pragmas_from_env(environ=os.environ):
+    """SQLite pragma values with environment overrides applied"""
+    return {
+        name: environ.get(f'SQLITE_{name.upper()}', default)
+        for name, default in SQLITE_PRAGMA_DEFAULTS.items()
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMA statements on every connection engine opens"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def dispose_after_fork(engine):
+    """Drop pooled connections inherited by a forked worker (gunicorn --preload)"""
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+class RoutingSession(FlaskSession):
+    """Session that sends reads of read-only requests to the 'replica' bind
+
+    Flushes always use the primary. A request that writes pins the visitor
+    to the primary for a few seconds so they read their own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and use_replica():
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica():
+    """Whether the current request may read from the replica"""
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if getattr(g, 'db_wrote', False):
+        return False
+    return session.get('_primary_until', 0) < time.time()
+
+
+def install_replica_routing(app, db, sticky_seconds):
+    """Track writes per request and pin writers to the primary afterwards"""
+
+    @event.listens_for(db.session, 'after_flush')
+    def remember_write(flushed_session, flush_context):
+        if has_request_context():
+            g.db_wrote = True
+
+    @app.after_request
+    def pin_writer_to_primary(response):
+        if getattr(g, 'db_wrote', False):
+            session['_primary_until'] = time.time() + sticky_seconds
+        return response
+
+
+def is_lock_error(error):
+    """True for OperationalErrors caused by another writer holding the database"""
+    if not isinstance(error, OperationalError):
+        return False
+    message = str(error.orig).lower()
+    return any(text in message for text in LOCK_ERROR_MESSAGES)
+
+
+def retry_on_lock(session, attempts=3, base_delay=0.05):
+    """Decorator re-running a write path when the database is briefly locked
+
+    The session is rolled back before each retry, so the wrapped function must
+    not have side effects outside the database before it commits.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return f(*args, **kwargs)
+                except OperationalError as error:
+                    if attempt == attempts or not is_lock_error(error):
+                        raise
+                    session.rollback()
+                    # Exponential backoff with jitter so retrying workers spread out
+                    time.sleep(base_delay * (2 ** (attempt - 1)) * (1 + random.random()))
+        return decorated_function
+    return decorator
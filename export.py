@@ -0,0 +1,88 @@
+"""
+Streaming data export for EduSphere
+Turns row iterators into CSV, JSON or JSON Lines chunks, optionally gzip-compressed,
+without holding the whole export in memory
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Bytes of text collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns, rows):
+    """CSV text with a header row, in chunks of about CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def json_chunks(columns, rows, lines=False):
+    """A JSON array of objects (or one object per line) in chunks of about CHUNK_SIZE"""
+    parts = [] if lines else ['[']
+    size = 0
+    separator = '' if lines else '\n'
+    for row in rows:
+        text = json.dumps(dict(zip(columns, row)), default=_json_default, separators=(',', ':'))
+        parts.append(separator + text + ('\n' if lines else ''))
+        if not lines:
+            separator = ',\n'
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if not lines:
+        parts.append('\n]\n')
+    yield ''.join(parts)
+
+
+def export_chunks(format, columns, rows):
+    """Encoded chunks of rows in format ('csv', 'json' or 'jsonl')"""
+    if format == 'csv':
+        chunks = csv_chunks(columns, rows)
+    elif format in ('json', 'jsonl'):
+        chunks = json_chunks(columns, rows, lines=format == 'jsonl')
+    else:
+        raise ValueError(f'Unknown export format {format!r}')
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode()
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream as they arrive"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,79 @@
+"""
+Gunicorn settings for EduSphere, loaded automatically by `gunicorn app:app`
+"""
+import os
+import subprocess
+import sys
+import threading
+
+# Several request threads per worker: password hashing and SQLite waits release
+# the GIL, so other requests keep being served while a login hashes
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+# Seconds between checks that every job worker is still running
+JOB_WORKER_CHECK_INTERVAL = 5
+
+
+def job_worker_count():
+    # Background job workers run beside the web workers; set JOB_WORKERS=0 when
+    # `python app.py worker` runs elsewhere on the host
+    return int(os.environ.get('JOB_WORKERS', 1))
+
+
+def on_starting(server):
+    # Job workers are separate processes, so the pages they change are invalidated
+    # in the web workers only through a cache every process shares
+    if job_worker_count() and os.environ.get('CACHE_BACKEND') == 'memory':
+        raise RuntimeError('CACHE_BACKEND=memory keeps a cache per process, so the web workers '
+                           'would never see the job workers\' invalidations. Use CACHE_BACKEND=sqlite '
+                           'or none, or set JOB_WORKERS=0.')
+
+
+def start_job_worker():
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    return subprocess.Popen([sys.executable, app_path, 'worker'])
+
+
+def supervise_job_workers(server):
+    # Replace job workers that exit while the server is running. The arbiter reaps
+    # every child, so poll() may report 0 for a worker that crashed
+    while not server.job_workers_stopping.wait(JOB_WORKER_CHECK_INTERVAL):
+        with server.job_workers_lock:
+            if server.job_workers_stopping.is_set():
+                break
+            for index, process in enumerate(server.job_workers):
+                if process.poll() is not None:
+                    server.log.error('Job worker (pid:%s) exited, starting another', process.pid)
+                    server.job_workers[index] = start_job_worker()
+
+
+def when_ready(server):
+    server.job_workers = [start_job_worker() for _ in range(job_worker_count())]
+    server.job_workers_stopping = threading.Event()
+    server.job_workers_lock = threading.Lock()
+    if server.job_workers:
+        threading.Thread(target=supervise_job_workers, args=(server,),
+                         name='job-worker-supervisor', daemon=True).start()
+
+
+def on_exit(server):
+    # Job workers finish the job in hand before exiting
+    if hasattr(server, 'job_workers_stopping'):
+        with server.job_workers_lock:
+            server.job_workers_stopping.set()
+    processes = getattr(server, 'job_workers', [])
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=server.cfg.graceful_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def worker_exit(server, worker):
+    # Write progress heartbeats still buffered in the stopping worker
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.progress_tracker.close()
@@ -0,0 +1,102 @@
+"""
+Signed-in user cache for EduSphere
+Lets Flask-Login resolve the session's user without a database query per request
+"""
+from cache import MemoryBackend, NullBackend, SQLiteBackend
+
+
+class UserIdentity:
+    """Compact snapshot of a signed-in user's id, name and role
+
+    Implements the Flask-Login user interface. Any other attribute (email,
+    enrollments, ...) loads the full User row on first use, so templates keep
+    working unchanged; writes must go through the row from record().
+    """
+
+    __slots__ = ('id', 'name', 'role', '_load', '_user')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, name, role, load):
+        self.id = id
+        self.name = name
+        self.role = role
+        self._load = load
+        self._user = None
+
+    def get_id(self):
+        return str(self.id)
+
+    def record(self):
+        """The full User row, loaded once per request"""
+        if self._user is None:
+            self._user = self._load(self.id)
+        return self._user
+
+    def __getattr__(self, attribute):
+        # Only reached for attributes outside the snapshot
+        if attribute.startswith('__'):
+            raise AttributeError(attribute)
+        user = self.record()
+        if user is None:
+            raise AttributeError(attribute)
+        return getattr(user, attribute)
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id and hasattr(other, 'get_id')
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<UserIdentity {self.id} {self.role}>'
+
+
+class IdentityCache:
+    """TTL/LRU cache of (id, name, role) snapshots keyed by user id
+
+    `fetch(user_id)` reads a snapshot tuple from the database (None if the
+    user is gone) and `load(user_id)` returns the full row when a request
+    needs more than the snapshot.
+    """
+
+    def __init__(self, backend, fetch, load, ttl=300):
+        self.backend = backend
+        self.fetch = fetch
+        self.load = load
+        self.ttl = ttl
+
+    def get(self, user_id):
+        key = f'user:{user_id}'
+        snapshot = self.backend.get(key)
+        if snapshot is None:
+            snapshot = self.fetch(user_id)
+            if snapshot is None:
+                return None
+            snapshot = tuple(snapshot)
+            self.backend.set(key, snapshot, self.ttl)
+        return UserIdentity(*snapshot, load=self.load)
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.backend.delete(f'user:{user_id}')
+
+    def clear(self):
+        self.backend.clear()
+
+
+def create_identity_cache(fetch, load, backend='memory', path=None, max_entries=4096, ttl=300):
+    """Build an IdentityCache from configuration values
+
+    'sqlite' shares snapshots (and their invalidation) between every worker
+    on the host; 'memory' keeps a copy per worker.
+    """
+    if backend == 'sqlite':
+        store = SQLiteBackend(path, max_entries=max_entries)
+    elif backend == 'memory':
+        store = MemoryBackend(max_entries=max_entries)
+    else:
+        store = NullBackend()
+    return IdentityCache(store, fetch, load, ttl)
@@ -0,0 +1,265 @@
+"""
+Request and query profiling for EduSphere
+Per-request query counts, database and template time from SQLAlchemy engine events and
+Flask signals, aggregated into per-route Prometheus metrics and a slow-request log
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from heapq import heappush, heappushpop
+from flask import request, request_finished, request_started, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Upper bounds of the Prometheus histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Statement text kept per slow query
+STATEMENT_PREVIEW = 300
+
+slow_request_log = logging.getLogger('edusphere.slow_requests')
+
+_current = ContextVar('edusphere_request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings collected while one request is handled"""
+
+    __slots__ = ('started', 'queries', 'db_time', 'render_time', 'slowest', '_render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.slowest = []
+        self._render_started = []
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class RouteStats:
+    __slots__ = ('duration', 'queries', 'db_time', 'render_time', 'slow', 'statuses')
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.slow = 0
+        self.statuses = {}
+
+
+class RequestProfiler:
+    """Collects per-request profiles and per-route aggregates for one worker process
+
+    Switch it on and off at runtime with set_enabled(). When a flag store (any
+    cache backend) is given, the switch is shared with every worker using that
+    store and re-read at most every `flag_interval` seconds.
+    """
+
+    FLAG_KEY = 'instrumentation:enabled'
+
+    def __init__(self, enabled=True, slow_ms=500, slow_queries=20, keep_statements=3,
+                 recent_slow=100, flag_store=None, flag_interval=5.0):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.slow_queries = slow_queries
+        self.keep_statements = keep_statements
+        self.recent_slow = deque(maxlen=recent_slow)
+        self.flag_store = flag_store
+        self.flag_interval = flag_interval
+        self._flag_checked = 0.0
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    # ---- switching ----
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        if self.flag_store is not None:
+            self.flag_store.set(self.FLAG_KEY, self.enabled, 10 * 365 * 86400)
+        self._flag_checked = time.monotonic()
+
+    def _refresh_flag(self):
+        now = time.monotonic()
+        if self.flag_store is None or now - self._flag_checked < self.flag_interval:
+            return
+        self._flag_checked = now
+        stored = self.flag_store.get(self.FLAG_KEY)
+        if stored is not None:
+            self.enabled = stored
+
+    # ---- wiring ----
+
+    def install(self, app, engines):
+        """Hook the profiler into app's request signals and the given engines"""
+        request_started.connect(self._request_started, app, weak=False)
+        request_finished.connect(self._request_finished, app, weak=False)
+        before_render_template.connect(self._render_started, app, weak=False)
+        template_rendered.connect(self._render_finished, app, weak=False)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._query_started)
+            event.listen(engine, 'after_cursor_execute', self._query_finished)
+
+    def _request_started(self, sender, **extra):
+        self._refresh_flag()
+        _current.set(RequestProfile() if self.enabled else None)
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None:
+            return
+        starts = conn.info.get('profile_query_started')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        profile.queries += 1
+        profile.db_time += elapsed
+        # Min-heap of the slowest few; the counter breaks ties between equal timings
+        entry = (elapsed, profile.queries, statement)
+        if len(profile.slowest) < self.keep_statements:
+            heappush(profile.slowest, entry)
+        elif elapsed > profile.slowest[0][0]:
+            heappushpop(profile.slowest, entry)
+
+    def _render_started(self, sender, template, context, **extra):
+        profile = _current.get()
+        if profile is not None:
+            profile._render_started.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        profile = _current.get()
+        if profile is not None and profile._render_started:
+            profile.render_time += time.perf_counter() - profile._render_started.pop()
+
+    def _request_finished(self, sender, response, **extra):
+        profile = _current.get()
+        if profile is None:
+            return
+        _current.set(None)
+        duration = time.perf_counter() - profile.started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        slow = duration >= self.slow_seconds or profile.queries >= self.slow_queries
+
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            stats.duration.observe(DURATION_BUCKETS, duration)
+            stats.queries.observe(QUERY_BUCKETS, profile.queries)
+            stats.db_time += profile.db_time
+            stats.render_time += profile.render_time
+            status_key = (request.method, response.status_code)
+            stats.statuses[status_key] = stats.statuses.get(status_key, 0) + 1
+            if slow:
+                stats.slow += 1
+
+        if slow:
+            self._log_slow(route, response.status_code, duration, profile)
+
+    def _log_slow(self, route, status, duration, profile):
+        record = {
+            'at': time.time(),
+            'route': route,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': status,
+            'duration_ms': round(duration * 1000, 1),
+            'db_ms': round(profile.db_time * 1000, 1),
+            'render_ms': round(profile.render_time * 1000, 1),
+            'queries': profile.queries,
+            'slowest_statements': [
+                {'ms': round(elapsed * 1000, 2), 'sql': ' '.join(statement.split())[:STATEMENT_PREVIEW]}
+                for elapsed, _, statement in sorted(profile.slowest, reverse=True)
+            ],
+        }
+        self.recent_slow.append(record)
+        slow_request_log.warning(
+            '%s %s %s took %.1f ms (db %.1f ms in %d queries, render %.1f ms)',
+            record['method'], record['path'], status, record['duration_ms'],
+            record['db_ms'], record['queries'], record['render_ms']
+        )
+
+    # ---- reporting ----
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.recent_slow.clear()
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP edusphere_profiling_enabled Whether request profiling is switched on',
+                '# TYPE edusphere_profiling_enabled gauge',
+                f'edusphere_profiling_enabled {int(self.enabled)}',
+                '# HELP edusphere_process_start_time_seconds When this worker started collecting',
+                '# TYPE edusphere_process_start_time_seconds gauge',
+                f'edusphere_process_start_time_seconds {self._started:.3f}',
+                '# HELP edusphere_requests_total Requests handled, by route, method and status',
+                '# TYPE edusphere_requests_total counter',
+            ]
+            for route, stats in routes:
+                for (method, status), count in sorted(stats.statuses.items()):
+                    lines.append(f'edusphere_requests_total{{route="{_escape(route)}",method="{method}",'
+                                 f'status="{status}"}} {count}')
+            lines += _histogram_lines('edusphere_request_duration_seconds',
+                                      'Request handling time', DURATION_BUCKETS,
+                                      [(route, stats.duration) for route, stats in routes])
+            lines += _histogram_lines('edusphere_request_queries',
+                                      'SQL statements run per request', QUERY_BUCKETS,
+                                      [(route, stats.queries) for route, stats in routes])
+            for name, help_text, attribute in (
+                ('edusphere_db_time_seconds_total', 'Time spent executing SQL', 'db_time'),
+                ('edusphere_render_time_seconds_total', 'Time spent rendering Jinja templates', 'render_time'),
+                ('edusphere_slow_requests_total', 'Requests over the slow thresholds', 'slow'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{route="{_escape(route)}"}} {getattr(stats, attribute):.6g}'
+                          for route, stats in routes]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _histogram_lines(name, help_text, buckets, histograms):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for route, histogram in histograms:
+        label = f'route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}}} {histogram.total:.6g}')
+        lines.append(f'{name}_count{{{label}}} {histogram.count}')
+    return lines
@@ -0,0 +1,315 @@
+"""
+Background jobs for EduSphere
+A durable job queue kept in a local SQLite file: requests enqueue work and return at once,
+and `python app.py worker` processes run it with retries, backoff and status tracking
+"""
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+log = logging.getLogger('edusphere.jobs')
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+JOB_COLUMNS = ('id', 'name', 'payload', 'idempotency_key', 'owner_id', 'status', 'attempts',
+               'max_attempts', 'run_at', 'locked_by', 'locked_until', 'result', 'error',
+               'created_at', 'updated_at', 'finished_at')
+
+
+class Job(namedtuple('Job', JOB_COLUMNS)):
+    """One row of the jobs table, with payload and result decoded"""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(*row)
+        return job._replace(payload=json.loads(job.payload),
+                            result=json.loads(job.result) if job.result is not None else None)
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def as_dict(self):
+        """Status as shown to a polling client"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'finished_at': self.finished_at,
+            'retry_at': self.run_at if self.status == QUEUED and self.attempts else None,
+        }
+
+
+class PermanentError(Exception):
+    """Raised by a task to fail its job at once, without the remaining retries"""
+
+
+class UnknownTask(Exception):
+    pass
+
+
+class JobQueue:
+    """Jobs stored in an SQLite file that every process on the host shares
+
+    A job is claimed by a single UPDATE, so any number of worker processes
+    can poll the same file without handing one job to two of them. A claim
+    is a lease: a worker that dies mid-job stops renewing it, and once it
+    runs out another worker picks the job up again. A failed attempt is
+    retried after `backoff` seconds, doubling each time up to `max_backoff`,
+    until the job has run `max_attempts` times.
+
+    Enqueueing with an idempotency key returns the job already holding that
+    key instead of adding another, so a retried request or a double click
+    does not do the work twice. A key whose job has failed for good may be
+    enqueued again, which restarts that job.
+    """
+
+    # Finished jobs are purged after this many claims
+    PURGE_EVERY = 500
+
+    def __init__(self, path, max_attempts=5, backoff=10.0, max_backoff=3600.0, lease=300.0,
+                 retention=7 * 86400):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.retention = retention
+        self.tasks = {}
+        self._local = threading.local()
+        self._claims = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, '
+                'idempotency_key TEXT UNIQUE, owner_id INTEGER, status TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, '
+                'run_at REAL NOT NULL, locked_by TEXT, locked_until REAL, result TEXT, error TEXT, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL)'
+            )
+            # Claims scan due jobs in run_at order; expired leases are found by status
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_jobs_finished_at ON jobs (finished_at)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def task(self, name):
+        """Decorator registering a function as the handler of jobs called `name`
+
+        The handler receives the job's payload as keyword arguments, and
+        whatever JSON-serializable value it returns becomes the job's result.
+        """
+        def register(function):
+            self.tasks[name] = function
+            return function
+        return register
+
+    def enqueue(self, name, payload=None, key=None, owner_id=None, delay=0, max_attempts=None):
+        """Add a job and return it, or the existing job if `key` is already queued"""
+        if name not in self.tasks:
+            raise UnknownTask(name)
+        now = time.time()
+        row = self._connection().execute(
+            'INSERT INTO jobs (name, payload, idempotency_key, owner_id, status, max_attempts, '
+            'run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(idempotency_key) DO UPDATE SET payload = excluded.payload, '
+            'status = excluded.status, attempts = 0, max_attempts = excluded.max_attempts, '
+            'run_at = excluded.run_at, error = NULL, result = NULL, finished_at = NULL, '
+            'updated_at = excluded.updated_at WHERE jobs.status = ? '
+            f'RETURNING {", ".join(JOB_COLUMNS)}',
+            (name, json.dumps(payload or {}), key, owner_id, QUEUED,
+             max_attempts or self.max_attempts, now + delay, now, now, FAILED)
+        ).fetchone()
+        if row is None:
+            row = self._select('idempotency_key = ?', (key,))
+        return Job.from_row(row)
+
+    def get(self, job_id):
+        row = self._select('id = ?', (job_id,))
+        return Job.from_row(row) if row else None
+
+    def get_by_key(self, key):
+        row = self._select('idempotency_key = ?', (key,))
+        return Job.from_row(row) if row else None
+
+    def _select(self, condition, parameters):
+        return self._connection().execute(
+            f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE {condition}', parameters
+        ).fetchone()
+
+    def recent(self, limit=50):
+        """Newest jobs first"""
+        rows = self._connection().execute(
+            f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs ORDER BY id DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def counts(self):
+        """{status: jobs}"""
+        counts = dict.fromkeys((QUEUED, RUNNING, SUCCEEDED, FAILED), 0)
+        counts.update(self._connection().execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status'
+        ).fetchall())
+        return counts
+
+    def claim(self, worker):
+        """Lease the next due job to `worker`, or return None when nothing is due"""
+        now = time.time()
+        connection = self._connection()
+        # A job whose worker died on its last attempt (e.g. killed for memory) is not run again
+        connection.execute(
+            'UPDATE jobs SET status = ?, error = ?, locked_by = NULL, locked_until = NULL, '
+            'updated_at = ?, finished_at = ? '
+            'WHERE status = ? AND locked_until < ? AND attempts >= max_attempts',
+            (FAILED, 'Worker stopped before finishing the job', now, now, RUNNING, now)
+        )
+        row = connection.execute(
+            'UPDATE jobs SET status = ?, attempts = attempts + 1, locked_by = ?, locked_until = ?, '
+            'updated_at = ? WHERE id = ('
+            'SELECT id FROM jobs WHERE (status = ? AND run_at <= ?) '
+            'OR (status = ? AND locked_until < ?) ORDER BY run_at, id LIMIT 1) '
+            f'RETURNING {", ".join(JOB_COLUMNS)}',
+            (RUNNING, worker, now + self.lease, now, QUEUED, now, RUNNING, now)
+        ).fetchone()
+        self._claims += 1
+        if self._claims % self.PURGE_EVERY == 0:
+            self.purge()
+        return Job.from_row(row) if row else None
+
+    def renew(self, job, worker):
+        """Extend a running job's lease; False if another worker has taken it over"""
+        return self._connection().execute(
+            'UPDATE jobs SET locked_until = ? WHERE id = ? AND status = ? AND locked_by = ?',
+            (time.time() + self.lease, job.id, RUNNING, worker)
+        ).rowcount == 1
+
+    def complete(self, job, worker, result=None):
+        now = time.time()
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = NULL, locked_by = NULL, '
+            'locked_until = NULL, updated_at = ?, finished_at = ? '
+            'WHERE id = ? AND status = ? AND locked_by = ?',
+            (SUCCEEDED, json.dumps(result), now, now, job.id, RUNNING, worker)
+        )
+
+    def fail(self, job, worker, error, retry=True):
+        """Record a failed attempt; the job is retried later unless it is out of attempts"""
+        now = time.time()
+        if retry and job.attempts < job.max_attempts:
+            status, run_at, finished_at = QUEUED, now + self.retry_delay(job.attempts), None
+        else:
+            status, run_at, finished_at = FAILED, job.run_at, now
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, run_at = ?, error = ?, locked_by = NULL, '
+            'locked_until = NULL, updated_at = ?, finished_at = ? '
+            'WHERE id = ? AND status = ? AND locked_by = ?',
+            (status, run_at, error, now, finished_at, job.id, RUNNING, worker)
+        )
+        return status
+
+    def retry_delay(self, attempts):
+        """Seconds before the next attempt: exponential with jitter, so failures spread out"""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def purge(self):
+        """Drop jobs finished more than `retention` seconds ago, freeing their idempotency keys"""
+        return self._connection().execute(
+            'DELETE FROM jobs WHERE finished_at < ?', (time.time() - self.retention,)
+        ).rowcount
+
+
+class Worker:
+    """Runs jobs from a queue until stopped
+
+    `run` is called with the handler and the job's payload and wraps the
+    call in whatever the task needs (the app passes one that opens an app
+    context). SIGTERM and SIGINT let the job in hand finish before the
+    worker exits.
+    """
+
+    def __init__(self, queue, run=None, poll_interval=1.0, name=None):
+        self.queue = queue
+        self.run_task = run or (lambda handler, payload: handler(**payload))
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+
+    def stop(self, *_):
+        self._stopping.set()
+
+    def run(self, burst=False):
+        """Process jobs until stopped, or with `burst` until none is due; returns jobs run"""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+        processed = 0
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(self.name)
+            except sqlite3.OperationalError:
+                log.exception('Claiming a job failed; retrying')
+                job = None
+            if job is None:
+                if burst:
+                    break
+                self._stopping.wait(self.poll_interval)
+                continue
+            self.execute(job)
+            processed += 1
+        return processed
+
+    def execute(self, job):
+        handler = self.queue.tasks.get(job.name)
+        if handler is None:
+            self.queue.fail(job, self.name, f'No task named {job.name!r}', retry=False)
+            return
+        renewing = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_lease, args=(job, renewing),
+                                     name=f'job-{job.id}-lease', daemon=True)
+        heartbeat.start()
+        started = time.monotonic()
+        try:
+            result = self.run_task(handler, job.payload)
+        except Exception as error:
+            retry = not isinstance(error, PermanentError)
+            status = self.queue.fail(job, self.name, f'{type(error).__name__}: {error}', retry=retry)
+            log.exception('Job %d (%s) attempt %d/%d failed; %s', job.id, job.name, job.attempts,
+                          job.max_attempts, 'will retry' if status == QUEUED else 'giving up')
+        else:
+            self.queue.complete(job, self.name, result)
+            log.info('Job %d (%s) succeeded in %.1fs', job.id, job.name, time.monotonic() - started)
+        finally:
+            renewing.set()
+            heartbeat.join()
+
+    def _renew_lease(self, job, done):
+        while not done.wait(self.queue.lease / 3):
+            if not self.queue.renew(job, self.name):
+                log.warning('Job %d lost its lease to another worker', job.id)
+                return
@@ -0,0 +1,247 @@
+"""
+Versioned schema migrations for EduSphere
+Applied in order by `python app.py migrate`; each version runs once per database
+"""
+import time
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+migration_metadata = MetaData()
+
+# One row per applied migration
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class Migration:
+    """A numbered schema change; upgrade(context) performs it"""
+
+    def __init__(self, version, name, upgrade):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d} {self.name}>'
+
+
+class MigrationRegistry:
+    """Ordered collection of migrations, filled in with the @migration decorator"""
+
+    def __init__(self):
+        self._migrations = {}
+
+    def migration(self, version, name):
+        def decorator(upgrade):
+            if version in self._migrations:
+                raise ValueError(f'Duplicate migration version {version}')
+            self._migrations[version] = Migration(version, name, upgrade)
+            return upgrade
+        return decorator
+
+    def __iter__(self):
+        return iter(sorted(self._migrations.values(), key=lambda migration: migration.version))
+
+
+class MigrationContext:
+    """Helpers handed to each migration
+
+    Every helper is safe to re-run against a database that already has the
+    change, so adopting a database created before migrations existed works.
+    """
+
+    def __init__(self, engine, out=print):
+        self.engine = engine
+        self.out = out
+
+    def has_table(self, table_name):
+        return inspect(self.engine).has_table(table_name)
+
+    def has_column(self, table_name, column_name):
+        return any(column['name'] == column_name
+                   for column in inspect(self.engine).get_columns(table_name))
+
+    def create_tables(self, metadata, tables=None):
+        """Create the given (or all) tables of metadata that do not exist yet"""
+        with self.engine.begin() as connection:
+            metadata.create_all(connection, tables=tables, checkfirst=True)
+
+    def add_column(self, table_name, column_name, ddl):
+        """ALTER TABLE ADD COLUMN unless it is there; returns True if it was added"""
+        if self.has_column(table_name, column_name):
+            return False
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}')
+        self.out(f'   + {table_name}.{column_name}')
+        return True
+
+    def create_indexes(self, table):
+        """Create the indexes declared on table that the database lacks"""
+        existing = {index['name'] for index in inspect(self.engine).get_indexes(table.name)}
+        created = []
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                # One transaction per index keeps each write lock short
+                with self.engine.begin() as connection:
+                    index.create(connection)
+                self.out(f'   + index {index.name}')
+                created.append(index.name)
+        return created
+
+    def sync_foreign_keys(self, table):
+        """Give table's foreign keys the ON DELETE actions its model declares
+
+        SQLite cannot alter a constraint, so there the table is rebuilt in
+        one transaction: created under a temporary name, filled, swapped in
+        and re-indexed, with enforcement paused and every row checked
+        afterwards. That holds the write lock for the whole copy. Other
+        databases drop and re-add just the changed constraints. Returns
+        the column tuples whose constraint changed.
+        """
+        existing = {tuple(foreign_key['constrained_columns']): foreign_key
+                    for foreign_key in inspect(self.engine).get_foreign_keys(table.name)}
+        changed = {}
+        for constraint in table.foreign_key_constraints:
+            columns = tuple(constraint.column_keys)
+            current = existing.get(columns, {}).get('options', {}).get('ondelete')
+            if (current or '').upper() != (constraint.ondelete or '').upper():
+                changed[columns] = constraint
+        if not changed:
+            return []
+        if self.engine.dialect.name == 'sqlite':
+            self._rebuild_sqlite_table(table)
+        else:
+            with self.engine.begin() as connection:
+                for columns, constraint in changed.items():
+                    name = existing.get(columns, {}).get('name')
+                    if name:
+                        connection.exec_driver_sql(f'ALTER TABLE {table.name} DROP CONSTRAINT {name}')
+                    connection.execute(AddConstraint(constraint))
+        for columns, constraint in changed.items():
+            self.out(f'   ~ {table.name}({", ".join(columns)}) ON DELETE {constraint.ondelete or "NO ACTION"}')
+        return list(changed)
+
+    def _rebuild_sqlite_table(self, table):
+        started = time.monotonic()
+        preparer = self.engine.dialect.identifier_preparer
+        name = preparer.format_table(table)
+        temporary = preparer.quote(f'_rebuild_{table.name}')
+        columns = ', '.join(preparer.quote(column.name) for column in table.columns)
+        with self.engine.connect() as connection:
+            enforcing = connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            # Only takes effect outside a transaction; otherwise dropping the
+            # table would cascade into every table referencing it
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            try:
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+                create = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+                connection.exec_driver_sql(create.replace(f'CREATE TABLE {name} ', f'CREATE TABLE {temporary} ', 1))
+                connection.exec_driver_sql(f'INSERT INTO {temporary} ({columns}) SELECT {columns} FROM {name}')
+                connection.exec_driver_sql(f'DROP TABLE {name}')
+                connection.exec_driver_sql(f'ALTER TABLE {temporary} RENAME TO {name}')
+                for index in sorted(table.indexes, key=lambda index: index.name):
+                    index.create(connection)
+                violations = connection.exec_driver_sql(f'PRAGMA foreign_key_check({name})').all()
+                if violations:
+                    raise RuntimeError(f'{len(violations)} row(s) of {table.name} reference missing rows, '
+                                       f'e.g. rowid {violations[0][1]} -> {violations[0][2]}')
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.exec_driver_sql(f'PRAGMA foreign_keys={int(enforcing)}')
+                connection.commit()
+        self.out(f'   rebuilt {table.name} in {time.monotonic() - started:.1f}s')
+
+    def delete_orphans(self, table):
+        """Delete rows of table whose foreign keys point at missing rows
+
+        Rows like these are left behind when deletes ran without foreign
+        keys enforced; they must go before the constraints are checked.
+        Returns the number of rows deleted.
+        """
+        deleted = 0
+        with self.engine.begin() as connection:
+            for constraint in table.foreign_key_constraints:
+                for element in constraint.elements:
+                    column, referenced = element.parent, element.column
+                    orphaned = ~select(referenced).where(referenced == column).exists()
+                    result = connection.execute(table.delete().where(column.is_not(None), orphaned))
+                    if result.rowcount:
+                        self.out(f'   - {result.rowcount} {table.name} row(s) with missing {referenced.table.name}')
+                        deleted += result.rowcount
+        return deleted
+
+    def backfill(self, statement, key_column, batch_size=5000, pause=0.0, label=None):
+        """Run an UPDATE in key ranges of batch_size, committing after each one
+
+        statement is an UPDATE without a key range; each chunk adds
+        `key_column BETWEEN low AND high`. Committing per chunk lets other
+        writers in between chunks instead of waiting on one long lock, and
+        `pause` seconds of sleep between chunks throttles it further.
+        """
+        label = label or key_column.table.name
+        with self.engine.connect() as connection:
+            low, high = connection.execute(select(func.min(key_column), func.max(key_column))).one()
+        if low is None:
+            self.out(f'   {label}: nothing to backfill')
+            return 0
+
+        updated = 0
+        started = time.monotonic()
+        start = low
+        while start <= high:
+            end = start + batch_size - 1
+            with self.engine.begin() as connection:
+                result = connection.execute(statement.where(key_column.between(start, end)))
+                updated += max(result.rowcount, 0)
+            done = min(end, high) - low + 1
+            self.out(f'   {label}: {done}/{high - low + 1} keys '
+                     f'({100 * done // (high - low + 1)}%), {updated} rows updated, '
+                     f'{time.monotonic() - started:.1f}s')
+            start = end + 1
+            if pause and start <= high:
+                time.sleep(pause)
+        return updated
+
+
+class Migrator:
+    """Applies a registry's pending migrations to one engine"""
+
+    def __init__(self, engine, registry, out=print):
+        self.engine = engine
+        self.registry = registry
+        self.out = out
+
+    def applied_versions(self):
+        with self.engine.begin() as connection:
+            migration_metadata.create_all(connection, checkfirst=True)
+            return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [migration for migration in self.registry if migration.version not in applied]
+
+    def upgrade(self, target=None):
+        """Apply pending migrations up to and including target; returns those applied"""
+        context = MigrationContext(self.engine, self.out)
+        applied = []
+        for migration in self.pending():
+            if target is not None and migration.version > target:
+                break
+            self.out(f'⏩ {migration.version:04d} {migration.name}')
+            started = time.monotonic()
+            migration.upgrade(context)
+            with self.engine.begin() as connection:
+                connection.execute(schema_migrations.insert().values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+                ))
+            self.out(f'   done in {time.monotonic() - started:.1f}s')
+            applied.append(migration)
+        return applied
@@ -0,0 +1,170 @@
+"""
+Keyset (cursor) pagination for EduSphere listings
+Pages are addressed by opaque cursor tokens instead of OFFSET page numbers
+"""
+import base64
+import binascii
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values, direction):
+    """Pack a row's sort key and a paging direction into an opaque token"""
+    payload = [direction, [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a cursor token; returns (direction, values) or None if it is invalid"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ('after', 'before') or not isinstance(values, list):
+            return None
+        values = [_decode_value(value) for value in values]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if any(value is None for value in values):
+        return None
+    return direction, values
+
+
+def _decode_value(value):
+    """A cursor value as a str, int, finite float or datetime; None if it is anything else"""
+    if isinstance(value, dict):
+        if set(value) != {'dt'} or not isinstance(value['dt'], str):
+            return None
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value if isinstance(value, (str, int, float)) else None
+
+
+def _fits(column, value):
+    """True when a cursor value can be compared with column in SQL"""
+    try:
+        expected = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return True
+    if expected in (float, Decimal):
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def _beyond(columns, values, descending):
+    """WHERE clause selecting rows that sort strictly after values"""
+    clauses = []
+    for position, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(position)]
+        step = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, descending=True, total=None):
+    """Fetch one page of query ordered by columns, the last of which must be unique
+
+    `cursor` is a token taken from a previous page's next_cursor/prev_cursor.
+    """
+    columns = list(columns)
+    decoded = decode_cursor(cursor)
+    # A cursor that does not match the sort key is treated as no cursor: page one
+    if decoded and (len(decoded[1]) != len(columns)
+                    or not all(map(_fits, columns, decoded[1]))):
+        decoded = None
+    direction, values = decoded if decoded else ('after', None)
+
+    # Walking backwards means reading the opposite way and flipping the rows
+    reverse = direction == 'before'
+    read_descending = descending != reverse
+    query = query.add_columns(*columns)
+    if values is not None:
+        query = query.filter(_beyond(columns, values, read_descending))
+    order = [column.desc() if read_descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    keys = [tuple(row[1:]) for row in rows]
+    next_cursor = prev_cursor = None
+    if keys:
+        if more or reverse:
+            next_cursor = encode_cursor(keys[-1], 'after')
+        if values is not None and (more or not reverse):
+            prev_cursor = encode_cursor(keys[0], 'before')
+    elif values is not None:
+        # Stepped past either end: offer a way back to the first page
+        prev_cursor = encode_cursor(values, 'after' if reverse else 'before')
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total)
+
+
+class CountCache:
+    """Small TTL cache for approximate listing totals"""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return the cached total for key, recomputing it once it is older than ttl"""
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,63 @@
+"""
+Password hashing for EduSphere
+Configurable Werkzeug hash method and cost, with a cap on hashes running at once
+"""
+import threading
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug's defaults spelled out, so stored hashes can be compared with them
+DEFAULT_METHODS = {
+    'scrypt': 'scrypt:32768:8:1',
+    'pbkdf2': 'pbkdf2:sha256:600000',
+}
+
+
+def normalize_method(method):
+    """Expand a bare method name ('scrypt', 'pbkdf2') to its full parameter string"""
+    method = method.strip()
+    if method in DEFAULT_METHODS:
+        return DEFAULT_METHODS[method]
+    if method == 'pbkdf2:sha256':
+        return DEFAULT_METHODS['pbkdf2']
+    return method
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout"""
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords, at most `max_concurrent` at a time
+
+    Hashes run on the calling request thread. Further callers wait up to
+    `queue_timeout` seconds for a slot and then get HashingBusy, so a login
+    storm cannot take every CPU. Werkzeug's scrypt and pbkdf2 release the
+    GIL, so gunicorn's other request threads (`threads` in gunicorn.conf.py)
+    keep serving while a hash runs; this class only bounds how many run.
+    """
+
+    def __init__(self, method='scrypt', max_concurrent=2, queue_timeout=5.0):
+        self.method = normalize_method(method)
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def _run(self, function, *args):
+        if self.max_concurrent <= 0:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy()
+        try:
+            return function(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made with another method or cost than the current one"""
+        return password_hash.split('$', 1)[0] != self.method
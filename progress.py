@@ -0,0 +1,110 @@
+"""
+Course progress tracking for EduSphere
+Coalesces high-frequency progress heartbeats in memory and writes them in periodic batches
+"""
+import atexit
+import logging
+import os
+import threading
+
+log = logging.getLogger('edusphere.progress')
+
+
+class ProgressTracker:
+    """Buffers the highest progress seen per (user, course) until the next flush
+
+    Heartbeats only touch a dict under a lock; a background thread hands the
+    buffered values to `write` every `interval` seconds, or sooner once
+    `max_pending` pairs are waiting. `write` receives a list of
+    (user_id, course_id, progress) and must never lower stored progress, so
+    several workers can flush the same pair in any order. A failed write puts
+    its values back to be retried on the next flush.
+    """
+
+    def __init__(self, write, interval=5.0, max_pending=5000, max_known=100000):
+        self.write = write
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_known = max_known
+        self._pending = {}
+        self._highest = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {}
+            self._highest = {}
+            self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def highest(self, user_id, course_id):
+        """Highest progress this worker has seen for the pair, or None if it has seen none"""
+        return self._highest.get((user_id, course_id))
+
+    def record(self, user_id, course_id, progress, stored=0):
+        """Buffer a heartbeat; returns the pair's progress, which never goes down
+
+        `stored` is the progress already in the database, needed only the
+        first time this worker sees the pair (see highest()).
+        """
+        key = (user_id, course_id)
+        with self._lock:
+            self._ensure_flusher()
+            progress = max(progress, stored, self._highest.get(key, 0))
+            self._pending[key] = progress
+            if len(self._highest) >= self.max_known and key not in self._highest:
+                self._highest.clear()
+            self._highest[key] = progress
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+        return progress
+
+    def forget(self, user_id, course_id):
+        """Drop a pair, e.g. after the student unenrolls"""
+        with self._lock:
+            self._pending.pop((user_id, course_id), None)
+            self._highest.pop((user_id, course_id), None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write every buffered value now; returns the number of pairs written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.write([(user_id, course_id, progress)
+                            for (user_id, course_id), progress in batch.items()])
+            except Exception:
+                log.exception('Writing %d progress update(s) failed; retrying on the next flush', len(batch))
+                with self._lock:
+                    for key, progress in batch.items():
+                        self._pending[key] = max(progress, self._pending.get(key, 0))
+                return 0
+            return len(batch)
+
+    def close(self):
+        """Stop the flusher and write what is still buffered"""
+        self._closed = True
+        self._wake.set()
+        if self._pid == os.getpid():
+            self.flush()
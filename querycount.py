@@ -0,0 +1,79 @@
+"""
+Query counting helpers for EduSphere
+Used to hold listing routes to a fixed SQL query budget and to keep their
+query plans on indexes
+"""
+import re
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# "SCAN courses" in an SQLite query plan; index scans and virtual tables are fine
+PLAN_SCAN_PATTERN = re.compile(r'^SCAN (\w+)$')
+
+
+class QueryCounter:
+    """Collects the SQL statements (and their parameters) executed on an engine"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(None if executemany else parameters)
+
+
+@contextmanager
+def count_queries(engine):
+    """Context manager yielding a QueryCounter for everything run on engine"""
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+def assert_route_queries(client, engine, path, budget):
+    """GET path through a Flask test client and fail if it runs more than budget queries"""
+    with count_queries(engine) as counter:
+        response = client.get(path)
+    assert response.status_code == 200, f'{path} returned {response.status_code}'
+    assert counter.count <= budget, (
+        f'{path} ran {counter.count} queries (budget {budget}):\n' + '\n'.join(counter.statements)
+    )
+    return counter.count
+
+
+def plan_scans(connection, statement, parameters=(), allowed=()):
+    """Full table scans in the SQLite query plan of statement, except tables in allowed"""
+    if connection.dialect.name != 'sqlite':
+        return []
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+    scans = []
+    for row in plan:
+        match = PLAN_SCAN_PATTERN.match(row[-1])
+        if match and match.group(1) not in allowed:
+            scans.append(row[-1])
+    return scans
+
+
+def assert_route_plans(client, engine, path, allowed=()):
+    """GET path and fail if any statement it runs reads a table without an index"""
+    with count_queries(engine) as counter:
+        response = client.get(path)
+    assert response.status_code == 200, f'{path} returned {response.status_code}'
+    problems = []
+    with engine.connect() as connection:
+        for statement, parameters in zip(counter.statements, counter.parameters):
+            if parameters is None or not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            scans = plan_scans(connection, statement, parameters, allowed)
+            if scans:
+                problems.append(f'{", ".join(scans)}:\n{statement}')
+    assert not problems, f'{path} scans without an index:\n' + '\n'.join(problems)
+    return counter.count
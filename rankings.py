@@ -0,0 +1,75 @@
+"""
+Course rankings for EduSphere
+Time-decayed "trending" scores and smoothed ratings, kept in a table that the home page
+and catalog sort by
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Decay is applied by growing new events' weight instead of shrinking old scores,
+# so every write is a single addition. Weights grow from this instant, restarting
+# every ERA_HALF_LIVES half-lives: scores are stored relative to the start of
+# their era, and rescaled once when the next era begins.
+SCORE_EPOCH = datetime(2024, 1, 1)
+ERA_HALF_LIVES = 64
+
+
+class RankingScorer:
+    """Weights for one ranking configuration
+
+    An enrollment at time t adds 2 ** ((t - era start) / half_life) to its
+    course's trending score, a review `review_weight` times that. Every
+    score halves relative to a brand-new event each half-life, so ordering by
+    the stored value is ordering by decayed popularity. Within an era a new
+    event weighs at most 2 ** ERA_HALF_LIVES; rescaling stored scores by
+    era_scale() when an era ends keeps them finite however long the site runs.
+
+    Ratings are a Bayesian average: `prior_reviews` imaginary reviews of
+    `prior_rating` stars keep a course with one five-star review from
+    outranking one with hundreds of 4.8s.
+    """
+
+    def __init__(self, half_life_days=7.0, review_weight=2.0, prior_rating=3.5, prior_reviews=5):
+        self.half_life_seconds = half_life_days * 86400
+        self.review_weight = review_weight
+        self.prior_rating = prior_rating
+        self.prior_reviews = prior_reviews
+
+    def half_lives(self, at):
+        return ((at or datetime.utcnow()) - SCORE_EPOCH).total_seconds() / self.half_life_seconds
+
+    def era(self, at=None):
+        """Number of the era containing the given time (now if unknown)"""
+        return int(self.half_lives(at) // ERA_HALF_LIVES)
+
+    def era_start(self, era):
+        return SCORE_EPOCH + timedelta(seconds=era * ERA_HALF_LIVES * self.half_life_seconds)
+
+    def era_scale(self, from_era, to_era):
+        """Factor turning a score relative to from_era into one relative to to_era"""
+        return 2.0 ** (ERA_HALF_LIVES * (from_era - to_era))
+
+    def weight(self, at, era):
+        """Trending weight, relative to era, of an event at the given time (now if unknown)"""
+        # Events from long-past eras underflow to 0.0
+        return 2.0 ** (self.half_lives(at) - era * ERA_HALF_LIVES)
+
+    def enrollment_score(self, enrolled_at, era):
+        return self.weight(enrolled_at, era)
+
+    def review_score(self, created_at, era):
+        return self.review_weight * self.weight(created_at, era)
+
+    def rating_score(self, review_count, rating_sum):
+        """Smoothed average rating; works on numbers and on SQL column expressions"""
+        return ((rating_sum + self.prior_rating * self.prior_reviews) * 1.0
+                / (review_count + self.prior_reviews))
+
+    def trending_scores(self, enrollments, reviews, era):
+        """{course_id: score relative to era} from (course_id, enrolled_at) and (course_id, created_at) rows"""
+        scores = defaultdict(float)
+        for course_id, enrolled_at in enrollments:
+            scores[course_id] += self.enrollment_score(enrolled_at, era)
+        for course_id, created_at in reviews:
+            scores[course_id] += self.review_score(created_at, era)
+        return scores
@@ -0,0 +1,124 @@
+"""
+Course recommendations for EduSphere
+"Students also enrolled in": co-enrollment counts between courses, computed in bulk
+(vectorized with NumPy) and kept current one student at a time
+"""
+from collections import Counter, defaultdict
+from itertools import groupby, permutations
+
+try:
+    import numpy
+except ImportError:  # development setups only: same counts, about 20 times slower
+    numpy = None
+
+# Ordered (course, other) pairs expanded per NumPy chunk; bounds the rebuild's memory
+PAIRS_PER_CHUNK = 1_000_000
+# Up to this many courses squared, pairs are tallied in a dense matrix instead of sorted
+DENSE_CELLS = 4_194_304
+
+
+def co_enrollment_counts(user_ids, course_ids):
+    """Count, for every ordered pair of courses, the students enrolled in both
+
+    user_ids and course_ids are parallel sequences of enrollments sorted by
+    user. Returns parallel lists (courses, others, shared) with one entry per
+    pair that at least one student shares, in both directions.
+    """
+    if numpy is not None:
+        return _numpy_counts(user_ids, course_ids)
+    counts = Counter()
+    for _, basket in groupby(zip(user_ids, course_ids), key=lambda row: row[0]):
+        counts.update(permutations([course_id for _, course_id in basket], 2))
+    pairs = sorted(counts.items())
+    return ([course for (course, _), _ in pairs], [other for (_, other), _ in pairs],
+            [shared for _, shared in pairs])
+
+
+def _numpy_counts(user_ids, course_ids):
+    users = numpy.asarray(user_ids, dtype=numpy.int64)
+    if not len(users):
+        return [], [], []
+    # Dense course numbers so a pair packs into one int64 key
+    course_values, courses = numpy.unique(numpy.asarray(course_ids, dtype=numpy.int64), return_inverse=True)
+    width = len(course_values)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(users)) + 1))
+    sizes = numpy.diff(numpy.append(starts, len(users)))
+    # Each student with k courses adds k * (k - 1) pairs; split students into chunks
+    chunk_of = numpy.cumsum(sizes * sizes) // PAIRS_PER_CHUNK
+    bounds = numpy.flatnonzero(numpy.diff(chunk_of)) + 1
+
+    dense = numpy.zeros(width * width, dtype=numpy.int64) if width * width <= DENSE_CELLS else None
+    keys, counts = [], []
+    for first, last in zip(numpy.concatenate(([0], bounds)), numpy.append(bounds, len(sizes))):
+        chunk_sizes = sizes[first:last]
+        chunk_starts = starts[first:last]
+        # Pair every enrollment with every enrollment of the same student
+        repeats = numpy.repeat(chunk_sizes, chunk_sizes)
+        left = numpy.repeat(numpy.arange(chunk_starts[0], chunk_starts[-1] + chunk_sizes[-1]), repeats)
+        block_starts = numpy.cumsum(repeats) - repeats
+        offsets = numpy.arange(len(left)) - numpy.repeat(block_starts, repeats)
+        right = numpy.repeat(numpy.repeat(chunk_starts, chunk_sizes), repeats) + offsets
+        distinct = left != right
+        chunk_keys = courses[left[distinct]] * width + courses[right[distinct]]
+        if dense is not None:
+            dense += numpy.bincount(chunk_keys, minlength=width * width)
+            continue
+        chunk_keys, chunk_counts = numpy.unique(chunk_keys, return_counts=True)
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+
+    if dense is not None:
+        keys = numpy.flatnonzero(dense)
+        shared = dense[keys]
+    elif len(keys) == 1:
+        keys, shared = keys[0], counts[0]
+    else:
+        keys, merged = numpy.unique(numpy.concatenate(keys), return_inverse=True)
+        shared = numpy.bincount(merged, weights=numpy.concatenate(counts)).astype(numpy.int64)
+    return (course_values[keys // width].tolist(), course_values[keys % width].tolist(),
+            shared.tolist())
+
+
+def pair_changes(current, added, removed):
+    """Co-enrollment deltas for one student whose enrollments changed
+
+    current is the student's set of course ids now; added and removed say
+    how it differs from before. Returns {(course, other): delta} for the
+    ordered pairs whose shared-student count changes.
+    """
+    before = (current - added) | removed
+    touched = added | removed
+    pairs = {(course, other) for course in touched for other in current | before if other != course}
+    pairs |= {(other, course) for course, other in pairs}
+    deltas = {}
+    for course, other in pairs:
+        delta = (course in current and other in current) - (course in before and other in before)
+        if delta:
+            deltas[course, other] = delta
+    return deltas
+
+
+def group_recommendations(rows):
+    """{course_id: tuple of entries, best first} from (course_id, entry) rows in rank order"""
+    grouped = defaultdict(list)
+    for course_id, entry in rows:
+        grouped[course_id].append(entry)
+    return {course_id: tuple(entries) for course_id, entries in grouped.items()}
+
+
+def blend_recommendations(recommendations, course_ids, limit):
+    """Courses most often taken alongside all of course_ids, excluding those
+
+    Entries need `id` and `shared`; a course recommended from several of the
+    given courses adds up its shared-student counts.
+    """
+    scores = Counter()
+    entries = {}
+    for course_id in course_ids:
+        for entry in recommendations.get(course_id, ()):
+            scores[entry.id] += entry.shared
+            entries[entry.id] = entry
+    for course_id in course_ids:
+        scores.pop(course_id, None)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [entries[course_id] for course_id, _ in ranked[:limit]]
@@ -0,0 +1,105 @@
+"""
+Full-text search index for the EduSphere course catalog
+Backed by an SQLite FTS5 virtual table keyed by course id
+"""
+import re
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.exc import OperationalError
+
+# Search terms beyond this are ignored to keep MATCH queries cheap
+MAX_QUERY_TERMS = 8
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(search):
+    """Turn free text into an FTS5 MATCH expression (all terms, prefix matched)"""
+    terms = TOKEN_PATTERN.findall(search.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class CourseSearchIndex:
+    """FTS5 index over course title, description, category and instructor names"""
+
+    COLUMNS = ('title', 'description', 'category', 'instructor')
+    # bm25 weights per column, in COLUMNS order: titles matter most
+    WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+    def __init__(self, name='course_search'):
+        self.name = name
+        self._ready = {}
+
+    def is_ready(self, connection):
+        """Check (once per database) whether the index table exists"""
+        key = str(connection.engine.url)
+        if key not in self._ready:
+            ready = False
+            if connection.dialect.name == 'sqlite':
+                ready = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': self.name}
+                ).first() is not None
+            self._ready[key] = ready
+        return self._ready[key]
+
+    def create(self, connection):
+        """Create the FTS5 table; returns False if the database cannot host it"""
+        if connection.dialect.name != 'sqlite':
+            return False
+        try:
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING fts5("
+                f"{', '.join(self.COLUMNS)}, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            return False
+        self._ready[str(connection.engine.url)] = True
+        return True
+
+    def upsert(self, connection, documents):
+        """Replace the indexed text for (id, title, description, category, instructor) rows"""
+        documents = [tuple(document) for document in documents]
+        if not documents:
+            return
+        self.remove(connection, [document[0] for document in documents])
+        connection.exec_driver_sql(
+            f"INSERT INTO {self.name} (rowid, {', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            documents
+        )
+
+    def remove(self, connection, course_ids):
+        """Drop courses from the index"""
+        if not course_ids:
+            return
+        connection.exec_driver_sql(
+            f"DELETE FROM {self.name} WHERE rowid = ?",
+            [(course_id,) for course_id in course_ids]
+        )
+
+    def rebuild(self, connection, batches):
+        """Empty the index and refill it from batches of documents"""
+        connection.exec_driver_sql(f"DELETE FROM {self.name}")
+        indexed = 0
+        for documents in batches:
+            documents = list(documents)
+            if documents:
+                connection.exec_driver_sql(
+                    f"INSERT INTO {self.name} (rowid, {', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                    [tuple(document) for document in documents]
+                )
+                indexed += len(documents)
+        connection.exec_driver_sql(f"INSERT INTO {self.name} ({self.name}) VALUES ('optimize')")
+        return indexed
+
+    def ranked(self, match_query):
+        """Subquery of (course_id, rank) for a MATCH expression, best match first"""
+        index = table(self.name, column('rowid'))
+        return select(
+            index.c.rowid.label('course_id'),
+            func.bm25(literal_column(self.name), *self.WEIGHTS).label('rank')
+        ).select_from(index).where(
+            literal_column(self.name).op('MATCH')(match_query)
+        ).subquery('search_results')
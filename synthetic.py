@@ -0,0 +1,124 @@
+"""
+Synthetic data generation for EduSphere
+Deterministic, production-shaped users, courses, enrollments and reviews for load testing
+"""
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+TOPICS = (
+    'Python', 'JavaScript', 'React', 'Flask', 'SQL', 'Machine Learning', 'Statistics',
+    'Data Visualization', 'Android', 'iOS', 'Swift', 'Kotlin', 'UX Research', 'Figma',
+    'Typography', 'Branding', 'Accounting', 'Negotiation', 'Leadership', 'SEO',
+    'Social Media', 'Copywriting', 'Excel', 'Cloud Computing', 'Docker', 'Security',
+)
+PREFIXES = ('Introduction to', 'Practical', 'Advanced', 'Mastering', 'Hands-on', 'Modern',
+            'The Complete', 'Essential', 'Applied', 'Professional')
+SUFFIXES = ('for Beginners', 'Bootcamp', 'in 30 Days', 'Fundamentals', 'Deep Dive',
+            'Workshop', 'Masterclass', 'from Scratch', 'for Teams', 'Projects')
+FIRST_NAMES = ('Ava', 'Liam', 'Mia', 'Noah', 'Zoe', 'Omar', 'Lina', 'Kai', 'Ines', 'Ravi',
+               'Sofia', 'Yuki', 'Amir', 'Nora', 'Leo', 'Maya', 'Ivan', 'Chloe', 'Tariq', 'Elif')
+LAST_NAMES = ('Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Kim', 'Haddad',
+              'Müller', 'Rossi', 'Tanaka', 'Kowalski', 'Dubois', 'Patel', 'Jensen', 'Moreau')
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+DURATIONS = ('2 weeks', '4 weeks', '6 weeks', '8 weeks', '10 hours', '20 hours', '3 months')
+
+# Zipf exponent for course popularity and instructor output: higher is more skewed
+POPULARITY_SKEW = 1.1
+# Tries per enrollment before giving up on finding an unused (student, course) pair
+MAX_DRAWS = 12
+
+
+class SkewedPicker:
+    """Picks from items with Zipf-distributed weights: the first few dominate"""
+
+    def __init__(self, items, skew=POPULARITY_SKEW):
+        self.items = list(items)
+        self.cumulative = list(accumulate(1.0 / (rank ** skew) for rank in range(1, len(self.items) + 1)))
+
+    def pick(self, rng):
+        position = bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+        return self.items[min(position, len(self.items) - 1)]
+
+
+def user_email(seed, number):
+    return f's{seed}u{number}@scale.example.com'
+
+
+def generate_users(rng, count, seed, password_hash, now, instructor_share=0.05):
+    """Yield user rows; about instructor_share of them are instructors"""
+    instructors = max(1, round(count * instructor_share))
+    for number in range(count):
+        yield {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': user_email(seed, number),
+            'password_hash': password_hash,
+            'role': 'instructor' if number < instructors else 'student',
+            'created_at': now - timedelta(days=rng.uniform(0, 730)),
+        }
+
+
+def generate_courses(rng, count, instructor_ids, category_ids, now):
+    """Yield course rows; a few prolific instructors teach most courses"""
+    instructors = SkewedPicker(instructor_ids)
+    for _ in range(count):
+        topic = rng.choice(TOPICS)
+        created_at = now - timedelta(days=rng.uniform(0, 720))
+        yield {
+            'title': f'{rng.choice(PREFIXES)} {topic} {rng.choice(SUFFIXES)}',
+            'description': (f'Learn {topic} step by step with real-world examples, '
+                            f'exercises and a final project. '
+                            f'Suitable for {rng.choice(LEVELS).lower()} learners.'),
+            'price': rng.choice((0.0, 19.99, 29.99, 49.99, 89.99, 129.99)),
+            'duration': rng.choice(DURATIONS),
+            'level': rng.choice(LEVELS),
+            'instructor_id': instructors.pick(rng),
+            'category_id': rng.choice(category_ids),
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+def generate_activity(rng, enrollments, reviews, student_ids, courses, now):
+    """Yield (enrollment row, review row or None) pairs
+
+    courses is a list of (id, created_at). Popular courses are drawn far
+    more often; a pair already taken is redrawn (finally from a uniform
+    pick) so the unique_enrollment constraint holds. Reviews go to a fixed
+    random subset of the enrollments, with ratings around a per-course mean.
+    """
+    popular = SkewedPicker(rng.sample(courses, len(courses)))
+    quality = {course_id: rng.uniform(2.8, 4.9) for course_id, _ in courses}
+    reviewed = set(rng.sample(range(enrollments), min(reviews, enrollments)))
+    taken = set()
+    for number in range(enrollments):
+        for attempt in range(MAX_DRAWS):
+            student_id = rng.choice(student_ids)
+            course_id, created_at = popular.pick(rng) if attempt < MAX_DRAWS // 2 else rng.choice(courses)
+            if (student_id, course_id) not in taken:
+                break
+        else:
+            continue
+        taken.add((student_id, course_id))
+
+        enrolled_at = created_at + (now - created_at) * rng.random()
+        progress = rng.choice((0, 0, 10, 25, 40, 60, 80, 100, 100))
+        enrollment = {
+            'user_id': student_id,
+            'course_id': course_id,
+            'enrolled_at': enrolled_at,
+            'progress': progress,
+            'completed': progress == 100,
+        }
+        review = None
+        if number in reviewed:
+            review = {
+                'user_id': student_id,
+                'course_id': course_id,
+                'rating': min(5, max(1, round(rng.gauss(quality[course_id], 0.9)))),
+                'comment': rng.choice((None, 'Great course!', 'Very clear explanations.',
+                                       'Too fast for me.', 'Worth every minute.',
+                                       'Good content, dated examples.')),
+                'created_at': enrolled_at + (now - enrolled_at) * rng.random(),
+            }
+        yield enrollment, review
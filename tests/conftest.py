@@ -0,0 +1,71 @@
+import atexit
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# app reads its configuration at import time, so point every file it writes at a
+# scratch directory before any test imports it
+SCRATCH = tempfile.mkdtemp(prefix='edusphere-tests-')
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(SCRATCH, "edusphere.db")}'
+os.environ['CACHE_PATH'] = os.path.join(SCRATCH, 'cache.db')
+os.environ['USER_CACHE_PATH'] = os.path.join(SCRATCH, 'user_cache.db')
+os.environ['JOB_QUEUE_PATH'] = os.path.join(SCRATCH, 'jobs.db')
+os.environ['JOB_FILES_PATH'] = os.path.join(SCRATCH, 'job_files')
+os.environ['PROFILING_ENABLED'] = '0'
+
+# Courses and reviews the catalog fixture creates, several pages of each
+CATALOG_COURSES = 25
+CATALOG_REVIEWS = 12
+
+
+@pytest.fixture(scope='session')
+def edusphere():
+    """The app module over a seeded scratch database"""
+    import app as edusphere
+    with contextlib.redirect_stdout(io.StringIO()):
+        edusphere.init_database()
+        edusphere.seed_database()
+    edusphere.app.config['WTF_CSRF_ENABLED'] = False
+    return edusphere
+
+
+@pytest.fixture(scope='session')
+def catalog(edusphere):
+    """Ids of an instructor's courses, created a minute apart, of the one with reviews and of its reviewers"""
+    models = edusphere
+    with models.app.app_context():
+        instructor = models.User(name='Test Instructor', email='instructor@tests.io', role='instructor')
+        students = [models.User(name=f'Student {n}', email=f'student{n}@tests.io', role='student')
+                    for n in range(CATALOG_REVIEWS)]
+        for user in [instructor, *students]:
+            user.password_hash = 'x'
+        models.db.session.add_all([instructor, *students])
+        models.db.session.commit()
+        start = datetime(2026, 1, 1)
+        courses = [models.Course(title=f'Paged course {n}', description='Keyset paging fixture',
+                                 price=10 + n, duration='1 week', level='Beginner',
+                                 instructor_id=instructor.id, category_id=1,
+                                 created_at=start + timedelta(minutes=n))
+                   for n in range(CATALOG_COURSES)]
+        models.db.session.add_all(courses)
+        models.db.session.commit()
+        reviewed = courses[0].id
+        for n, student in enumerate(students):
+            models.db.session.add(models.Enrollment(user_id=student.id, course_id=reviewed))
+            models.db.session.add(models.Review(user_id=student.id, course_id=reviewed, rating=1 + n % 5,
+                                                created_at=start + timedelta(hours=n)))
+        models.db.session.commit()
+        models.cache.clear()
+        return {'courses': [course.id for course in courses], 'reviewed': reviewed,
+                'instructor': instructor.id, 'students': [student.id for student in students]}
+
+
+@pytest.fixture
+def client(edusphere):
+    return edusphere.app.test_client()
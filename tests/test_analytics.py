@@ -0,0 +1,23 @@
+from datetime import date
+
+from analytics import EMPTY_TOTALS, Totals, fill_buckets
+
+
+def test_empty_series_keeps_time_axis():
+    buckets = fill_buckets([], date(2026, 10, 1), date(2026, 10, 7), 'day')
+    assert [start for start, _ in buckets] == [date(2026, 10, day) for day in range(1, 8)]
+    assert all(totals == EMPTY_TOTALS for _, totals in buckets)
+
+
+def test_empty_monthly_series():
+    buckets = fill_buckets([], date(2024, 11, 15), date(2026, 10, 17), 'month')
+    assert buckets[0] == (date(2024, 11, 1), EMPTY_TOTALS)
+    assert buckets[-1][0] == date(2026, 10, 1)
+    assert len(buckets) == 24
+
+
+def test_earlier_rows_stretch_the_axis():
+    rows = [(date(2026, 9, 28), 3, 1, 1, 5, 30.0)]
+    buckets = fill_buckets(rows, date(2026, 10, 1), date(2026, 10, 1), 'day')
+    assert buckets[0] == (date(2026, 9, 28), Totals(3, 1, 1, 5, 30.0))
+    assert len(buckets) == 4
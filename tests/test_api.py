@@ -0,0 +1,70 @@
+import pytest
+
+
+def test_listing_fields_default_and_selected(client, catalog):
+    default = client.get('/api/v1/courses').get_json()['data'][0]
+    assert 'title' in default and 'instructor' in default
+    assert 'description' not in default and 'rating_histogram' not in default
+
+    selected = client.get('/api/v1/courses', query_string={'fields': 'id,title,id'}).get_json()['data']
+    assert selected and all(list(course) == ['id', 'title'] for course in selected)
+
+
+def test_course_fields_include_details(client, catalog):
+    course = client.get(f'/api/v1/courses/{catalog["reviewed"]}').get_json()['data']
+    assert course['id'] == catalog['reviewed']
+    assert course['review_count'] == len(catalog['students'])
+    assert sum(course['rating_histogram'].values()) == course['review_count']
+    only = client.get(f'/api/v1/courses/{catalog["reviewed"]}', query_string={'fields': 'description'})
+    assert only.get_json() == {'data': {'description': 'Keyset paging fixture'}}
+
+
+@pytest.mark.parametrize('path', ['/api/v1/courses?fields=nope', '/api/v1/categories?fields=id,nope'])
+def test_unknown_field_is_a_bad_request(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'nope' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('path', ['/api/v1/courses', '/api/v1/categories', '/api/v1/courses?fields=id'])
+def test_etag_answers_if_none_match(client, catalog, path):
+    first = client.get(path)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert 'Last-Modified' not in first.headers
+    assert first.cache_control.no_cache
+
+    repeat = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304 and repeat.data == b''
+    assert repeat.headers['ETag'] == first.headers['ETag']
+
+    assert client.get(path, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_etag_differs_by_fields(client, catalog):
+    assert (client.get('/api/v1/courses?fields=id').headers['ETag']
+            != client.get('/api/v1/courses?fields=id,title').headers['ETag'])
+
+
+def test_edit_changes_course_etag(edusphere, client, catalog):
+    path = f'/api/v1/courses/{catalog["courses"][1]}'
+    before = client.get(path).headers['ETag']
+    with edusphere.app.app_context():
+        course = edusphere.db.session.get(edusphere.Course, catalog['courses'][1])
+        course.title = 'Renamed paged course'
+        edusphere.db.session.commit()
+    after = client.get(path, headers={'If-None-Match': before})
+    assert after.status_code == 200
+    assert after.get_json()['data']['title'] == 'Renamed paged course'
+
+
+def test_enrollment_changes_listing_etag(edusphere, client, catalog):
+    # A counter write leaves updated_at alone, so only the ETag can tell
+    path = '/api/v1/courses?fields=id,enrollment_count'
+    before = client.get(path)
+    listed = before.get_json()['data'][0]
+    with edusphere.app.app_context():
+        edusphere.db.session.add(edusphere.Enrollment(user_id=catalog['students'][0], course_id=listed['id']))
+        edusphere.db.session.commit()
+    after = client.get(path, headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['data'][0] == {'id': listed['id'], 'enrollment_count': listed['enrollment_count'] + 1}
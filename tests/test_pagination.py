@@ -0,0 +1,138 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from pagination import decode_cursor, encode_cursor, keyset_paginate
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'items'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+def raw_cursor(payload):
+    """A cursor token for any JSON payload, as a client could craft one"""
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+# Well-formed tokens whose values cannot be compared with a (created_at, id) key
+CRAFTED_CURSORS = [
+    raw_cursor(['after', [[1], [2]]]),
+    raw_cursor(['after', [None, None]]),
+    raw_cursor(['before', [{'dt': 5}, 1]]),
+    raw_cursor(['after', [{'dt': '2026-01-01', 'x': 1}, 1]]),
+    raw_cursor(['after', [{}, 1]]),
+    raw_cursor(['after', [True, False]]),
+    raw_cursor(['after', ['2026-01-01', 'nine']]),
+    raw_cursor(['after', [1]]),
+    raw_cursor(['sideways', [{'dt': '2026-01-01T00:00:00'}, 1]]),
+    raw_cursor({'after': []}),
+    'not a cursor',
+    '',
+]
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        start = datetime(2026, 1, 1)
+        # Pairs of rows share a timestamp, so the id has to break ties
+        session.add_all(Item(id=n, name=f'item {n}', created_at=start + timedelta(minutes=n // 2))
+                        for n in range(1, 24))
+        session.commit()
+        yield session
+
+
+def paginate(session, cursor=None, per_page=5, descending=True):
+    return keyset_paginate(session.query(Item), (Item.created_at, Item.id),
+                           cursor=cursor, per_page=per_page, descending=descending)
+
+
+def ids(page):
+    return [item.id for item in page]
+
+
+def test_cursor_round_trip():
+    values = (datetime(2026, 3, 4, 5, 6, 7), 42, 'name', 1.5)
+    assert decode_cursor(encode_cursor(values, 'before')) == ('before', list(values))
+
+
+@pytest.mark.parametrize('cursor', CRAFTED_CURSORS)
+def test_crafted_cursor_shows_first_page(session, cursor):
+    page = paginate(session, cursor)
+    assert ids(page) == [23, 22, 21, 20, 19]
+    assert not page.has_prev
+
+
+def test_non_finite_numbers_are_rejected():
+    assert decode_cursor(raw_cursor(['after', [float('nan'), 1]])) is None
+    assert decode_cursor(raw_cursor(['after', [float('inf'), 1]])) is None
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_walks_forward_then_back(session, descending):
+    pages = [paginate(session, descending=descending)]
+    while pages[-1].has_next:
+        pages.append(paginate(session, pages[-1].next_cursor, descending=descending))
+    walked = [item for page in pages for item in ids(page)]
+    assert walked == sorted(range(1, 24), reverse=descending)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+    back = [pages[-1]]
+    while back[-1].has_prev:
+        back.append(paginate(session, back[-1].prev_cursor, descending=descending))
+    assert [ids(page) for page in back] == [ids(page) for page in reversed(pages)]
+
+
+def test_next_then_prev_returns_the_same_page(session):
+    first = paginate(session)
+    second = paginate(session, first.next_cursor)
+    assert ids(paginate(session, second.prev_cursor)) == ids(first)
+    assert ids(paginate(session, paginate(session, second.next_cursor).prev_cursor)) == ids(second)
+
+
+def test_stepping_past_the_last_page(session):
+    last = paginate(session, encode_cursor((datetime(2026, 1, 1), 2), 'after'))
+    assert ids(last) == [1]
+    assert not last.has_next
+    beyond = paginate(session, encode_cursor((datetime(2025, 1, 1), 1), 'after'))
+    assert ids(beyond) == [] and not beyond.has_next
+    assert ids(paginate(session, beyond.prev_cursor)) == [5, 4, 3, 2, 1]
+
+
+def test_stepping_past_the_first_page(session):
+    beyond = paginate(session, encode_cursor((datetime(2027, 1, 1), 99), 'before'))
+    assert ids(beyond) == [] and not beyond.has_next
+    # The way back from either end is offered as the previous page
+    assert ids(paginate(session, beyond.prev_cursor)) == [23, 22, 21, 20, 19]
+
+
+@pytest.mark.parametrize('cursor', CRAFTED_CURSORS)
+def test_crafted_cursor_on_public_listings(client, catalog, cursor):
+    courses = client.get('/courses', query_string={'cursor': cursor})
+    assert courses.status_code == 200
+
+    api = client.get('/api/v1/courses', query_string={'cursor': cursor})
+    assert api.status_code == 200
+    assert api.get_json()['prev_cursor'] is None
+
+    reviews = client.get(f'/course/{catalog["reviewed"]}/reviews', query_string={'cursor': cursor})
+    assert reviews.status_code == 200
+
+
+def test_crafted_cursor_on_ranked_and_searched_listings(client, catalog):
+    for query in ({'sort': 'top_rated'}, {'search': 'paged'}):
+        for cursor in CRAFTED_CURSORS[:3]:
+            assert client.get('/api/v1/courses', query_string={**query, 'cursor': cursor}).status_code == 200
+            assert client.get('/courses', query_string={**query, 'cursor': cursor}).status_code == 200
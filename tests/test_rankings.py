@@ -0,0 +1,37 @@
+import math
+from datetime import datetime, timedelta
+
+from rankings import ERA_HALF_LIVES, SCORE_EPOCH, RankingScorer
+
+
+def test_weight_stays_finite_years_ahead():
+    scorer = RankingScorer(half_life_days=1)
+    for at in (datetime(2026, 10, 21), datetime(2043, 8, 1), datetime(2126, 1, 1)):
+        era = scorer.era(at)
+        weight = scorer.review_score(at, era)
+        assert math.isfinite(weight)
+        assert weight <= scorer.review_weight * 2.0 ** ERA_HALF_LIVES
+
+
+def test_trending_scores_finite_across_decades():
+    scorer = RankingScorer(half_life_days=1)
+    now = datetime(2100, 1, 1)
+    enrollments = [(1, now - timedelta(days=days)) for days in range(0, 40000, 7)]
+    scores = scorer.trending_scores(enrollments, [(1, now)], scorer.era(now))
+    assert math.isfinite(scores[1]) and scores[1] > 0
+
+
+def test_rescaling_to_next_era_keeps_relative_weights():
+    scorer = RankingScorer(half_life_days=7)
+    at = SCORE_EPOCH + timedelta(days=7 * ERA_HALF_LIVES - 1)
+    era = scorer.era(at)
+    rescaled = scorer.weight(at, era) * scorer.era_scale(era, era + 1)
+    assert math.isclose(rescaled, scorer.weight(at, era + 1))
+
+
+def test_newer_events_weigh_more():
+    scorer = RankingScorer(half_life_days=7)
+    now = datetime(2030, 5, 1)
+    era = scorer.era(now)
+    week_old = scorer.enrollment_score(now - timedelta(days=7), era)
+    assert math.isclose(scorer.enrollment_score(now, era), 2 * week_old)